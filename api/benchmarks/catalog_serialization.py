@@ -0,0 +1,88 @@
+"""
+Katalog javobini serializatsiya qilish: eski va yangi yo'l.
+
+Bazasiz: --courses ta ORM Course obyekti xotirada yaratiladi va bitta
+GET /api/courses javobining tanasi --repeat marta tayyorlanadi.
+  eski  - har bir kurs uchun CourseResponse(...), keyin FastAPI response_model
+          bo'yicha qayta tekshirish + jsonable_encoder + json.dumps
+  yangi - TypeAdapter.validate_python(from_attributes) + dump_json (Rust)
+
+Ishga tushirish (api/ papkasidan):
+    python -m benchmarks.catalog_serialization --courses 500 --repeat 200
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from typing import List, Tuple
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from database.models import Course
+from routes.courses import COURSE_LIST, CourseResponse
+from services.serialization import json_response
+
+
+def make_courses(count: int) -> List[Course]:
+    """Bazaga yozilmaydigan kurs obyektlari"""
+    now = datetime.utcnow()
+    return [
+        Course(
+            id=i, title=f"Kurs {i}", description="Tavsif " * 40, price=99000.0,
+            stars_price=100, ton_price=1.5, thumbnail=f"/thumbs/{i}.jpg",
+            category="Dasturlash", duration=12, is_active=True, lessons_count=24,
+            created_at=now, updated_at=now
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+async def old_path(courses: List[Course], field) -> bytes:
+    """Oldingi route: qo'lda model qurish + FastAPI serializatsiyasi"""
+    result = [
+        CourseResponse(
+            id=course.id, title=course.title, description=course.description,
+            price=course.price, stars_price=course.stars_price, thumbnail=course.thumbnail,
+            category=course.category, duration=course.duration, is_active=course.is_active,
+            lessons_count=course.lessons_count
+        )
+        for course in courses
+    ]
+    content = await serialize_response(field=field, response_content=result)
+    return JSONResponse(content).body
+
+
+async def new_path(courses: List[Course], field) -> bytes:
+    """Hozirgi route: bitta TypeAdapter o'tishi"""
+    payload = COURSE_LIST.validate_python(courses, from_attributes=True)
+    return json_response(COURSE_LIST, payload).body
+
+
+async def measure(path, courses: List[Course], repeat: int) -> Tuple[float, int]:
+    """Bitta javob uchun o'rtacha vaqt (ms) va tana hajmi (bayt)"""
+    field = create_response_field(name="Response_get_courses", type_=List[CourseResponse])
+    body = await path(courses, field)  # isitish
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await path(courses, field)
+    return (time.perf_counter() - started) / repeat * 1000, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    
+    courses = make_courses(args.courses)
+    results = {}
+    for name, path in (("eski", old_path), ("yangi", new_path)):
+        results[name], size = asyncio.run(measure(path, courses, args.repeat))
+        print(f"{name:<6} {results[name]:8.2f} ms/so'rov  {size / 1024:7.1f} KB")
+    print(f"tezlashish: {results['eski'] / results['yangi']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Join jadvallaridagi indekslar: join_table_indexes migratsiyasidan oldin va keyin.
+
+Vaqtinchalik SQLite bazaga kurslar, darslar, xaridlar, to'lovlar va progress
+yoziladi. Avval yangi indekslarsiz, so'ng migratsiya qo'llangandan keyin
+har bir so'rov uchun EXPLAIN QUERY PLAN va bajarilish vaqti chiqariladi.
+
+Ishga tushirish (api/ papkasidan):
+    python -m benchmarks.join_index_query_plan --users 200000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from database.base import Base
+from database import models  # noqa: F401 - jadvallarni ro'yxatdan o'tkazish
+from database.migrations import join_table_indexes
+
+BATCH = 50_000
+
+NEW_INDEXES = [
+    "ux_user_courses_user_id_course_id",
+    "ix_user_courses_course_id",
+    "ix_lessons_course_id_order",
+    "ix_payments_user_id",
+    "ix_payments_course_id_status",
+    "ix_payments_transaction_id",
+    "ux_lesson_progress_user_id_lesson_id",
+    "ix_lesson_progress_lesson_id",
+]
+
+QUERIES = {
+    "access_check": (
+        "SELECT id FROM user_courses WHERE user_id = :user_id AND course_id = :course_id"
+    ),
+    "lessons_by_course": (
+        'SELECT id, title FROM lessons WHERE course_id = :course_id ORDER BY "order"'
+    ),
+    "top_courses": (
+        "SELECT courses.id, courses.title, count(user_courses.id) AS sales FROM courses "
+        "LEFT JOIN user_courses ON courses.id = user_courses.course_id "
+        "GROUP BY courses.id, courses.title ORDER BY sales DESC LIMIT 5"
+    ),
+    "user_payments": (
+        "SELECT id, amount FROM payments WHERE user_id = :user_id ORDER BY created_at DESC"
+    ),
+    "delete_course_payments": (
+        "SELECT id, amount FROM payments WHERE course_id = :course_id AND status = 'completed'"
+    ),
+    "payment_by_transaction": (
+        "SELECT id FROM payments WHERE transaction_id = :transaction_id"
+    ),
+    "delete_course_progress": (
+        "SELECT count(*) FROM lesson_progress "
+        "WHERE lesson_id IN (SELECT id FROM lessons WHERE course_id = :course_id)"
+    ),
+}
+
+
+def seed(path: str, users: int, courses: int, lessons_per_course: int):
+    """Sxemani yaratish va tasodifiy qatorlar bilan to'ldirish"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    now = datetime.utcnow().isoformat(" ")
+    
+    conn.executemany(
+        "INSERT INTO courses (id, title, description, price, stars_price, ton_price, category, "
+        "duration, is_active, \"order\", created_at, updated_at) "
+        "VALUES (?, ?, 'd', 1000, 100, 0, 'Boshqa', 0, 1, 0, ?, ?)",
+        [(c, f"Kurs {c}", now, now) for c in range(1, courses + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO lessons (id, course_id, title, duration, \"order\", is_free, created_at) "
+        "VALUES (?, ?, ?, 600, ?, 0, ?)",
+        [
+            ((c - 1) * lessons_per_course + o + 1, c, f"Dars {o}", o, now)
+            for c in range(1, courses + 1)
+            for o in range(lessons_per_course)
+        ]
+    )
+    lessons = courses * lessons_per_course
+    
+    for start in range(0, users, BATCH):
+        user_rows, purchases, payments, progress = [], [], [], []
+        for u in range(start + 1, min(start + BATCH, users) + 1):
+            created = (datetime.utcnow() - timedelta(seconds=random.randint(0, 365 * 86400))).isoformat(" ")
+            user_rows.append((u, 10_000_000 + u, f"user{u}", 0, False, True, created, created))
+            for course_id in random.sample(range(1, courses + 1), 3):
+                purchases.append((u, course_id, 0, created))
+                payments.append((
+                    u, course_id, 1000.0, "UZS", "click",
+                    random.choice(["completed", "pending"]), f"tx-{u}-{course_id}", created, created
+                ))
+            for lesson_id in random.sample(range(1, lessons + 1), 5):
+                progress.append((u, lesson_id, 0, False, created))
+        conn.executemany(
+            "INSERT INTO users (id, telegram_id, full_name, balance, is_admin, is_active, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            user_rows
+        )
+        conn.executemany(
+            "INSERT INTO user_courses (user_id, course_id, progress, created_at) VALUES (?, ?, ?, ?)",
+            purchases
+        )
+        conn.executemany(
+            "INSERT INTO payments (user_id, course_id, amount, currency, payment_type, status, "
+            "transaction_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            payments
+        )
+        conn.executemany(
+            "INSERT INTO lesson_progress (user_id, lesson_id, watched_seconds, is_completed, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            progress
+        )
+    conn.commit()
+    conn.close()
+
+
+def run(conn: sqlite3.Connection, params: dict, repeat: int) -> dict:
+    """Har bir so'rov uchun reja va o'rtacha vaqt"""
+    results = {}
+    for name, sql in QUERIES.items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params).fetchall()
+        results[name] = ((time.perf_counter() - started) / repeat * 1000, plan)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200_000, help="foydalanuvchilar soni (har biri 3 ta xarid)")
+    parser.add_argument("--courses", type=int, default=500)
+    parser.add_argument("--lessons", type=int, default=20, help="har bir kursdagi darslar")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        started = time.perf_counter()
+        seed(path, args.users, args.courses, args.lessons)
+        print(f"{args.users:,} foydalanuvchi {time.perf_counter() - started:.1f}s da yozildi")
+        
+        user_id = args.users // 2
+        params = {
+            "user_id": user_id,
+            "course_id": args.courses // 2,
+            "transaction_id": f"tx-{user_id}-{args.courses // 2}",
+        }
+        
+        conn = sqlite3.connect(path)
+        for index in NEW_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+        conn.execute("ANALYZE")
+        before = run(conn, params, args.repeat)
+        
+        conn.commit()
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.begin() as migration_conn:
+            join_table_indexes(migration_conn)
+        engine.dispose()
+        conn.execute("ANALYZE")
+        after = run(conn, params, args.repeat)
+        conn.close()
+    
+    for name in QUERIES:
+        print(f"\n== {name}")
+        for label, (elapsed, plan) in (("indekssiz", before[name]), ("indeks bilan", after[name])):
+            print(f"  {label:<13} {elapsed:9.2f} ms")
+            for step in plan:
+                print(f"      {step}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+SQLite rejimi: bir nechta jarayon (bot + API) bir vaqtda o'qiydi va yozadi.
+
+Har bir worker alohida jarayonda ishga tushadi va --duration davomida
+--tasks ta parallel task bilan aralash yuklama beradi (asosan katalog o'qish,
+qolgani foydalanuvchi upsert + kurs sotib olish). Ikki rejim solishtiriladi:
+  default - eski sozlamalar (rollback journal, busy_timeout yo'q, navbatsiz)
+  tuned   - WAL, synchronous=NORMAL, busy_timeout, mmap/cache va yozuvlar navbati
+
+Ishga tushirish (api/ papkasidan):
+    python -m benchmarks.sqlite_concurrency --workers 2 --tasks 20 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    "default": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT": "0",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_CACHE_SIZE_KB": "2000",
+        "SQLITE_WRITER_QUEUE": "false",
+    },
+    "tuned": {},  # config.py dagi standart qiymatlar
+}
+
+COURSES = 20
+
+
+async def setup():
+    """Sxema va kurslar"""
+    from database.base import init_db
+    from database.repositories import CourseRepository
+    
+    await init_db()
+    for i in range(COURSES):
+        await CourseRepository().create_course(title=f"Kurs {i}", description="d", price=1000)
+
+
+async def worker(worker_id: int, tasks: int, duration: float, write_ratio: float) -> dict:
+    """Bitta jarayon: parallel tasklar bilan aralash yuklama"""
+    from database.repositories import CourseRepository, UserRepository
+    
+    stats = {"reads": 0, "writes": 0, "errors": 0, "latencies": []}
+    deadline = time.perf_counter() + duration
+    
+    async def run_task(task_id: int):
+        telegram_id = worker_id * 100_000 + task_id
+        n = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if random.random() < write_ratio:
+                    n += 1
+                    repo = UserRepository()
+                    await repo.create_or_update_user(telegram_id, f"u{n}", f"User {n}")
+                    await repo.add_purchased_course(telegram_id, random.randint(1, COURSES))
+                    stats["writes"] += 1
+                else:
+                    await CourseRepository().get_all_active_courses()
+                    stats["reads"] += 1
+            except Exception:
+                stats["errors"] += 1
+            stats["latencies"].append(time.perf_counter() - started)
+    
+    await asyncio.gather(*(run_task(i) for i in range(tasks)))
+    
+    latencies = sorted(stats.pop("latencies")) or [0.0]
+    stats["p50_ms"] = latencies[len(latencies) // 2] * 1000
+    stats["p99_ms"] = latencies[int(len(latencies) * 0.99)] * 1000
+    return stats
+
+
+def run_mode(mode: str, args) -> list:
+    """Bir rejimda bazani tayyorlash va workerlarni parallel ishga tushirish"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            **MODES[mode],
+            "DATABASE_URL": f"sqlite+aiosqlite:///{tmp}/bench.db",
+        }
+        command = [sys.executable, "-m", "benchmarks.sqlite_concurrency"]
+        subprocess.run(command + ["--setup"], env=env, check=True)
+        
+        processes = [
+            subprocess.Popen(
+                command + [
+                    "--worker", str(worker_id), "--tasks", str(args.tasks),
+                    "--duration", str(args.duration), "--write-ratio", str(args.write_ratio),
+                ],
+                env=env, stdout=subprocess.PIPE, text=True
+            )
+            for worker_id in range(1, args.workers + 1)
+        ]
+        return [json.loads(process.communicate()[0]) for process in processes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="jarayonlar soni (bot + API)")
+    parser.add_argument("--tasks", type=int, default=20, help="har bir jarayondagi parallel tasklar")
+    parser.add_argument("--duration", type=float, default=10.0, help="sekundlarda")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--setup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.setup:
+        asyncio.run(setup())
+        return
+    if args.worker:
+        result = asyncio.run(worker(args.worker, args.tasks, args.duration, args.write_ratio))
+        print(json.dumps(result))
+        return
+    
+    for mode in MODES:
+        results = run_mode(mode, args)
+        reads = sum(r["reads"] for r in results)
+        writes = sum(r["writes"] for r in results)
+        errors = sum(r["errors"] for r in results)
+        p99 = max(r["p99_ms"] for r in results)
+        print(
+            f"{mode:<8} o'qish {reads / args.duration:8.1f}/s  yozish {writes / args.duration:7.1f}/s  "
+            f"xato {errors:5d}  p99 {p99:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Analitika so'rovlari: func.date() predikati va yarim ochiq oraliq taqqoslash.
+
+Vaqtinchalik SQLite bazaga millionlab users/payments qatorlari yoziladi,
+so'ng har ikkala predikat uchun EXPLAIN QUERY PLAN va bajarilish vaqti chiqariladi.
+
+Ishga tushirish (api/ papkasidan):
+    python -m benchmarks.stats_query_plan --rows 2000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from database.base import Base
+from database import models  # noqa: F401 - jadvallarni ro'yxatdan o'tkazish
+
+BATCH = 50_000
+
+QUERIES = {
+    "users_today": (
+        "SELECT count(id) FROM users WHERE date(created_at) = :today",
+        "SELECT count(id) FROM users WHERE created_at >= :today_start AND created_at < :tomorrow",
+    ),
+    "payments_week": (
+        "SELECT count(id), coalesce(sum(amount), 0) FROM payments "
+        "WHERE status = 'completed' AND date(created_at) >= :week_ago",
+        "SELECT count(id), coalesce(sum(amount), 0) FROM payments "
+        "WHERE status = 'completed' AND created_at >= :week_ago_start AND created_at < :tomorrow",
+    ),
+}
+
+
+def seed(path: str, rows: int, days: int):
+    """Sxemani yaratish va tasodifiy qatorlar bilan to'ldirish"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    now = datetime.utcnow()
+    statuses = ["completed", "pending", "failed"]
+    
+    for start in range(0, rows, BATCH):
+        users = []
+        payments = []
+        for i in range(start, min(start + BATCH, rows)):
+            created = (now - timedelta(seconds=random.randint(0, days * 86400))).isoformat(" ")
+            users.append((i + 1, 10_000_000 + i, f"user{i}", 0, False, True, created, created))
+            payments.append((i + 1, 1, 100.0, "UZS", "click", random.choice(statuses), created, created))
+        conn.executemany(
+            "INSERT INTO users (id, telegram_id, full_name, balance, is_admin, is_active, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            users
+        )
+        conn.executemany(
+            "INSERT INTO payments (user_id, course_id, amount, currency, payment_type, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            payments
+        )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def run(path: str, repeat: int):
+    today = datetime.utcnow().date()
+    today_start = datetime.combine(today, datetime.min.time())
+    params = {
+        "today": today.isoformat(),
+        "today_start": today_start.isoformat(" "),
+        "tomorrow": (today_start + timedelta(days=1)).isoformat(" "),
+        "week_ago": (today - timedelta(days=7)).isoformat(),
+        "week_ago_start": (today_start - timedelta(days=7)).isoformat(" "),
+    }
+    
+    conn = sqlite3.connect(path)
+    for name, (before, after) in QUERIES.items():
+        print(f"\n== {name}")
+        for label, sql in (("func.date()", before), ("half-open range", after)):
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            started = time.perf_counter()
+            for _ in range(repeat):
+                result = conn.execute(sql, params).fetchone()
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+            print(f"  {label:<16} {elapsed:9.2f} ms  result={result}")
+            for step in plan:
+                print(f"      {step}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000, help="users va payments qatorlari soni")
+    parser.add_argument("--days", type=int, default=730, help="created_at tarqalishi (kun)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        started = time.perf_counter()
+        seed(path, args.rows, args.days)
+        print(f"{args.rows:,} qator {time.perf_counter() - started:.1f}s da yozildi")
+        run(path, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Kirish huquqlari keshi (jarayon ichida)
+
+telegram_id -> sotib olingani tasdiqlangan kurslar to'plami. Faqat ijobiy
+javoblar saqlanadi: keshda yo'q kurs bazadan tekshiriladi, shuning uchun
+boshqa jarayonda (masalan, botda) qilingan xarid darhol ko'rinadi.
+Foydalanuvchilar LRU bo'yicha chiqariladi, har bir yozuv TTL'dan keyin eskiradi.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Tuple
+
+from config import config
+
+
+class EntitlementCache:
+    """LRU + TTL kesh; asyncio uchun (bitta oqim) qulfsiz"""
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, FrozenSet[int]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+    
+    def has(self, telegram_id: int, course_id: int) -> bool:
+        """Keshdan tekshirish; True bo'lmasa chaqiruvchi bazaga murojaat qiladi"""
+        entry = self._entries.get(telegram_id)
+        if entry is not None:
+            expires_at, course_ids = entry
+            if expires_at < time.monotonic():
+                del self._entries[telegram_id]
+            elif course_id in course_ids:
+                self._entries.move_to_end(telegram_id)
+                self.hits += 1
+                return True
+        self.misses += 1
+        return False
+    
+    def add(self, telegram_id: int, course_id: int):
+        """Tasdiqlangan kirishni qo'shish (TTL yangilanadi)"""
+        if not self.enabled:
+            return
+        entry = self._entries.pop(telegram_id, None)
+        course_ids = entry[1] if entry and entry[0] >= time.monotonic() else frozenset()
+        self._entries[telegram_id] = (time.monotonic() + self.ttl, course_ids | {course_id})
+        
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate_user(self, telegram_id: int):
+        self._entries.pop(telegram_id, None)
+    
+    def invalidate_course(self, course_id: int):
+        """Kurs o'chirilganda: uni hech kimga keshdan berilmasin"""
+        for telegram_id, (expires_at, course_ids) in list(self._entries.items()):
+            if course_id in course_ids:
+                self._entries[telegram_id] = (expires_at, course_ids - {course_id})
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+entitlement_cache = EntitlementCache(config.entitlement_cache_size, config.entitlement_cache_ttl)
@@ -0,0 +1,327 @@
+"""
+Versiyalangan sxema migratsiyalari
+
+Har bir migratsiya - (versiya, nom, funksiya). Funksiya sinxron Connection oladi
+va o'z tranzaksiyasida bajariladi, so'ng versiya schema_version jadvaliga yoziladi.
+
+1-migratsiya sxemani joriy modellardan yaratadi, shuning uchun keyingilari
+idempotent bo'lishi kerak: yangi bazada ular hech narsa qilmaydi, eski bazani
+esa oxirgi holatga olib keladi. Yangi migratsiya faqat ro'yxat oxiriga qo'shiladi.
+"""
+import logging
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from database.base import Base, engine
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock kaliti: bir vaqtda faqat bitta jarayon migratsiya qiladi
+MIGRATION_LOCK_ID = 72_450_011
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _columns(conn: Connection, table: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn: Connection, table: str, name: str, ddl: str) -> bool:
+    """Ustun yo'q bo'lsa qo'shish"""
+    if name in _columns(conn, table):
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+    return True
+
+
+def _create_indexes(conn: Connection, table: str, *names: str):
+    """Modelda e'lon qilingan indekslarni (yo'q bo'lsa) yaratish"""
+    for index in Base.metadata.tables[table].indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+def initial_schema(conn: Connection):
+    """Jadvallarni joriy modellardan yaratish (mavjudlariga tegmaydi)"""
+    from database import models  # noqa: F401 - jadvallarni ro'yxatdan o'tkazish
+    
+    Base.metadata.create_all(conn)
+
+
+def course_ton_price(conn: Connection):
+    """courses.ton_price (avval migrations/add_ton_price.sql)"""
+    _add_column(conn, "courses", "ton_price", "FLOAT DEFAULT 0")
+
+
+def stats_indexes(conn: Connection):
+    """Analitika uchun payments(status, created_at)"""
+    _create_indexes(conn, "payments", "ix_payments_status_created_at")
+
+
+def join_table_indexes(conn: Connection):
+    """Join jadvallaridagi FK/lookup indekslari va unique juftliklar"""
+    # Unique indekslardan oldin takroriy qatorlarni tozalash (eng birinchisi qoladi)
+    conn.execute(text(
+        "DELETE FROM user_courses WHERE id NOT IN "
+        "(SELECT MIN(id) FROM user_courses GROUP BY user_id, course_id)"
+    ))
+    conn.execute(text(
+        "DELETE FROM lesson_progress WHERE id NOT IN "
+        "(SELECT MIN(id) FROM lesson_progress GROUP BY user_id, lesson_id)"
+    ))
+    
+    _create_indexes(conn, "user_courses", "ux_user_courses_user_id_course_id", "ix_user_courses_course_id")
+    _create_indexes(conn, "lessons", "ix_lessons_course_id_order")
+    _create_indexes(
+        conn, "payments",
+        "ix_payments_user_id", "ix_payments_course_id_status", "ix_payments_transaction_id"
+    )
+    _create_indexes(
+        conn, "lesson_progress",
+        "ux_lesson_progress_user_id_lesson_id", "ix_lesson_progress_lesson_id"
+    )
+
+
+def course_counters(conn: Connection):
+    """Kurs hisoblagichlari va ularni mavjud ma'lumotdan to'ldirish"""
+    added = [
+        _add_column(conn, "courses", name, "INTEGER NOT NULL DEFAULT 0")
+        for name in ("lessons_count", "total_duration_seconds", "sales_count")
+    ]
+    if any(added):
+        conn.execute(text(
+            "UPDATE courses SET "
+            "lessons_count = (SELECT COUNT(*) FROM lessons WHERE lessons.course_id = courses.id), "
+            "total_duration_seconds = (SELECT COALESCE(SUM(duration), 0) FROM lessons "
+            "WHERE lessons.course_id = courses.id), "
+            "sales_count = (SELECT COUNT(*) FROM user_courses WHERE user_courses.course_id = courses.id)"
+        ))
+
+
+def users_keyset_index(conn: Connection):
+    """users(created_at, id) - keyset pagination; eski bitta ustunli indeks ortiqcha"""
+    _create_indexes(conn, "users", "ix_users_created_at_id")
+    conn.execute(text("DROP INDEX IF EXISTS ix_users_created_at"))
+
+
+# ON DELETE CASCADE bo'lishi kerak bo'lgan FK'lar: (jadval, ustun, ota jadval)
+CASCADE_FOREIGN_KEYS = [
+    ("lessons", "course_id", "courses"),
+    ("user_courses", "course_id", "courses"),
+    ("payments", "course_id", "courses"),
+    ("lesson_progress", "lesson_id", "lessons"),
+]
+
+
+def course_soft_delete(conn: Connection):
+    """courses.deleted_at va kurs bolalari uchun ON DELETE CASCADE"""
+    _add_column(conn, "courses", "deleted_at", "TIMESTAMP")
+    
+    # SQLite'da FK'ni o'zgartirish jadvalni qayta qurishni talab qiladi - 9-migratsiya
+    if conn.dialect.name != "postgresql":
+        return
+    
+    inspector = inspect(conn)
+    for table, column, parent in CASCADE_FOREIGN_KEYS:
+        for fk in inspector.get_foreign_keys(table):
+            if fk["constrained_columns"] != [column] or fk["options"].get("ondelete") == "CASCADE":
+                continue
+            name = fk["name"]
+            conn.execute(text(
+                f"ALTER TABLE {table} DROP CONSTRAINT {name}, "
+                f"ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {parent}(id) ON DELETE CASCADE"
+            ))
+
+
+# SQLite: courses.search_key ustidagi FTS5 indeks (external content) va sinxron triggerlar
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS courses_fts USING fts5("
+    "search_key, content='courses', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS courses_fts_ai AFTER INSERT ON courses BEGIN "
+    "INSERT INTO courses_fts(rowid, search_key) VALUES (new.id, new.search_key); END",
+    "CREATE TRIGGER IF NOT EXISTS courses_fts_ad AFTER DELETE ON courses BEGIN "
+    "INSERT INTO courses_fts(courses_fts, rowid, search_key) VALUES ('delete', old.id, old.search_key); END",
+    "CREATE TRIGGER IF NOT EXISTS courses_fts_au AFTER UPDATE OF search_key ON courses BEGIN "
+    "INSERT INTO courses_fts(courses_fts, rowid, search_key) VALUES ('delete', old.id, old.search_key); "
+    "INSERT INTO courses_fts(rowid, search_key) VALUES (new.id, new.search_key); END",
+    "INSERT INTO courses_fts(courses_fts) VALUES ('rebuild')",
+]
+
+# PostgreSQL: so'zlar bo'yicha (tsvector) va o'xshashlik/qism-satr (trigram) indekslari
+POSTGRES_SEARCH_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_courses_search_tsv ON courses "
+    "USING gin (to_tsvector('simple'::regconfig, coalesce(search_key, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_courses_search_trgm ON courses "
+    "USING gin (search_key gin_trgm_ops)",
+]
+
+
+def course_search(conn: Connection):
+    """courses.search_key, mavjud kurslar uchun to'ldirish va qidiruv indekslari"""
+    from database.search import course_search_key
+    
+    _add_column(conn, "courses", "search_key", "TEXT")
+    
+    rows = conn.execute(text(
+        "SELECT id, title, category, description FROM courses WHERE search_key IS NULL"
+    )).all()
+    if rows:
+        conn.execute(
+            text("UPDATE courses SET search_key = :key WHERE id = :id"),
+            [{"id": row.id, "key": course_search_key(row.title, row.category, row.description)} for row in rows]
+        )
+    
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        statements = POSTGRES_SEARCH_DDL
+    elif conn.dialect.name == "sqlite":
+        if not conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+            # FTS5'siz SQLite: jadval va triggerlarsiz, qidiruv LIKE bilan (_has_sqlite_fts)
+            logger.warning("SQLite FTS5'siz yig'ilgan - courses_fts yaratilmadi")
+            return
+        statements = SQLITE_SEARCH_DDL
+    else:
+        return
+    
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def sqlite_cascade_foreign_keys(conn: Connection):
+    """SQLite: create_all'dan qolgan CASCADE'siz FK'li jadvallarni qayta qurish
+    
+    Ulanishlar PRAGMA foreign_keys=ON bilan ochiladi; eski bazada CASCADE'siz
+    FK bo'lsa dars/kurs o'chirish IntegrityError beradi. SQLite FK'ni
+    o'zgartira olmaydi - jadval modeldan yangi nom bilan yaratiladi, ma'lumot
+    ko'chiriladi va almashtiriladi (migrate() bu vaqtda foreign_keys=OFF qiladi).
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    
+    inspector = inspect(conn)
+    rebuilt = []
+    for table, column, parent in CASCADE_FOREIGN_KEYS:
+        if not any(
+            fk["constrained_columns"] == [column] and fk["options"].get("ondelete", "").upper() != "CASCADE"
+            for fk in inspector.get_foreign_keys(table)
+        ):
+            continue
+        
+        model = Base.metadata.tables[table]
+        existing = _columns(conn, table)
+        quote = conn.dialect.identifier_preparer.quote
+        columns = ", ".join(quote(c.name) for c in model.columns if c.name in existing)
+        # Ota qatori yo'q bolalar (FK tekshirilmagan paytdan) - CASCADE ularni allaqachon o'chirgan bo'lardi
+        orphans = conn.execute(text(
+            f"DELETE FROM {table} WHERE {column} NOT IN (SELECT id FROM {parent})"
+        )).rowcount
+        if orphans:
+            logger.warning("%s: ota qatori yo'q %s ta yozuv o'chirildi", table, orphans)
+        
+        ddl = str(CreateTable(model).compile(dialect=conn.dialect)).strip()
+        conn.execute(text(ddl.replace(f"CREATE TABLE {table} ", f"CREATE TABLE {table}__new ", 1)))
+        conn.execute(text(f"INSERT INTO {table}__new ({columns}) SELECT {columns} FROM {table}"))
+        conn.execute(text(f"DROP TABLE {table}"))
+        conn.execute(text(f"ALTER TABLE {table}__new RENAME TO {table}"))
+        for index in model.indexes:
+            index.create(conn, checkfirst=True)
+        rebuilt.append(table)
+        inspector = inspect(conn)
+    
+    for table in rebuilt:
+        # Boshqa FK'lar (masalan user_id) bo'yicha eski yetim qatorlar - faqat ogohlantirish
+        violations = conn.execute(text(f"PRAGMA foreign_key_check({table})")).all()
+        if violations:
+            logger.warning("%s: FK tekshiruvidan o'tmagan %s ta qator", table, len(violations))
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "initial_schema", initial_schema),
+    (2, "course_ton_price", course_ton_price),
+    (3, "stats_indexes", stats_indexes),
+    (4, "join_table_indexes", join_table_indexes),
+    (5, "course_counters", course_counters),
+    (6, "users_keyset_index", users_keyset_index),
+    (7, "course_soft_delete", course_soft_delete),
+    (8, "course_search", course_search),
+    (9, "sqlite_cascade_foreign_keys", sqlite_cascade_foreign_keys),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_schema_version(conn: AsyncConnection) -> int:
+    """Bazadagi sxema versiyasi (schema_version jadvali bo'lmasa - 0)"""
+    try:
+        result = await conn.execute(select(func.max(schema_version.c.version)))
+        return result.scalar() or 0
+    except DBAPIError:
+        await conn.rollback()
+        return 0
+
+
+async def migrate(target: Optional[int] = None) -> List[int]:
+    """Qo'llanmagan migratsiyalarni tartib bilan bajarish; qo'llanganlar versiyalari qaytadi"""
+    target = target or LATEST_VERSION
+    applied = []
+    
+    async with engine.connect() as conn:
+        # Tezkor yo'l: sxema allaqachon oxirgi versiyada
+        if await get_schema_version(conn) >= target:
+            await conn.rollback()
+            return applied
+        await conn.rollback()
+        
+        is_postgres = conn.dialect.name == "postgresql"
+        is_sqlite = conn.dialect.name == "sqlite"
+        if is_sqlite:
+            # Jadvallarni qayta qurish uchun (tranzaksiya ichida PRAGMA ta'sir qilmaydi)
+            await conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            await conn.commit()
+        if is_postgres:
+            # Bir nechta worker deploy paytida DDL uchun poyga qilmasligi uchun
+            await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_ID})
+            await conn.commit()
+        
+        try:
+            async with conn.begin():
+                await conn.run_sync(schema_version.create, checkfirst=True)
+            
+            # Lock olingandan keyin qayta tekshirish: boshqa jarayon bajargan bo'lishi mumkin
+            current = await get_schema_version(conn)
+            await conn.rollback()
+            
+            for version, name, upgrade in MIGRATIONS:
+                if version <= current or version > target:
+                    continue
+                
+                logger.info("Migratsiya %s: %s", version, name)
+                async with conn.begin():
+                    await conn.run_sync(upgrade)
+                    await conn.execute(schema_version.insert().values(
+                        version=version, name=name, applied_at=datetime.utcnow()
+                    ))
+                applied.append(version)
+        finally:
+            if is_sqlite:
+                await conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+                await conn.commit()
+            if is_postgres:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_ID})
+                await conn.commit()
+    
+    return applied
@@ -1,14 +1,19 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
-from sqlalchemy import BigInteger, Boolean, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Float, ForeignKey, Index, Integer, String, Text, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from database.base import Base
+from database.search import course_search_key
 
 
 class User(Base):
     """Foydalanuvchi modeli"""
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset pagination (created_at, id) va sana bo'yicha filtrlar
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False, index=True)
@@ -39,23 +44,47 @@ class Course(Base):
     thumbnail: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     category: Mapped[str] = mapped_column(String(100), default="Boshqa")
     duration: Mapped[int] = mapped_column(Integer, default=0)  # soatlarda
+    # Denormalizatsiya qilingan hisoblagichlar (dars/xarid tranzaksiyasida yangilanadi)
+    lessons_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    total_duration_seconds: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    sales_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     author_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     order: Mapped[int] = mapped_column(Integer, default=0)
+    # Soft-delete: o'chirilgan kurs darhol yashiriladi, ma'lumotlari fonda tozalanadi
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Normallashtirilgan qidiruv kaliti (database/search.py) - saqlashda to'ldiriladi
+    search_key: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    lessons: Mapped[List["Lesson"]] = relationship("Lesson", back_populates="course", order_by="Lesson.order")
-    user_courses: Mapped[List["UserCourse"]] = relationship("UserCourse", back_populates="course")
+    # passive_deletes: bog'liq qatorlarni bazadagi ON DELETE CASCADE o'chiradi
+    lessons: Mapped[List["Lesson"]] = relationship(
+        "Lesson", back_populates="course", order_by="Lesson.order", passive_deletes=True
+    )
+    user_courses: Mapped[List["UserCourse"]] = relationship(
+        "UserCourse", back_populates="course", passive_deletes=True
+    )
+
+
+@event.listens_for(Course, "before_insert")
+@event.listens_for(Course, "before_update")
+def _update_course_search_key(mapper, connection, course: Course):
+    """Nom, kategoriya yoki tavsif o'zgarganda qidiruv kalitini yangilash"""
+    course.search_key = course_search_key(course.title, course.category, course.description)
 
 
 class Lesson(Base):
     """Dars modeli"""
     __tablename__ = "lessons"
+    __table_args__ = (
+        # Kurs darslari tartib bilan: get_lessons_by_course, delete_course
+        Index("ix_lessons_course_id_order", "course_id", "order"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    course_id: Mapped[int] = mapped_column(Integer, ForeignKey("courses.id"), nullable=False)
+    course_id: Mapped[int] = mapped_column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     video_file_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
@@ -72,10 +101,16 @@ class Lesson(Base):
 class UserCourse(Base):
     """Foydalanuvchi-Kurs bog'lanishi (sotib olingan kurslar)"""
     __tablename__ = "user_courses"
+    __table_args__ = (
+        # Kirish tekshiruvi va bitta kursni ikki marta sotib olishdan himoya
+        Index("ux_user_courses_user_id_course_id", "user_id", "course_id", unique=True),
+        # Top kurslar va kursni o'chirish
+        Index("ix_user_courses_course_id", "course_id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
-    course_id: Mapped[int] = mapped_column(Integer, ForeignKey("courses.id"), nullable=False)
+    course_id: Mapped[int] = mapped_column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
     progress: Mapped[int] = mapped_column(Integer, default=0)  # 0-100%
     current_lesson_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
@@ -89,10 +124,17 @@ class UserCourse(Base):
 class Payment(Base):
     """To'lov modeli"""
     __tablename__ = "payments"
+    __table_args__ = (
+        # Analitika: status + vaqt oralig'i bo'yicha
+        Index("ix_payments_status_created_at", "status", "created_at"),
+        Index("ix_payments_user_id", "user_id"),
+        Index("ix_payments_course_id_status", "course_id", "status"),
+        Index("ix_payments_transaction_id", "transaction_id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
-    course_id: Mapped[int] = mapped_column(Integer, ForeignKey("courses.id"), nullable=False)
+    course_id: Mapped[int] = mapped_column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
     amount: Mapped[float] = mapped_column(Float, nullable=False)
     currency: Mapped[str] = mapped_column(String(10), default="UZS")
     payment_type: Mapped[str] = mapped_column(String(50), nullable=False)  # click, payme, telegram_stars, ton
@@ -108,11 +150,28 @@ class Payment(Base):
 class LessonProgress(Base):
     """Dars progressi"""
     __tablename__ = "lesson_progress"
+    __table_args__ = (
+        Index("ux_lesson_progress_user_id_lesson_id", "user_id", "lesson_id", unique=True),
+        # Kursni o'chirishda lesson_id bo'yicha
+        Index("ix_lesson_progress_lesson_id", "lesson_id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
-    lesson_id: Mapped[int] = mapped_column(Integer, ForeignKey("lessons.id"), nullable=False)
+    lesson_id: Mapped[int] = mapped_column(Integer, ForeignKey("lessons.id", ondelete="CASCADE"), nullable=False)
     watched_seconds: Mapped[int] = mapped_column(Integer, default=0)
     is_completed: Mapped[bool] = mapped_column(Boolean, default=False)
     completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class DailyStats(Base):
+    """Kunlik statistika (analitika uchun inkremental rollup, UTC sana)"""
+    __tablename__ = "daily_stats"
+    
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    new_users: Mapped[int] = mapped_column(Integer, default=0)
+    payments_count: Mapped[int] = mapped_column(Integer, default=0)  # faqat completed
+    revenue_uzs: Mapped[float] = mapped_column(Float, default=0)
+    revenue_xtr: Mapped[float] = mapped_column(Float, default=0)  # Telegram Stars
+    revenue_ton: Mapped[float] = mapped_column(Float, default=0)
@@ -1,13 +1,167 @@
-from datetime import datetime, date
-from typing import List, Optional
-from sqlalchemy import select, func, delete
+import base64
+from contextlib import asynccontextmanager
+from datetime import datetime, date, time, timedelta
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import (
+    select, func, or_, delete, insert, update, tuple_, table, column, literal_column, text, DateTime, Integer
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from database.base import async_session
-from database.models import User, Course, Lesson, Payment, UserCourse, LessonProgress
+from database.base import async_session, read_session, has_replica, is_primary_pinned
+from database.entitlements import entitlement_cache
+from database.models import User, Course, Lesson, Payment, UserCourse, LessonProgress, DailyStats
+from database.search import search_tokens
 
 
-class UserRepository:
+def _day_start(day: date) -> datetime:
+    """Kun boshlanishi (00:00) - sana bo'yicha filtrlar uchun"""
+    return datetime.combine(day, time.min)
+
+
+# daily_stats'dagi valyuta ustunlari
+REVENUE_COLUMNS = {"UZS": "revenue_uzs", "XTR": "revenue_xtr", "TON": "revenue_ton"}
+
+
+def _insert_for(session: AsyncSession):
+    """Dialektga mos INSERT (ON CONFLICT bilan)"""
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+async def _bump_daily_stats(session: AsyncSession, day: date, **deltas):
+    """daily_stats qatoriga atomik qo'shish (joriy tranzaksiyada)"""
+    stmt = _insert_for(session)(DailyStats).values(day=day, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyStats.day],
+        set_={name: getattr(DailyStats, name) + stmt.excluded[name] for name in deltas}
+    )
+    await session.execute(stmt)
+
+
+async def _record_payment_stats(session: AsyncSession, payment: Payment, sign: int = 1):
+    """Tugallangan to'lovni kunlik statistikaga qo'shish (sign=-1 - ayirish)"""
+    deltas = {"payments_count": sign}
+    column = REVENUE_COLUMNS.get(payment.currency)
+    if column:
+        deltas[column] = sign * payment.amount
+    await _bump_daily_stats(session, payment.created_at.date(), **deltas)
+
+
+def _users_page_query(limit: int, after: Optional[Tuple[datetime, int]] = None):
+    """Foydalanuvchilar sahifasi: (created_at, id) bo'yicha keyset, yangilari birinchi"""
+    stmt = select(User).order_by(User.created_at.desc(), User.id.desc()).limit(limit)
+    if after:
+        stmt = stmt.where(tuple_(User.created_at, User.id) < tuple_(*after, types=[DateTime, Integer]))
+    return stmt
+
+
+def encode_cursor(created_at: datetime, user_id: int) -> str:
+    """Sahifa kursorini yaratish (mijoz uchun shaffof emas)"""
+    raw = f"{created_at.isoformat()}|{user_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Kursorni (created_at, id) juftligiga aylantirish"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, user_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(user_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Noto'g'ri cursor")
+
+
+async def _bump_course_counters(session: AsyncSession, course_id: int, **deltas):
+    """Kurs hisoblagichlarini joriy tranzaksiyada o'zgartirish"""
+    values = {name: getattr(Course, name) + delta for name, delta in deltas.items()}
+    if "total_duration_seconds" in values:
+        values["duration"] = values["total_duration_seconds"] // 3600  # Soatlarga aylantirish
+    if set(deltas) == {"sales_count"}:
+        # Sotuv katalog mazmunini o'zgartirmaydi - updated_at (va ETag) o'zgarmasin
+        values["updated_at"] = Course.updated_at
+    await session.execute(update(Course).where(Course.id == course_id).values(values))
+
+
+# Qidiruv: PostgreSQL - tsvector + trigram, SQLite - FTS5, boshqalar - LIKE
+_SEARCH_CONFIG = literal_column("'simple'::regconfig")
+_sqlite_fts: Optional[bool] = None
+
+
+def _postgres_search(stmt, tokens: List[str]):
+    """ix_courses_search_tsv (prefiks so'zlar) yoki ix_courses_search_trgm (xatoli yozilish)"""
+    document = func.to_tsvector(_SEARCH_CONFIG, func.coalesce(Course.search_key, literal_column("''")))
+    query = func.to_tsquery(_SEARCH_CONFIG, " & ".join(f"{token}:*" for token in tokens))
+    phrase = " ".join(tokens)
+    rank = func.ts_rank(document, query) + func.word_similarity(phrase, Course.search_key)
+    return (
+        stmt.where(or_(document.op("@@")(query), Course.search_key.op("%>")(phrase)))
+        .order_by(rank.desc(), Course.id)
+    )
+
+
+def _sqlite_fts_search(stmt, tokens: List[str]):
+    """courses_fts MATCH (har bir so'z prefiks sifatida), bm25 bo'yicha"""
+    fts = table("courses_fts", column("rowid"))
+    match = " ".join(f'"{token}"*' for token in tokens)
+    return (
+        stmt.join(fts, fts.c.rowid == Course.id)
+        .where(text("courses_fts MATCH :match").bindparams(match=match))
+        .order_by(text("bm25(courses_fts)"), Course.id)
+    )
+
+
+def _like_search(stmt, tokens: List[str]):
+    """Indekssiz zaxira yo'l: barcha so'zlar search_key ichida bo'lsin"""
+    return (
+        stmt.where(*(Course.search_key.like(f"%{token}%") for token in tokens))
+        .order_by(Course.order, Course.id)
+    )
+
+
+async def _has_sqlite_fts(session: AsyncSession) -> bool:
+    """courses_fts jadvali bormi (SQLite FTS5'siz yig'ilgan bo'lishi mumkin)"""
+    global _sqlite_fts
+    if _sqlite_fts is None:
+        result = await session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'courses_fts'")
+        )
+        _sqlite_fts = result.scalar() is not None
+    return _sqlite_fts
+
+
+class BaseRepository:
+    """Repository asosi: tashqaridan berilgan session (unit of work) yoki yangisi"""
+    
+    def __init__(self, session: Optional[AsyncSession] = None):
+        self.session = session
+    
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[AsyncSession]:
+        """So'rov sessionini qayta ishlatish, bo'lmasa qisqa muddatli session ochish"""
+        if self.session is not None:
+            yield self.session
+            return
+        
+        async with async_session() as session:
+            yield session
+    
+    @asynccontextmanager
+    async def _read_session(self) -> AsyncIterator[AsyncSession]:
+        """Faqat o'qish uchun: replika (yozuvdan keyin yoki replika bo'lmasa - asosiy baza)"""
+        if not has_replica() or is_primary_pinned():
+            async with self._session() as session:
+                yield session
+            return
+        
+        async with read_session() as session:
+            yield session
+
+
+class UserRepository(BaseRepository):
     """Foydalanuvchi uchun repository"""
     
     async def create_or_update_user(
@@ -16,32 +170,52 @@ class UserRepository:
         username: Optional[str] = None,
         full_name: str = ""
     ) -> User:
-        """Foydalanuvchi yaratish yoki yangilash"""
-        async with async_session() as session:
-            result = await session.execute(
-                select(User).where(User.telegram_id == telegram_id)
-            )
+        """Foydalanuvchi yaratish yoki yangilash (bitta upsert, o'zgarmagan bo'lsa yozmaydi)"""
+        now = datetime.utcnow()
+        
+        async with self._session() as session:
+            stmt = _insert_for(session)(User).values(
+                telegram_id=telegram_id,
+                username=username,
+                full_name=full_name,
+                created_at=now,
+                updated_at=now
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[User.telegram_id],
+                set_={
+                    "username": stmt.excluded.username,
+                    "full_name": stmt.excluded.full_name,
+                    "updated_at": now
+                },
+                where=or_(
+                    User.username.is_distinct_from(stmt.excluded.username),
+                    User.full_name.is_distinct_from(stmt.excluded.full_name)
+                )
+            ).returning(User)
+            
+            result = await session.execute(stmt, execution_options={"populate_existing": True})
             user = result.scalar_one_or_none()
             
-            if user:
-                user.username = username
-                user.full_name = full_name
-                user.updated_at = datetime.utcnow()
-            else:
-                user = User(
-                    telegram_id=telegram_id,
-                    username=username,
-                    full_name=full_name
+            if user is None:
+                # Hech narsa o'zgarmadi: upsert ochgan yozuv tranzaksiyasini yopib, mavjud qatorni o'qish
+                await session.commit()
+                result = await session.execute(
+                    select(User).where(User.telegram_id == telegram_id)
                 )
-                session.add(user)
+                return result.scalar_one()
+            
+            if user.created_at == now:
+                # Yangi foydalanuvchi: hali sotib olgan kurslari yo'q
+                set_committed_value(user, "purchased_courses", [])
+                await _bump_daily_stats(session, now.date(), new_users=1)
             
             await session.commit()
-            await session.refresh(user)
             return user
     
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         """Telegram ID bo'yicha foydalanuvchi olish"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(User)
                 .options(selectinload(User.purchased_courses).selectinload(UserCourse.course))
@@ -51,23 +225,24 @@ class UserRepository:
     
     async def get_users_count(self) -> int:
         """Foydalanuvchilar soni"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(select(func.count(User.id)))
             return result.scalar() or 0
     
     async def get_today_users_count(self) -> int:
         """Bugungi foydalanuvchilar soni"""
-        async with async_session() as session:
-            today = date.today()
+        async with self._read_session() as session:
+            # created_at UTC da, daily_stats kabi UTC kuni bo'yicha
+            today = _day_start(datetime.utcnow().date())
             result = await session.execute(
                 select(func.count(User.id))
-                .where(func.date(User.created_at) == today)
+                .where(User.created_at >= today, User.created_at < today + timedelta(days=1))
             )
             return result.scalar() or 0
     
     async def get_all_users(self, limit: int = 100, offset: int = 0) -> List[User]:
         """Barcha foydalanuvchilar"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(
                 select(User)
                 .order_by(User.created_at.desc())
@@ -76,46 +251,62 @@ class UserRepository:
             )
             return list(result.scalars().all())
     
-    async def get_weekly_users_count(self) -> int:
-        """Haftalik foydalanuvchilar soni"""
-        async with async_session() as session:
-            from datetime import timedelta
-            week_ago = date.today() - timedelta(days=7)
-            result = await session.execute(
-                select(func.count(User.id))
-                .where(func.date(User.created_at) >= week_ago)
-            )
-            return result.scalar() or 0
-    
-    async def get_monthly_users_count(self) -> int:
-        """Oylik foydalanuvchilar soni"""
-        async with async_session() as session:
-            from datetime import timedelta
-            month_ago = date.today() - timedelta(days=30)
-            result = await session.execute(
-                select(func.count(User.id))
-                .where(func.date(User.created_at) >= month_ago)
-            )
-            return result.scalar() or 0
-    
-    async def get_previous_week_users_count(self) -> int:
-        """O'tgan haftalik foydalanuvchilar (o'sish hisoblash uchun)"""
-        async with async_session() as session:
-            from datetime import timedelta
-            week_ago = date.today() - timedelta(days=7)
-            two_weeks_ago = date.today() - timedelta(days=14)
-            result = await session.execute(
-                select(func.count(User.id))
-                .where(
-                    func.date(User.created_at) >= two_weeks_ago,
-                    func.date(User.created_at) < week_ago
-                )
-            )
-            return result.scalar() or 0
+    async def get_users_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[User], Optional[str]]:
+        """Foydalanuvchilar sahifasi va keyingi sahifa kursori"""
+        after = decode_cursor(cursor) if cursor else None
+        async with self._read_session() as session:
+            result = await session.execute(_users_page_query(limit + 1, after))
+            users = list(result.scalars().all())
+        
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1].created_at, users[-1].id)
+        return users, next_cursor
+    
+    async def iter_all_users(self, batch_size: int = 1000) -> AsyncIterator[List[User]]:
+        """Barcha foydalanuvchilar - batch_size'lik bo'laklarda (ichki vazifalar uchun)"""
+        after = None
+        while True:
+            async with self._read_session() as session:
+                result = await session.execute(_users_page_query(batch_size, after))
+                users = list(result.scalars().all())
+            
+            if not users:
+                return
+            yield users
+            
+            if len(users) < batch_size:
+                return
+            after = (users[-1].created_at, users[-1].id)
+    
+    async def has_course_access(self, telegram_id: int, course_id: int, use_cache: bool = True) -> bool:
+        """Foydalanuvchi kursni sotib olganmi: avval kesh (use_cache), so'ng bitta indeksli EXISTS"""
+        if use_cache and entitlement_cache.has(telegram_id, course_id):
+            return True
+        
+        stmt = select(
+            select(UserCourse.id)
+            .join(User, User.id == UserCourse.user_id)
+            .where(User.telegram_id == telegram_id, UserCourse.course_id == course_id)
+            .exists()
+        )
+        # Asosiy bazadan: xariddan keyingi birinchi so'rov replika kechikishiga tushmasin
+        async with self._session() as session:
+            result = await session.execute(stmt)
+            has_access = bool(result.scalar())
+        
+        if has_access:
+            entitlement_cache.add(telegram_id, course_id)
+        return has_access
     
     async def add_purchased_course(self, telegram_id: int, course_id: int) -> UserCourse:
         """Kursni sotib olish"""
-        async with async_session() as session:
+        async with self._session() as session:
             # Foydalanuvchini topish
             result = await session.execute(
                 select(User).where(User.telegram_id == telegram_id)
@@ -135,14 +326,31 @@ class UserRepository:
             if existing:
                 return existing
             
-            user_course = UserCourse(user_id=user.id, course_id=course_id)
-            session.add(user_course)
+            # Parallel so'rov allaqachon qo'shgan bo'lsa - unique indeks bo'yicha hech narsa qilinmaydi.
+            # Savepoint emas: aiosqlite'da u tashqi tranzaksiya bo'lib, qator hisoblagichdan alohida commit bo'lardi
+            stmt = _insert_for(session)(UserCourse).values(user_id=user.id, course_id=course_id)
+            stmt = stmt.on_conflict_do_nothing(
+                index_elements=[UserCourse.user_id, UserCourse.course_id]
+            ).returning(UserCourse)
+            result = await session.execute(stmt)
+            user_course = result.scalar_one_or_none()
+            
+            if user_course is None:
+                # Yozuv tranzaksiyasini yopib, parallel so'rov qo'shgan qatorni o'qish
+                await session.commit()
+                result = await session.execute(
+                    select(UserCourse)
+                    .where(UserCourse.user_id == user.id, UserCourse.course_id == course_id)
+                )
+                return result.scalar_one()
+            
+            await _bump_course_counters(session, course_id, sales_count=1)
             await session.commit()
-            await session.refresh(user_course)
+            entitlement_cache.add(telegram_id, course_id)
             return user_course
 
 
-class CourseRepository:
+class CourseRepository(BaseRepository):
     """Kurs uchun repository"""
     
     async def create_course(
@@ -157,7 +365,7 @@ class CourseRepository:
         author_id: Optional[int] = None
     ) -> Course:
         """Yangi kurs yaratish"""
-        async with async_session() as session:
+        async with self._session() as session:
             course = Course(
                 title=title,
                 description=description,
@@ -173,32 +381,74 @@ class CourseRepository:
             await session.refresh(course)
             return course
     
+    async def import_course(
+        self,
+        course_data: dict,
+        lessons: List[dict],
+        batch_size: int = 500
+    ) -> Course:
+        """Kursni barcha darslari bilan bitta tranzaksiyada yaratish"""
+        async with self._session() as session:
+            course = Course(**course_data)
+            session.add(course)
+            await session.flush()
+            
+            rows = []
+            last_order = 0
+            for lesson in lessons:
+                # order berilmagan darslar oldingisidan keyin qo'yiladi
+                order = lesson.get("order") or last_order + 1
+                last_order = order
+                rows.append({
+                    "course_id": course.id,
+                    "title": lesson["title"],
+                    "description": lesson.get("description"),
+                    "video_file_id": lesson.get("video_file_id"),
+                    "video_url": lesson.get("video_url"),
+                    "duration": lesson.get("duration") or 0,
+                    "order": order,
+                    "is_free": lesson.get("is_free", False),
+                })
+            
+            # executemany: har bir partiya bitta so'rov
+            for start in range(0, len(rows), batch_size):
+                await session.execute(insert(Lesson), rows[start:start + batch_size])
+            
+            # Hisoblagichlar bir marta
+            total_duration = sum(row["duration"] for row in rows)
+            course.lessons_count = len(rows)
+            course.total_duration_seconds = total_duration
+            course.duration = total_duration // 3600  # Soatlarga aylantirish
+            
+            await session.commit()
+            await session.refresh(course)
+            return course
+    
     async def get_course_by_id(self, course_id: int) -> Optional[Course]:
         """ID bo'yicha kurs olish"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(
                 select(Course)
                 .options(selectinload(Course.lessons))
-                .where(Course.id == course_id)
+                .where(Course.id == course_id, Course.deleted_at.is_(None))
             )
             return result.scalar_one_or_none()
     
     async def get_all_courses(self) -> List[Course]:
-        """Barcha kurslar"""
-        async with async_session() as session:
+        """Barcha kurslar (o'chirilganlaridan tashqari)"""
+        async with self._read_session() as session:
             result = await session.execute(
                 select(Course)
-                .options(selectinload(Course.lessons))
+                .where(Course.deleted_at.is_(None))
                 .order_by(Course.order, Course.created_at.desc())
             )
             return list(result.scalars().all())
     
     async def get_all_active_courses(self) -> List[Course]:
         """Barcha faol kurslar"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(
                 select(Course)
-                .options(selectinload(Course.lessons))
                 .where(Course.is_active == True)
                 .order_by(Course.order, Course.created_at.desc())
             )
@@ -206,47 +456,101 @@ class CourseRepository:
     
     async def get_courses_by_category(self, category: str) -> List[Course]:
         """Kategoriya bo'yicha kurslar"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(
                 select(Course)
-                .options(selectinload(Course.lessons))
                 .where(Course.category == category, Course.is_active == True)
                 .order_by(Course.order)
             )
             return list(result.scalars().all())
     
+    async def search_courses(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[Course]:
+        """Faol kurslarni qidirish: normallashgan kalit bo'yicha, mosligi bo'yicha saralangan"""
+        tokens = search_tokens(query)
+        if not tokens:
+            return []
+        
+        stmt = select(Course).where(Course.is_active == True)
+        if category:
+            stmt = stmt.where(Course.category == category)
+        
+        async with self._read_session() as session:
+            dialect = session.get_bind().dialect.name
+            if dialect == "postgresql":
+                stmt = _postgres_search(stmt, tokens)
+            elif dialect == "sqlite" and await _has_sqlite_fts(session):
+                stmt = _sqlite_fts_search(stmt, tokens)
+            else:
+                stmt = _like_search(stmt, tokens)
+            
+            result = await session.execute(stmt.limit(limit).offset(offset))
+            return list(result.scalars().all())
+    
     async def get_courses_count(self) -> int:
         """Kurslar soni"""
-        async with async_session() as session:
-            result = await session.execute(select(func.count(Course.id)))
+        async with self._read_session() as session:
+            result = await session.execute(
+                select(func.count(Course.id)).where(Course.deleted_at.is_(None))
+            )
             return result.scalar() or 0
     
     async def get_lessons_count(self) -> int:
         """Jami darslar soni"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(select(func.count(Lesson.id)))
             return result.scalar() or 0
     
+    async def get_catalog_version(self) -> Tuple[Optional[datetime], int]:
+        """Katalog versiyasi: eng oxirgi updated_at va kurslar soni (HTTP ETag uchun)"""
+        async with self._read_session() as session:
+            result = await session.execute(select(func.max(Course.updated_at), func.count(Course.id)))
+            updated_at, count = result.one()
+            return updated_at, count
+    
     async def get_top_courses(self, limit: int = 5) -> list:
         """Top kurslar (eng ko'p sotilgan)"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(
-                select(
-                    Course.id,
-                    Course.title,
-                    func.count(UserCourse.id).label('sales_count')
-                )
-                .outerjoin(UserCourse, Course.id == UserCourse.course_id)
-                .group_by(Course.id, Course.title)
-                .order_by(func.count(UserCourse.id).desc())
+                select(Course.id, Course.title, Course.sales_count)
+                .where(Course.deleted_at.is_(None))
+                .order_by(Course.sales_count.desc())
                 .limit(limit)
             )
             rows = result.all()
             return [{"id": r[0], "title": r[1], "sales": r[2]} for r in rows]
     
+    async def reconcile_counters(self) -> int:
+        """Kurs hisoblagichlarini lessons va user_courses jadvallaridan qayta hisoblash"""
+        total_seconds = (
+            select(func.coalesce(func.sum(Lesson.duration), 0))
+            .where(Lesson.course_id == Course.id)
+            .scalar_subquery()
+        )
+        stmt = update(Course).values(
+            lessons_count=select(func.count(Lesson.id))
+            .where(Lesson.course_id == Course.id)
+            .scalar_subquery(),
+            total_duration_seconds=total_seconds,
+            duration=total_seconds // 3600,
+            sales_count=select(func.count(UserCourse.id))
+            .where(UserCourse.course_id == Course.id)
+            .scalar_subquery(),
+        )
+        
+        async with self._session() as session:
+            result = await session.execute(stmt.execution_options(synchronize_session=False))
+            await session.commit()
+            return result.rowcount
+    
     async def update_course(self, course_id: int, **kwargs) -> Optional[Course]:
         """Kursni yangilash"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Course).where(Course.id == course_id)
             )
@@ -263,54 +567,108 @@ class CourseRepository:
             return course
     
     async def delete_course(self, course_id: int) -> bool:
-        """Kursni o'chirish (barcha bog'liq ma'lumotlar bilan)"""
-        async with async_session() as session:
-            try:
-                # 1. Darslarning progress'ini o'chirish
-                lessons_result = await session.execute(
-                    select(Lesson.id).where(Lesson.course_id == course_id)
-                )
-                lesson_ids = [row[0] for row in lessons_result.fetchall()]
-                
-                if lesson_ids:
-                    await session.execute(
-                        delete(LessonProgress).where(LessonProgress.lesson_id.in_(lesson_ids))
+        """Kursni o'chirish (soft-delete): darhol yashiriladi, ma'lumotlari fonda tozalanadi"""
+        async with self._session() as session:
+            result = await session.execute(
+                update(Course)
+                .where(Course.id == course_id, Course.deleted_at.is_(None))
+                .values(deleted_at=datetime.utcnow(), is_active=False)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            entitlement_cache.invalidate_course(course_id)
+            return result.rowcount > 0
+    
+    async def get_deleted_course_ids(self) -> List[int]:
+        """Soft-delete qilingan, hali tozalanmagan kurslar"""
+        async with self._session() as session:
+            result = await session.execute(
+                select(Course.id).where(Course.deleted_at.isnot(None)).order_by(Course.deleted_at)
+            )
+            return list(result.scalars().all())
+    
+    async def get_deletion_state(self, course_id: int) -> Tuple[bool, Optional[datetime]]:
+        """(kurs qatori bormi, deleted_at)"""
+        async with self._session() as session:
+            result = await session.execute(
+                select(Course.deleted_at).where(Course.id == course_id)
+            )
+            row = result.first()
+            return (row is not None, row[0] if row else None)
+    
+    @staticmethod
+    def _purge_steps(course_id: int):
+        """Tozalash tartibi: (jadval nomi, model, kursga tegishli qatorlar sharti)"""
+        course_lessons = select(Lesson.id).where(Lesson.course_id == course_id)
+        return [
+            ("lesson_progress", LessonProgress, LessonProgress.lesson_id.in_(course_lessons)),
+            ("user_courses", UserCourse, UserCourse.course_id == course_id),
+            ("payments", Payment, Payment.course_id == course_id),
+            ("lessons", Lesson, Lesson.course_id == course_id),
+        ]
+    
+    async def get_purge_remaining(self, course_id: int) -> Dict[str, int]:
+        """Hali o'chirilmagan bog'liq qatorlar soni (jadval bo'yicha)"""
+        async with self._session() as session:
+            remaining = {}
+            for name, model, condition in self._purge_steps(course_id):
+                result = await session.execute(select(func.count(model.id)).where(condition))
+                remaining[name] = result.scalar() or 0
+            return remaining
+    
+    async def purge_course(
+        self,
+        course_id: int,
+        batch_size: int = 500,
+        on_progress: Optional[Callable[[str, int], None]] = None
+    ) -> Dict[str, int]:
+        """
+        Soft-delete qilingan kursni butunlay o'chirish.
+        
+        Har bir partiya alohida qisqa tranzaksiyada: issiq jadvallar uzoq bloklanmaydi,
+        to'xtab qolsa keyingi ishga tushishda qolgan joyidan davom etadi.
+        """
+        deleted = {}
+        
+        for name, model, condition in self._purge_steps(course_id):
+            deleted[name] = 0
+            while True:
+                async with self._session() as session:
+                    stmt = delete(model).where(
+                        model.id.in_(select(model.id).where(condition).limit(batch_size))
                     )
-                
-                # 2. Darslarni o'chirish
-                await session.execute(
-                    delete(Lesson).where(Lesson.course_id == course_id)
-                )
-                
-                # 3. Kursni sotib olganlarni o'chirish
-                await session.execute(
-                    delete(UserCourse).where(UserCourse.course_id == course_id)
-                )
-                
-                # 4. To'lovlarni o'chirish
-                await session.execute(
-                    delete(Payment).where(Payment.course_id == course_id)
-                )
-                
-                # 5. Kursni o'chirish
-                result = await session.execute(
-                    select(Course).where(Course.id == course_id)
-                )
-                course = result.scalar_one_or_none()
-                
-                if course:
-                    await session.delete(course)
+                    if model is Payment:
+                        # RETURNING: tugallangan to'lovlar statistikadan faqat bir marta ayriladi
+                        result = await session.execute(stmt.returning(
+                            Payment.amount, Payment.currency, Payment.status, Payment.created_at
+                        ))
+                        rows = result.all()
+                        for payment in rows:
+                            if payment.status == "completed":
+                                await _record_payment_stats(session, payment, -1)
+                        count = len(rows)
+                    else:
+                        result = await session.execute(stmt)
+                        count = result.rowcount
                     await session.commit()
-                    return True
                 
-                return False
-            except Exception as e:
-                await session.rollback()
-                raise e
+                deleted[name] += count
+                if on_progress:
+                    on_progress(name, deleted[name])
+                if count < batch_size:
+                    break
+        
+        async with self._session() as session:
+            await session.execute(
+                delete(Course).where(Course.id == course_id, Course.deleted_at.isnot(None))
+            )
+            await session.commit()
+        
+        return deleted
     
     async def update_course_thumbnail(self, course_id: int, thumbnail_url: str) -> Optional[Course]:
         """Kurs thumbnailini yangilash"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Course).where(Course.id == course_id)
             )
@@ -325,7 +683,7 @@ class CourseRepository:
             return course
 
 
-class LessonRepository:
+class LessonRepository(BaseRepository):
     """Dars uchun repository"""
     
     async def create_lesson(
@@ -340,7 +698,7 @@ class LessonRepository:
         is_free: bool = False
     ) -> Lesson:
         """Yangi dars yaratish"""
-        async with async_session() as session:
+        async with self._session() as session:
             # Tartib raqamini aniqlash
             if order == 0:
                 result = await session.execute(
@@ -360,43 +718,31 @@ class LessonRepository:
                 is_free=is_free
             )
             session.add(lesson)
+            await _bump_course_counters(
+                session, course_id, lessons_count=1, total_duration_seconds=duration
+            )
             await session.commit()
             await session.refresh(lesson)
             
-            # Kurs davomiyligini yangilash
-            await self._update_course_duration(session, course_id)
-            
             return lesson
     
-    async def _update_course_duration(self, session, course_id: int):
-        """Kurs davomiyligini yangilash"""
-        result = await session.execute(
-            select(func.sum(Lesson.duration)).where(Lesson.course_id == course_id)
-        )
-        total_seconds = result.scalar() or 0
-        
-        result = await session.execute(
-            select(Course).where(Course.id == course_id)
-        )
-        course = result.scalar_one_or_none()
-        if course:
-            course.duration = total_seconds // 3600  # Soatlarga aylantirish
-            await session.commit()
-    
     async def get_lesson_by_id(self, lesson_id: int) -> Optional[Lesson]:
-        """ID bo'yicha dars olish"""
-        async with async_session() as session:
+        """ID bo'yicha dars olish (o'chirilgan kursniki - None)"""
+        async with self._read_session() as session:
             result = await session.execute(
-                select(Lesson).where(Lesson.id == lesson_id)
+                select(Lesson)
+                .join(Course, Course.id == Lesson.course_id)
+                .where(Lesson.id == lesson_id, Course.deleted_at.is_(None))
             )
             return result.scalar_one_or_none()
     
     async def get_lessons_by_course(self, course_id: int) -> List[Lesson]:
-        """Kurs darslari"""
-        async with async_session() as session:
+        """Kurs darslari (kurs o'chirilgan bo'lsa - bo'sh; qatorlar fonda tozalanguncha)"""
+        async with self._read_session() as session:
             result = await session.execute(
                 select(Lesson)
-                .where(Lesson.course_id == course_id)
+                .join(Course, Course.id == Lesson.course_id)
+                .where(Lesson.course_id == course_id, Course.deleted_at.is_(None))
                 .order_by(Lesson.order)
             )
             return list(result.scalars().all())
@@ -409,7 +755,7 @@ class LessonRepository:
         duration: int = 0
     ) -> Optional[Lesson]:
         """Dars videosini yangilash"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Lesson).where(Lesson.id == lesson_id)
             )
@@ -420,38 +766,39 @@ class LessonRepository:
                     lesson.video_file_id = video_file_id
                 if video_url:
                     lesson.video_url = video_url
+                # Davomiylik o'zgarmasa ham kursning updated_at'i yangilanadi (katalog ETag'i)
+                await _bump_course_counters(
+                    session, lesson.course_id,
+                    total_duration_seconds=duration - lesson.duration if duration > 0 else 0
+                )
                 if duration > 0:
                     lesson.duration = duration
                 
                 await session.commit()
                 await session.refresh(lesson)
-                
-                # Kurs davomiyligini yangilash
-                await self._update_course_duration(session, lesson.course_id)
             
             return lesson
     
     async def delete_lesson(self, lesson_id: int) -> bool:
         """Darsni o'chirish"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Lesson).where(Lesson.id == lesson_id)
             )
             lesson = result.scalar_one_or_none()
             
             if lesson:
-                course_id = lesson.course_id
+                await _bump_course_counters(
+                    session, lesson.course_id, lessons_count=-1, total_duration_seconds=-lesson.duration
+                )
                 await session.delete(lesson)
                 await session.commit()
-                
-                # Kurs davomiyligini yangilash
-                await self._update_course_duration(session, course_id)
                 return True
             
             return False
 
 
-class PaymentRepository:
+class PaymentRepository(BaseRepository):
     """To'lov uchun repository"""
     
     async def create_payment(
@@ -465,7 +812,7 @@ class PaymentRepository:
         transaction_id: Optional[str] = None
     ) -> Payment:
         """Yangi to'lov yaratish"""
-        async with async_session() as session:
+        async with self._session() as session:
             # Foydalanuvchini topish
             result = await session.execute(
                 select(User).where(User.telegram_id == user_telegram_id)
@@ -485,13 +832,18 @@ class PaymentRepository:
                 transaction_id=transaction_id
             )
             session.add(payment)
+            await session.flush()
+            
+            if status == "completed":
+                await _record_payment_stats(session, payment)
+            
             await session.commit()
             await session.refresh(payment)
             return payment
     
     async def get_payment_by_id(self, payment_id: int) -> Optional[Payment]:
         """ID bo'yicha to'lov olish"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Payment).where(Payment.id == payment_id)
             )
@@ -499,7 +851,7 @@ class PaymentRepository:
     
     async def get_user_payments(self, user_telegram_id: int) -> List[Payment]:
         """Foydalanuvchi to'lovlari"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(User).where(User.telegram_id == user_telegram_id)
             )
@@ -522,17 +874,22 @@ class PaymentRepository:
         transaction_id: Optional[str] = None
     ) -> Optional[Payment]:
         """To'lov statusini yangilash"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Payment).where(Payment.id == payment_id)
             )
             payment = result.scalar_one_or_none()
             
             if payment:
+                was_completed = payment.status == "completed"
                 payment.status = status
                 if transaction_id:
                     payment.transaction_id = transaction_id
                 payment.updated_at = datetime.utcnow()
+                
+                if was_completed != (status == "completed"):
+                    await _record_payment_stats(session, payment, 1 if status == "completed" else -1)
+                
                 await session.commit()
                 await session.refresh(payment)
             
@@ -540,78 +897,123 @@ class PaymentRepository:
     
     async def get_payments_count(self) -> int:
         """Jami to'lovlar soni"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(func.count(Payment.id))
                 .where(Payment.status == "completed")
             )
             return result.scalar() or 0
-    
-    async def get_today_payments_stats(self) -> dict:
-        """Bugungi to'lovlar statistikasi"""
-        async with async_session() as session:
-            today = date.today()
-            result = await session.execute(
-                select(
-                    func.count(Payment.id),
-                    func.coalesce(func.sum(Payment.amount), 0)
-                )
-                .where(
-                    Payment.status == "completed",
-                    func.date(Payment.created_at) == today
-                )
-            )
-            row = result.one()
-            return {"count": row[0] or 0, "revenue": float(row[1] or 0)}
-    
-    async def get_weekly_payments_stats(self) -> dict:
-        """Haftalik to'lovlar statistikasi"""
-        async with async_session() as session:
-            from datetime import timedelta
-            week_ago = date.today() - timedelta(days=7)
-            result = await session.execute(
-                select(
-                    func.count(Payment.id),
-                    func.coalesce(func.sum(Payment.amount), 0)
-                )
-                .where(
-                    Payment.status == "completed",
-                    func.date(Payment.created_at) >= week_ago
-                )
+
+
+class AnalyticsRepository(BaseRepository):
+    """Admin analitika uchun repository"""
+    
+    async def get_dashboard_stats(self) -> dict:
+        """Dashboard statistikasi daily_stats rollup jadvalidan (~31 qator o'qiladi)"""
+        today = datetime.utcnow().date()
+        week_ago = today - timedelta(days=7)
+        two_weeks_ago = today - timedelta(days=14)
+        month_ago = today - timedelta(days=30)
+        
+        day = DailyStats.day
+        revenue = DailyStats.revenue_uzs + DailyStats.revenue_xtr + DailyStats.revenue_ton
+        
+        def total(column, *conditions):
+            amount = func.sum(column)
+            if conditions:
+                amount = amount.filter(*conditions)
+            return func.coalesce(amount, 0)
+        
+        period = (
+            select(
+                total(DailyStats.new_users, day == today).label("today_users"),
+                total(DailyStats.new_users, day >= week_ago).label("weekly_users"),
+                total(DailyStats.new_users, day >= month_ago).label("monthly_users"),
+                total(DailyStats.new_users, day >= two_weeks_ago, day < week_ago).label("prev_week_users"),
+                total(DailyStats.payments_count, day == today).label("today_payments"),
+                total(revenue, day == today).label("today_revenue"),
+                total(DailyStats.payments_count, day >= week_ago).label("weekly_payments"),
+                total(revenue, day >= week_ago).label("weekly_revenue"),
+                total(DailyStats.payments_count, day >= month_ago).label("monthly_payments"),
+                total(revenue, day >= month_ago).label("monthly_revenue"),
+                total(revenue, day >= two_weeks_ago, day < week_ago).label("prev_week_revenue"),
+            )
+            .where(day >= month_ago, day <= today)
+            .subquery()
+        )
+        
+        stmt = (
+            select(
+                period,
+                select(func.coalesce(func.sum(DailyStats.new_users), 0))
+                .scalar_subquery().label("total_users"),
+                select(func.coalesce(func.sum(DailyStats.payments_count), 0))
+                .scalar_subquery().label("total_payments"),
+                select(func.count(Course.id)).where(Course.deleted_at.is_(None))
+                .scalar_subquery().label("total_courses"),
+                select(func.count(Lesson.id)).scalar_subquery().label("total_lessons"),
+            )
+            .select_from(period)
+        )
+        
+        async with self._read_session() as session:
+            result = await session.execute(stmt)
+            row = result.mappings().one()
+        
+        stats = {key: value or 0 for key, value in row.items()}
+        for key in ("today_revenue", "weekly_revenue", "monthly_revenue", "prev_week_revenue"):
+            stats[key] = float(stats[key])
+        for key in ("total_users", "today_users", "weekly_users", "monthly_users", "prev_week_users",
+                    "total_payments", "today_payments", "weekly_payments", "monthly_payments"):
+            stats[key] = int(stats[key])
+        return stats
+    
+    async def rebuild_daily_stats(self) -> int:
+        """daily_stats'ni users va payments tarixidan qayta hisoblash"""
+        user_day = func.date(User.created_at)
+        payment_day = func.date(Payment.created_at)
+        
+        async with self._session() as session:
+            users = await session.execute(
+                select(user_day, func.count(User.id)).group_by(user_day)
             )
-            row = result.one()
-            return {"count": row[0] or 0, "revenue": float(row[1] or 0)}
-    
-    async def get_monthly_payments_stats(self) -> dict:
-        """Oylik to'lovlar statistikasi"""
-        async with async_session() as session:
-            from datetime import timedelta
-            month_ago = date.today() - timedelta(days=30)
-            result = await session.execute(
-                select(
-                    func.count(Payment.id),
-                    func.coalesce(func.sum(Payment.amount), 0)
-                )
-                .where(
-                    Payment.status == "completed",
-                    func.date(Payment.created_at) >= month_ago
-                )
+            payments = await session.execute(
+                select(payment_day, Payment.currency, func.count(Payment.id), func.sum(Payment.amount))
+                .where(Payment.status == "completed")
+                .group_by(payment_day, Payment.currency)
             )
-            row = result.one()
-            return {"count": row[0] or 0, "revenue": float(row[1] or 0)}
+            
+            rows = {}
+            
+            def row_for(value) -> dict:
+                if isinstance(value, str):
+                    value = date.fromisoformat(value)
+                return rows.setdefault(value, {
+                    "day": value, "new_users": 0, "payments_count": 0,
+                    "revenue_uzs": 0.0, "revenue_xtr": 0.0, "revenue_ton": 0.0,
+                })
+            
+            for day, count in users:
+                row_for(day)["new_users"] = count
+            for day, currency, count, amount in payments:
+                row = row_for(day)
+                row["payments_count"] += count
+                column = REVENUE_COLUMNS.get(currency)
+                if column:
+                    row[column] += float(amount or 0)
+            
+            await session.execute(delete(DailyStats))
+            if rows:
+                await session.execute(insert(DailyStats), list(rows.values()))
+            await session.commit()
+        
+        return len(rows)
     
-    async def get_previous_week_revenue(self) -> float:
-        """O'tgan haftalik daromad (o'sish hisoblash uchun)"""
-        async with async_session() as session:
-            from datetime import timedelta
-            week_ago = date.today() - timedelta(days=7)
-            two_weeks_ago = date.today() - timedelta(days=14)
-            result = await session.execute(
-                select(func.coalesce(func.sum(Payment.amount), 0))
-                .where(
-                    Payment.status == "completed",
-                    func.date(Payment.created_at) >= two_weeks_ago,
-                    func.date(Payment.created_at) < week_ago
-                )
-            )
-            return float(result.scalar() or 0)
+    async def ensure_daily_stats(self):
+        """Rollup jadvali bo'sh bo'lsa (yangi o'rnatish yoki eski baza) - backfill"""
+        async with self._session() as session:
+            has_stats = await session.scalar(select(DailyStats.day).limit(1))
+            has_users = await session.scalar(select(User.id).limit(1))
+        
+        if has_stats is None and has_users is not None:
+            await self.rebuild_daily_stats()
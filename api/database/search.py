@@ -0,0 +1,52 @@
+"""
+Kurs qidiruvi uchun matnni normallashtirish
+
+Kirill va lotin yozuvlari, apostrof variantlari (o', o‘, oʻ, g', ...) bitta
+kalitga keltiriladi: "Ўзбек тили", "O‘zbek tili" va "ozbek tili" bir xil
+"ozbek tili" bo'ladi. Kurs saqlanganda courses.search_key shu kalitdan
+to'ldiriladi, qidiruv so'rovi ham xuddi shunday normallashtiriladi.
+"""
+import re
+import unicodedata
+from typing import List, Optional
+
+# O'zbek kirill -> lotin (2021 imlo; е/ё/ю/я soddalashtirilgan)
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo",
+    "ж": "j", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "",
+    "ы": "i", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h",
+}
+
+# o'/g' dagi belgi va tutuq belgisining barcha variantlari (olib tashlanadi)
+APOSTROPHES = "'`´ʹʻʼʽˈ‘’‛′"
+
+_TRANSLATION = str.maketrans({
+    **CYRILLIC_TO_LATIN,
+    **{char: "" for char in APOSTROPHES},
+})
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_search_text(text: Optional[str]) -> str:
+    """Matnni qidiruv kalitiga aylantirish: kichik lotin harflari, raqamlar va bo'shliqlar"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFC", text).lower().translate(_TRANSLATION)
+    # Qolgan diakritikalar (é, ü, ...) - asosiy harfga
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return " ".join(_NON_WORD.split(text)).strip()
+
+
+def search_tokens(query: Optional[str]) -> List[str]:
+    """Qidiruv so'rovining normallashgan so'zlari"""
+    return normalize_search_text(query).split()
+
+
+def course_search_key(title: Optional[str], category: Optional[str], description: Optional[str]) -> str:
+    """courses.search_key: nom, kategoriya va tavsif (nom birinchi)"""
+    return " ".join(
+        part for part in map(normalize_search_text, (title, category, description)) if part
+    )
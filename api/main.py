@@ -3,11 +3,16 @@ import sys
 
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from routes import courses, users, payments, admin, lessons
+from routes import auth, courses, users, payments, admin, lessons
 from database.base import init_db
+from database.repositories import AnalyticsRepository
+from services.course_purge import course_purger
+from services.telegram_files import telegram_files
+from services.video_cache import video_cache
 
 # Uploads papkasini yaratish
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
@@ -18,14 +23,22 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 async def lifespan(app: FastAPI):
     """Application lifecycle"""
     await init_db()
+    await AnalyticsRepository().ensure_daily_stats()
+    # Tugallanmagan kurs o'chirishlarini davom ettirish va yangilarini kutish
+    course_purger.start()
+    # Diskdagi video segmentlari (oldingi ishga tushishdan)
+    await video_cache.load()
     yield
+    await course_purger.stop()
+    await telegram_files.close()
 
 
 app = FastAPI(
     title="DAROMATX Academy API",
     description="Kurs sotish platformasi API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS sozlamalari - Android WebView uchun kengaytirilgan
@@ -43,6 +56,7 @@ app.add_middleware(
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Routes
+app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(courses.router, prefix="/api/courses", tags=["Courses"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(payments.router, prefix="/api/payments", tags=["Payments"])
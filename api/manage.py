@@ -0,0 +1,58 @@
+"""
+Boshqaruv buyruqlari
+
+Ishlatish (api/ papkasidan):
+    python manage.py migrate
+    python manage.py rebuild-stats
+    python manage.py reconcile-counters
+"""
+import argparse
+import asyncio
+
+from database.base import engine, init_db
+from database.migrations import LATEST_VERSION, get_schema_version, migrate as run_migrations
+from database.repositories import AnalyticsRepository, CourseRepository
+
+
+async def migrate():
+    """Sxemani oxirgi versiyaga keltirish"""
+    applied = await run_migrations()
+    async with engine.connect() as conn:
+        version = await get_schema_version(conn)
+    
+    if applied:
+        print(f"Qo'llandi: {', '.join(map(str, applied))}")
+    print(f"Sxema versiyasi: {version} (oxirgisi: {LATEST_VERSION})")
+
+
+async def rebuild_stats():
+    """daily_stats jadvalini tarixdan qayta qurish"""
+    await init_db()
+    days = await AnalyticsRepository().rebuild_daily_stats()
+    print(f"daily_stats qayta qurildi: {days} kun")
+
+
+async def reconcile_counters():
+    """Kurs hisoblagichlarini (darslar, davomiylik, sotuvlar) tekshirib tuzatish"""
+    await init_db()
+    courses = await CourseRepository().reconcile_counters()
+    print(f"Kurs hisoblagichlari qayta hisoblandi: {courses} kurs")
+
+
+COMMANDS = {
+    "migrate": migrate,
+    "rebuild-stats": rebuild_stats,
+    "reconcile-counters": reconcile_counters,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DAROMATX API boshqaruv buyruqlari")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+    
+    asyncio.run(COMMANDS[args.command]())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,23 @@
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Header, UploadFile, File, Form
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Query, Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import json
 import os
 import uuid
 import aiofiles
 
-from database.repositories import UserRepository, CourseRepository, PaymentRepository, LessonRepository
-from database.base import async_session
-from config import config
+from database.repositories import (
+    UserRepository, CourseRepository, PaymentRepository, LessonRepository, AnalyticsRepository
+)
+from database.base import get_session, get_pool_stats
+from database.entitlements import entitlement_cache
+from services.course_purge import course_purger
+from services.telegram_auth import TelegramIdentity, get_admin_identity, init_data_cache
+from services.telegram_files import telegram_files
+from services.video_cache import video_cache
+from routes.courses import catalog_snapshot
 
 router = APIRouter()
 
@@ -16,43 +26,6 @@ UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
-def check_admin(telegram_id: int) -> bool:
-    """Admin tekshirish"""
-    return telegram_id in config.admin_ids
-
-
-@router.post("/migrate")
-async def run_migration(
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
-):
-    """Database migration - ton_price ustunini qo'shish"""
-    import json
-    from urllib.parse import unquote
-    from sqlalchemy import text
-    
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
-    
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
-    
-    try:
-        async with async_session() as session:
-            # ton_price ustunini qo'shish
-            await session.execute(text("""
-                ALTER TABLE courses ADD COLUMN IF NOT EXISTS ton_price FLOAT DEFAULT 0
-            """))
-            await session.commit()
-        
-        return {"success": True, "message": "Migration muvaffaqiyatli bajarildi!"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
-
-
 class StatsResponse(BaseModel):
     users_count: int
     courses_count: int
@@ -100,25 +73,13 @@ class CourseCreateRequest(BaseModel):
 
 @router.get("/stats", response_model=StatsResponse)
 async def get_stats(
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Admin statistika"""
     
-    import json
-    from urllib.parse import unquote
-    
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
-    
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
-    
-    user_repo = UserRepository()
-    course_repo = CourseRepository()
+    user_repo = UserRepository(session)
+    course_repo = CourseRepository(session)
     
     return StatsResponse(
         users_count=await user_repo.get_users_count(),
@@ -129,48 +90,23 @@ async def get_stats(
 
 @router.get("/analytics", response_model=AnalyticsResponse)
 async def get_analytics(
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Kengaytirilgan admin analitika"""
     
-    import json
-    from urllib.parse import unquote
-    
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
-    
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
-    
-    user_repo = UserRepository()
+    # Bitta agregat so'rov; top kurslar parallel, alohida sessionda
+    analytics_repo = AnalyticsRepository(session)
     course_repo = CourseRepository()
-    payment_repo = PaymentRepository()
-    
-    # Asosiy statistika
-    total_users = await user_repo.get_users_count()
-    total_courses = await course_repo.get_courses_count()
-    total_lessons = await course_repo.get_lessons_count()
-    total_payments = await payment_repo.get_payments_count()
-    
-    # Bugungi
-    today_users = await user_repo.get_today_users_count()
-    today_stats = await payment_repo.get_today_payments_stats()
-    
-    # Haftalik
-    weekly_users = await user_repo.get_weekly_users_count()
-    weekly_stats = await payment_repo.get_weekly_payments_stats()
-    
-    # Oylik
-    monthly_users = await user_repo.get_monthly_users_count()
-    monthly_stats = await payment_repo.get_monthly_payments_stats()
+    stats, top_courses = await asyncio.gather(
+        analytics_repo.get_dashboard_stats(),
+        course_repo.get_top_courses(5)
+    )
     
-    # O'sish hisoblash
-    prev_week_users = await user_repo.get_previous_week_users_count()
-    prev_week_revenue = await payment_repo.get_previous_week_revenue()
+    weekly_users = stats["weekly_users"]
+    prev_week_users = stats["prev_week_users"]
+    weekly_revenue = stats["weekly_revenue"]
+    prev_week_revenue = stats["prev_week_revenue"]
     
     users_growth = 0.0
     if prev_week_users > 0:
@@ -180,27 +116,24 @@ async def get_analytics(
     
     revenue_growth = 0.0
     if prev_week_revenue > 0:
-        revenue_growth = ((weekly_stats["revenue"] - prev_week_revenue) / prev_week_revenue) * 100
-    elif weekly_stats["revenue"] > 0:
+        revenue_growth = ((weekly_revenue - prev_week_revenue) / prev_week_revenue) * 100
+    elif weekly_revenue > 0:
         revenue_growth = 100.0
     
-    # Top kurslar
-    top_courses = await course_repo.get_top_courses(5)
-    
     return AnalyticsResponse(
-        total_users=total_users,
-        total_courses=total_courses,
-        total_lessons=total_lessons,
-        total_payments=total_payments,
-        today_users=today_users,
-        today_payments=today_stats["count"],
-        today_revenue=today_stats["revenue"],
+        total_users=stats["total_users"],
+        total_courses=stats["total_courses"],
+        total_lessons=stats["total_lessons"],
+        total_payments=stats["total_payments"],
+        today_users=stats["today_users"],
+        today_payments=stats["today_payments"],
+        today_revenue=stats["today_revenue"],
         weekly_users=weekly_users,
-        weekly_payments=weekly_stats["count"],
-        weekly_revenue=weekly_stats["revenue"],
-        monthly_users=monthly_users,
-        monthly_payments=monthly_stats["count"],
-        monthly_revenue=monthly_stats["revenue"],
+        weekly_payments=stats["weekly_payments"],
+        weekly_revenue=weekly_revenue,
+        monthly_users=stats["monthly_users"],
+        monthly_payments=stats["monthly_payments"],
+        monthly_revenue=stats["monthly_revenue"],
         users_growth=round(users_growth, 1),
         revenue_growth=round(revenue_growth, 1),
         top_courses=top_courses
@@ -210,25 +143,15 @@ async def get_analytics(
 @router.post("/courses")
 async def create_course(
     request: CourseCreateRequest,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Kurs yaratish"""
     
-    import json
-    from urllib.parse import unquote
-    
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
-    
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
+    telegram_id = identity.telegram_id
     
     try:
-        course_repo = CourseRepository()
+        course_repo = CourseRepository(session)
         course = await course_repo.create_course(
             title=request.title,
             description=request.description,
@@ -249,27 +172,20 @@ async def create_course(
 
 @router.get("/users")
 async def get_users(
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data"),
-    limit: int = 100,
-    offset: int = 0
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_session)
 ):
-    """Foydalanuvchilar ro'yxati"""
+    """Foydalanuvchilar ro'yxati (cursor bo'yicha sahifalash)"""
     
-    import json
-    from urllib.parse import unquote
+    telegram_id = identity.telegram_id
     
+    user_repo = UserRepository(session)
     try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
-    
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
-    
-    user_repo = UserRepository()
-    users = await user_repo.get_all_users(limit=limit, offset=offset)
+        users, next_cursor = await user_repo.get_users_page(limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "users": [
@@ -281,34 +197,19 @@ async def get_users(
                 "created_at": user.created_at.isoformat()
             }
             for user in users
-        ]
+        ],
+        "next_cursor": next_cursor
     }
 
 
-def get_telegram_id_from_header(x_telegram_init_data: str) -> int:
-    """Header'dan telegram_id olish"""
-    import json
-    from urllib.parse import unquote
-    
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        return user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
-
-
 @router.get("/courses")
 async def get_all_courses(
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Admin uchun barcha kurslar"""
     
-    telegram_id = get_telegram_id_from_header(x_telegram_init_data)
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
-    
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     courses = await course_repo.get_all_courses()
     
     return {
@@ -323,7 +224,7 @@ async def get_all_courses(
                 "thumbnail": course.thumbnail,
                 "category": course.category,
                 "is_active": course.is_active,
-                "lessons_count": len(course.lessons) if course.lessons else 0,
+                "lessons_count": course.lessons_count,
                 "created_at": course.created_at.isoformat()
             }
             for course in courses
@@ -334,15 +235,12 @@ async def get_all_courses(
 @router.get("/courses/{course_id}")
 async def get_course_detail(
     course_id: int,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Kurs detallari - darslar bilan"""
     
-    telegram_id = get_telegram_id_from_header(x_telegram_init_data)
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
-    
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(course_id)
     
     if not course:
@@ -386,16 +284,13 @@ class LessonCreateRequest(BaseModel):
 async def create_lesson(
     course_id: int,
     request: LessonCreateRequest,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Kursga yangi dars qo'shish"""
     
-    telegram_id = get_telegram_id_from_header(x_telegram_init_data)
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
-    
     # Kurs mavjudligini tekshirish
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Kurs topilmadi")
@@ -407,7 +302,7 @@ async def create_lesson(
     elif order == 0:
         order = 1
     
-    lesson_repo = LessonRepository()
+    lesson_repo = LessonRepository(session)
     lesson = await lesson_repo.create_lesson(
         course_id=course_id,
         title=request.title,
@@ -420,18 +315,127 @@ async def create_lesson(
     return {"success": True, "lesson_id": lesson.id, "order": order}
 
 
+# Bitta importdagi darslar chegarasi
+MAX_IMPORT_LESSONS = 2000
+
+
+class LessonImportRequest(LessonCreateRequest):
+    video_file_id: Optional[str] = None
+    video_url: Optional[str] = None
+
+
+class CourseImportRequest(CourseCreateRequest):
+    thumbnail: Optional[str] = None
+
+
+def _row_error(error: ValueError) -> str:
+    """Qator xatosini qisqa matnga aylantirish"""
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(map(str, item['loc'])) or 'row'}: {item['msg']}" for item in error.errors()
+        )
+    return str(error)
+
+
+async def _iter_ndjson(request: Request):
+    """So'rov tanasini oqim bo'yicha qatorlarga bo'lish (butun tanani xotiraga olmasdan)"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+@router.post("/courses/import")
+async def import_course(
+    request: Request,
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Kursni barcha darslari bilan import qilish.
+    
+    application/json: {"course": {...}, "lessons": [{...}, ...]}
+    application/x-ndjson: 1-qator kurs, keyingi har bir qator - bitta dars
+    Biror qatorda xato bo'lsa hech narsa yozilmaydi, xatolar qator raqami bilan qaytadi.
+    """
+    
+    telegram_id = identity.telegram_id
+    
+    if "ndjson" in request.headers.get("content-type", ""):
+        rows = _iter_ndjson(request)
+        course_raw = await anext(rows, b"{}")
+        lesson_rows = rows
+    else:
+        try:
+            payload = json.loads(await request.body())
+            course_raw = payload.get("course", {})
+            lessons_raw = payload.get("lessons", [])
+            if not isinstance(lessons_raw, list):
+                raise ValueError("lessons ro'yxat bo'lishi kerak")
+        except (ValueError, AttributeError) as e:
+            raise HTTPException(status_code=400, detail=f"Noto'g'ri JSON: {e}")
+        
+        async def lesson_rows_from_list():
+            for raw in lessons_raw:
+                yield raw
+        
+        lesson_rows = lesson_rows_from_list()
+    
+    try:
+        if isinstance(course_raw, bytes):
+            course_raw = json.loads(course_raw)
+        course = CourseImportRequest.model_validate(course_raw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Kurs ma'lumotlari xato: {_row_error(e)}")
+    
+    # Darslar oqim bo'yicha tekshiriladi; bazaga faqat hammasi to'g'ri bo'lsa yoziladi
+    lessons, errors = [], []
+    row = 0
+    async for raw in lesson_rows:
+        row += 1
+        if row > MAX_IMPORT_LESSONS:
+            raise HTTPException(status_code=413, detail=f"Ko'pi bilan {MAX_IMPORT_LESSONS} ta dars")
+        try:
+            if isinstance(raw, bytes):
+                raw = json.loads(raw)
+            lessons.append(LessonImportRequest.model_validate(raw).model_dump())
+        except ValueError as e:
+            errors.append({"row": row, "error": _row_error(e)})
+    
+    if errors:
+        raise HTTPException(
+            status_code=422,
+            detail={"message": "Darslarda xatolar bor, hech narsa saqlanmadi", "errors": errors}
+        )
+    
+    course_repo = CourseRepository(session)
+    created = await course_repo.import_course(
+        course_data={**course.model_dump(), "author_id": telegram_id},
+        lessons=lessons
+    )
+    
+    return {
+        "success": True,
+        "course_id": created.id,
+        "lessons_count": created.lessons_count,
+        "duration": created.duration
+    }
+
+
 @router.post("/courses/{course_id}/thumbnail")
 async def upload_thumbnail(
     course_id: int,
     file: UploadFile = File(...),
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Kursga thumbnail yuklash"""
     
-    telegram_id = get_telegram_id_from_header(x_telegram_init_data)
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
-    
     # Fayl turini tekshirish
     allowed_types = ["image/jpeg", "image/png", "image/webp"]
     if file.content_type not in allowed_types:
@@ -448,7 +452,7 @@ async def upload_thumbnail(
         await f.write(content)
     
     # Database'ni yangilash
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     thumbnail_url = f"/uploads/{filename}"
     await course_repo.update_course_thumbnail(course_id, thumbnail_url)
     
@@ -465,18 +469,15 @@ class VideoLinkRequest(BaseModel):
 async def set_lesson_video(
     lesson_id: int,
     request: VideoLinkRequest,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Darsga video qo'shish (Telegram file_id yoki URL)"""
     
-    telegram_id = get_telegram_id_from_header(x_telegram_init_data)
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
-    
     if not request.video_file_id and not request.video_url:
         raise HTTPException(status_code=400, detail="video_file_id yoki video_url kerak")
     
-    lesson_repo = LessonRepository()
+    lesson_repo = LessonRepository(session)
     lesson = await lesson_repo.get_lesson_by_id(lesson_id)
     
     if not lesson:
@@ -495,32 +496,56 @@ async def set_lesson_video(
 @router.delete("/courses/{course_id}")
 async def delete_course(
     course_id: int,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Kursni o'chirish"""
     
-    telegram_id = get_telegram_id_from_header(x_telegram_init_data)
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
+    course_repo = CourseRepository(session)
+    if not await course_repo.delete_course(course_id):
+        raise HTTPException(status_code=404, detail="Kurs topilmadi")
     
-    course_repo = CourseRepository()
-    await course_repo.delete_course(course_id)
+    # Kurs darhol yashirildi; bog'liq ma'lumotlar fonda partiyalab o'chiriladi
+    course_purger.wake()
     
-    return {"success": True}
+    return {"success": True, "status": "pending", "status_url": f"/api/admin/courses/{course_id}/purge"}
+
+
+@router.get("/courses/{course_id}/purge")
+async def get_course_purge_status(
+    course_id: int,
+    identity: TelegramIdentity = Depends(get_admin_identity)
+):
+    """O'chirilgan kursni tozalash holati (har qanday worker'da bir xil - bazadan)"""
+    
+    return await course_purger.get_status(course_id)
 
 
 @router.delete("/lessons/{lesson_id}")
 async def delete_lesson(
     lesson_id: int,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_admin_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Darsni o'chirish"""
     
-    telegram_id = get_telegram_id_from_header(x_telegram_init_data)
-    if not check_admin(telegram_id):
-        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
-    
-    lesson_repo = LessonRepository()
+    lesson_repo = LessonRepository(session)
     await lesson_repo.delete_lesson(lesson_id)
     
     return {"success": True}
+
+
+@router.get("/metrics")
+async def get_metrics(
+    identity: TelegramIdentity = Depends(get_admin_identity)
+):
+    """Ichki metrikalar (DB connection pool va keshlar holati)"""
+    
+    return {
+        "db_pool": get_pool_stats(),
+        "entitlement_cache": entitlement_cache.get_stats(),
+        "catalog_snapshot": catalog_snapshot.get_stats(),
+        "init_data_cache": init_data_cache.get_stats(),
+        "telegram_files": telegram_files.get_stats(),
+        "video_cache": video_cache.get_stats(),
+    }
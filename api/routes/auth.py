@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.repositories import UserRepository
+from database.base import get_session
+from config import config
+from services.telegram_auth import TelegramIdentity, get_init_data_identity, issue_session_token
+
+router = APIRouter()
+
+
+class SessionResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int
+    user_id: int
+    is_admin: bool
+
+
+@router.post("/session", response_model=SessionResponse)
+async def create_session(
+    identity: TelegramIdentity = Depends(get_init_data_identity),
+    session: AsyncSession = Depends(get_session)
+):
+    """Init-data evaziga sessiya tokeni (keyingi so'rovlar uchun Authorization: Bearer)"""
+    
+    user_repo = UserRepository(session)
+    user = await user_repo.create_or_update_user(
+        telegram_id=identity.telegram_id,
+        username=identity.username,
+        full_name=identity.full_name
+    )
+    
+    return SessionResponse(
+        access_token=issue_session_token(identity, user.id),
+        expires_in=config.session_token_ttl,
+        user_id=user.id,
+        is_admin=identity.is_admin
+    )
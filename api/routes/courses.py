@@ -1,10 +1,19 @@
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query, Header
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 import json
-from urllib.parse import unquote
 
 from database.repositories import CourseRepository, UserRepository
+from database.base import get_session
+from database.entitlements import entitlement_cache
+from services.catalog_snapshot import CatalogSnapshot, negotiate_encoding
+from services.serialization import json_response
+from services.telegram_auth import TelegramIdentity, get_optional_identity
+from services.http_cache import (
+    CATALOG_CACHE_CONTROL, PRIVATE_CACHE_CONTROL, STATIC_CACHE_CONTROL,
+    cache_headers, catalog_version, is_not_modified, make_etag, not_modified
+)
 
 router = APIRouter()
 
@@ -43,106 +52,102 @@ class CourseDetailResponse(CourseResponse):
     lessons: List[LessonResponse] = []
 
 
+COURSE_LIST = TypeAdapter(List[CourseResponse])
+COURSE_DETAIL = TypeAdapter(CourseDetailResponse)
+catalog_snapshot = CatalogSnapshot(COURSE_LIST)
+
+
+async def _snapshot_response(request: Request, category: Optional[str]) -> Response:
+    """Qidiruvsiz katalog: tayyor nusxadan, mijoz qabul qiladigan kodlashda"""
+    entry, last_modified = await catalog_snapshot.get(category)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), entry.variants)
+    body, etag = entry.variants[encoding]
+    headers = cache_headers(etag, CATALOG_CACHE_CONTROL, last_modified, vary="Accept-Encoding")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
 @router.get("/", response_model=List[CourseResponse])
 async def get_courses(
+    request: Request,
     category: Optional[str] = Query(None, description="Kategoriya bo'yicha filter"),
-    search: Optional[str] = Query(None, description="Qidiruv so'zi")
+    search: Optional[str] = Query(None, description="Qidiruv so'zi"),
+    limit: int = Query(20, ge=1, le=100, description="Qidiruv natijalari sahifasi"),
+    offset: int = Query(0, ge=0)
 ):
-    """Barcha kurslarni olish"""
-    course_repo = CourseRepository()
+    """Barcha kurslarni olish (search berilsa - mosligi bo'yicha saralangan sahifa)"""
+    if not search:
+        return await _snapshot_response(request, category)
     
-    if category:
-        courses = await course_repo.get_courses_by_category(category)
-    else:
-        courses = await course_repo.get_all_active_courses()
+    version, last_modified = await catalog_version.get()
+    etag = make_etag("courses", version, category, search, limit, offset)
+    headers = cache_headers(etag, CATALOG_CACHE_CONTROL, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
     
-    result = []
-    for course in courses:
-        if search and search.lower() not in course.title.lower():
-            continue
-        
-        course_data = CourseResponse(
-            id=course.id,
-            title=course.title,
-            description=course.description,
-            price=course.price,
-            stars_price=course.stars_price,
-            thumbnail=course.thumbnail,
-            category=course.category,
-            duration=course.duration,
-            is_active=course.is_active,
-            lessons_count=len(course.lessons) if course.lessons else 0
-        )
-        result.append(course_data)
+    # Bazaga faqat qidiruvda va ETag mos kelmaganda murojaat qilinadi
+    courses = await CourseRepository().search_courses(search, category=category, limit=limit, offset=offset)
     
-    return result
+    # Butun ro'yxat bir marta tekshiriladi va to'g'ridan-to'g'ri JSON'ga yoziladi
+    payload = COURSE_LIST.validate_python(courses, from_attributes=True)
+    return json_response(COURSE_LIST, payload, headers)
+
+
+CATEGORIES = {
+    "categories": [
+        {"id": "dasturlash", "name": "Dasturlash", "icon": "💻"},
+        {"id": "dizayn", "name": "Dizayn", "icon": "🎨"},
+        {"id": "marketing", "name": "Marketing", "icon": "📈"},
+        {"id": "biznes", "name": "Biznes", "icon": "💼"},
+        {"id": "tillar", "name": "Tillar", "icon": "🌍"},
+        {"id": "boshqa", "name": "Boshqa", "icon": "📚"},
+    ]
+}
+CATEGORIES_ETAG = make_etag("categories", json.dumps(CATEGORIES, sort_keys=True))
 
 
 @router.get("/categories")
-async def get_categories():
+async def get_categories(request: Request, response: Response):
     """Kategoriyalar ro'yxati"""
-    return {
-        "categories": [
-            {"id": "dasturlash", "name": "Dasturlash", "icon": "💻"},
-            {"id": "dizayn", "name": "Dizayn", "icon": "🎨"},
-            {"id": "marketing", "name": "Marketing", "icon": "📈"},
-            {"id": "biznes", "name": "Biznes", "icon": "💼"},
-            {"id": "tillar", "name": "Tillar", "icon": "🌍"},
-            {"id": "boshqa", "name": "Boshqa", "icon": "📚"},
-        ]
-    }
+    headers = cache_headers(CATEGORIES_ETAG, STATIC_CACHE_CONTROL)
+    if is_not_modified(request, CATEGORIES_ETAG):
+        return not_modified(headers)
+    response.headers.update(headers)
+    return CATEGORIES
 
 
 @router.get("/{course_id}", response_model=CourseDetailResponse)
 async def get_course(
     course_id: int,
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data")
+    request: Request,
+    identity: Optional[TelegramIdentity] = Depends(get_optional_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Bitta kursni olish"""
-    course_repo = CourseRepository()
+    # Foydalanuvchi sotib olganmi (javob va ETag shunga bog'liq): keshda tasdiqlangan
+    # bo'lsa ETag bazaga murojaatsiz tekshiriladi
+    is_purchased = bool(identity) and entitlement_cache.has(identity.telegram_id, course_id)
+    if identity and not is_purchased:
+        user_repo = UserRepository(session)
+        is_purchased = await user_repo.has_course_access(identity.telegram_id, course_id, use_cache=False)
+    
+    version, last_modified = await catalog_version.get()
+    etag = make_etag("course", course_id, version, is_purchased)
+    cache_control = PRIVATE_CACHE_CONTROL if identity else CATALOG_CACHE_CONTROL
+    # Anonim va foydalanuvchi javoblari proksi keshida aralashmasin
+    headers = cache_headers(etag, cache_control, last_modified, vary="Authorization, X-Telegram-Init-Data")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+    
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(course_id)
     
     if not course:
         raise HTTPException(status_code=404, detail="Kurs topilmadi")
     
-    # Foydalanuvchi sotib olganmi tekshirish
-    is_purchased = False
-    if x_telegram_init_data:
-        try:
-            data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-            user_data = json.loads(unquote(data_parts.get('user', '{}')))
-            telegram_id = user_data.get('id')
-            
-            if telegram_id:
-                user_repo = UserRepository()
-                user = await user_repo.get_user_by_telegram_id(telegram_id)
-                if user and user.purchased_courses:
-                    is_purchased = any(pc.course_id == course_id for pc in user.purchased_courses)
-        except:
-            pass
-    
-    lessons = []
-    for lesson in course.lessons:
-        lessons.append(LessonResponse(
-            id=lesson.id,
-            title=lesson.title,
-            description=lesson.description,
-            duration=lesson.duration,
-            order=lesson.order,
-            is_free=lesson.is_free
-        ))
-    
-    return CourseDetailResponse(
-        id=course.id,
-        title=course.title,
-        description=course.description,
-        price=course.price,
-        stars_price=course.stars_price,
-        thumbnail=course.thumbnail,
-        category=course.category,
-        duration=course.duration,
-        is_active=course.is_active,
-        lessons_count=len(lessons),
-        lessons=lessons,
-        is_purchased=is_purchased
-    )
+    payload = COURSE_DETAIL.validate_python(course, from_attributes=True)
+    payload.is_purchased = is_purchased
+    return json_response(COURSE_DETAIL, payload, headers)
@@ -1,14 +1,24 @@
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Header, Depends, Request, Response
 from fastapi.responses import RedirectResponse
-from pydantic import BaseModel
-import httpx
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 import time
 import hashlib
+import hmac
+from urllib.parse import urlencode
 
 from database.repositories import LessonRepository, UserRepository
+from database.base import get_session
 from database.models import LessonProgress
+from services.serialization import json_response
+from services.telegram_auth import TelegramIdentity, get_identity
+from services.telegram_files import TelegramFileError, telegram_files
+from services.video_stream import parse_range, stream_file
+from services.http_cache import (
+    CATALOG_CACHE_CONTROL, cache_headers, catalog_version, is_not_modified, make_etag, not_modified
+)
 
 router = APIRouter()
 
@@ -36,47 +46,38 @@ class LessonWithProgressResponse(LessonResponse):
     watched_seconds: int = 0
 
 
+LESSON_LIST = TypeAdapter(List[LessonResponse])
+
+
 @router.get("/course/{course_id}", response_model=List[LessonResponse])
-async def get_course_lessons(course_id: int):
+async def get_course_lessons(course_id: int, request: Request):
     """Kurs darslari"""
     
+    version, last_modified = await catalog_version.get()
+    etag = make_etag("lessons", course_id, version)
+    headers = cache_headers(etag, CATALOG_CACHE_CONTROL, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+    
+    # Session faqat ETag mos kelmaganda ochiladi
     lesson_repo = LessonRepository()
     lessons = await lesson_repo.get_lessons_by_course(course_id)
     
-    return [
-        LessonResponse(
-            id=lesson.id,
-            course_id=lesson.course_id,
-            title=lesson.title,
-            description=lesson.description,
-            video_file_id=lesson.video_file_id,
-            video_url=lesson.video_url,
-            duration=lesson.duration,
-            order=lesson.order,
-            is_free=lesson.is_free
-        )
-        for lesson in lessons
-    ]
+    payload = LESSON_LIST.validate_python(lessons, from_attributes=True)
+    return json_response(LESSON_LIST, payload, headers)
 
 
 @router.get("/{lesson_id}", response_model=LessonResponse)
 async def get_lesson(
     lesson_id: int,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Bitta darsni olish"""
     
-    import json
-    from urllib.parse import unquote
+    telegram_id = identity.telegram_id
     
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
-    
-    lesson_repo = LessonRepository()
+    lesson_repo = LessonRepository(session)
     lesson = await lesson_repo.get_lesson_by_id(lesson_id)
     
     if not lesson:
@@ -84,17 +85,9 @@ async def get_lesson(
     
     # Kursni sotib olganligini tekshirish
     if not lesson.is_free:
-        user_repo = UserRepository()
-        user = await user_repo.get_user_by_telegram_id(telegram_id)
-        
-        if user:
-            has_access = any(
-                uc.course_id == lesson.course_id 
-                for uc in (user.purchased_courses or [])
-            )
-            
-            if not has_access:
-                raise HTTPException(status_code=403, detail="Bu darsga kirishingiz yo'q. Kursni sotib oling.")
+        user_repo = UserRepository(session)
+        if not await user_repo.has_course_access(telegram_id, lesson.course_id):
+            raise HTTPException(status_code=403, detail="Bu darsga kirishingiz yo'q. Kursni sotib oling.")
     
     return LessonResponse(
         id=lesson.id,
@@ -118,19 +111,11 @@ class UpdateProgressRequest(BaseModel):
 async def update_lesson_progress(
     lesson_id: int,
     request: UpdateProgressRequest,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_identity)
 ):
     """Dars progressini yangilash"""
     
-    import json
-    from urllib.parse import unquote
-    
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
+    telegram_id = identity.telegram_id
     
     # TODO: LessonProgress ni yangilash
     
@@ -139,8 +124,8 @@ async def update_lesson_progress(
 
 def generate_video_token(lesson_id: int, telegram_id: int, expires: int) -> str:
     """Video uchun vaqtinchalik token yaratish"""
-    data = f"{lesson_id}:{telegram_id}:{expires}:{VIDEO_TOKEN_SECRET}"
-    return hashlib.sha256(data.encode()).hexdigest()[:32]
+    data = f"{lesson_id}:{telegram_id}:{expires}"
+    return hmac.new(VIDEO_TOKEN_SECRET.encode(), data.encode(), hashlib.sha256).hexdigest()[:32]
 
 
 def verify_video_token(lesson_id: int, telegram_id: int, expires: int, token: str) -> bool:
@@ -148,27 +133,21 @@ def verify_video_token(lesson_id: int, telegram_id: int, expires: int, token: st
     if time.time() > expires:
         return False
     expected = generate_video_token(lesson_id, telegram_id, expires)
-    return token == expected
+    return hmac.compare_digest(token, expected)
 
 
 @router.get("/{lesson_id}/video-url")
 async def get_video_url(
     lesson_id: int,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    request: Request,
+    identity: TelegramIdentity = Depends(get_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Video stream URL olish (1 soat amal qiladi)"""
     
-    import json
-    from urllib.parse import unquote
-    
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
+    telegram_id = identity.telegram_id
     
-    lesson_repo = LessonRepository()
+    lesson_repo = LessonRepository(session)
     lesson = await lesson_repo.get_lesson_by_id(lesson_id)
     
     if not lesson:
@@ -176,18 +155,8 @@ async def get_video_url(
     
     # Kursni sotib olganligini tekshirish
     if not lesson.is_free:
-        user_repo = UserRepository()
-        user = await user_repo.get_user_by_telegram_id(telegram_id)
-        
-        if not user:
-            raise HTTPException(status_code=403, detail="Foydalanuvchi topilmadi")
-        
-        has_access = any(
-            uc.course_id == lesson.course_id 
-            for uc in (user.purchased_courses or [])
-        )
-        
-        if not has_access:
+        user_repo = UserRepository(session)
+        if not await user_repo.has_course_access(telegram_id, lesson.course_id):
             raise HTTPException(status_code=403, detail="Bu darsga kirishingiz yo'q")
     
     # Agar video_url bo'lsa, to'g'ridan-to'g'ri qaytarish
@@ -196,37 +165,55 @@ async def get_video_url(
     
     # Telegram file_id bo'lsa, stream URL yaratish
     if lesson.video_file_id and BOT_TOKEN:
+        # file_path keshdan (getFile faqat birinchi marta yoki muddati o'tganda)
         try:
-            # Telegram API'dan file path olish
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"https://api.telegram.org/bot{BOT_TOKEN}/getFile",
-                    params={"file_id": lesson.video_file_id},
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("ok"):
-                        file_path = data["result"]["file_path"]
-                        
-                        # Vaqtinchalik token yaratish (1 soat)
-                        expires = int(time.time()) + 3600
-                        token = generate_video_token(lesson_id, telegram_id, expires)
-                        
-                        # Telegram file URL (bu URL 1 soat amal qiladi)
-                        video_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
-                        
-                        return {
-                            "video_url": video_url,
-                            "type": "telegram",
-                            "expires": expires,
-                            "token": token,
-                            "watermark": f"@{user_data.get('username', telegram_id)}"
-                        }
-                        
-        except Exception as e:
+            await telegram_files.get_file_path(lesson.video_file_id)
+        except TelegramFileError as e:
+            if e.not_found:
+                raise HTTPException(status_code=404, detail="Video topilmadi")
             print(f"Telegram API error: {e}")
             raise HTTPException(status_code=500, detail="Video yuklanmadi")
+        
+        # Vaqtinchalik token yaratish (1 soat)
+        expires = int(time.time()) + 3600
+        token = generate_video_token(lesson_id, telegram_id, expires)
+        
+        # Bot tokeni mijozga chiqmasin: video API orqali proksi qilinadi (API'ga nisbatan yo'l)
+        stream_path = request.app.url_path_for("stream_lesson_video", lesson_id=lesson_id)
+        return {
+            "video_url": f"{stream_path}?{urlencode({'uid': telegram_id, 'expires': expires, 'token': token})}",
+            "type": "telegram",
+            "expires": expires,
+            "token": token,
+            "watermark": f"@{identity.username or telegram_id}"
+        }
     
     raise HTTPException(status_code=404, detail="Video topilmadi")
+
+
+@router.get("/{lesson_id}/stream", name="stream_lesson_video")
+async def stream_lesson_video(
+    lesson_id: int,
+    uid: int,
+    expires: int,
+    token: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    session: AsyncSession = Depends(get_session)
+):
+    """Dars videosini oqim bilan uzatish (video-url bergan imzolangan token bilan, Range qo'llab-quvvatlanadi)"""
+    
+    if not verify_video_token(lesson_id, uid, expires, token):
+        raise HTTPException(status_code=403, detail="Havola yaroqsiz yoki muddati o'tgan")
+    
+    lesson_repo = LessonRepository(session)
+    lesson = await lesson_repo.get_lesson_by_id(lesson_id)
+    
+    if not lesson or not lesson.video_file_id:
+        raise HTTPException(status_code=404, detail="Video topilmadi")
+    
+    try:
+        return await stream_file(lesson.video_file_id, parse_range(range_header))
+    except TelegramFileError as e:
+        if e.not_found:
+            raise HTTPException(status_code=404, detail="Video topilmadi")
+        raise HTTPException(status_code=502, detail="Video yuklanmadi")
@@ -1,10 +1,13 @@
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 import httpx
 
 from database.repositories import PaymentRepository, CourseRepository, UserRepository
+from database.base import get_session
+from services.telegram_auth import TelegramIdentity, get_identity
 
 router = APIRouter()
 
@@ -38,29 +41,22 @@ class PaymentResponse(BaseModel):
 @router.post("/create", response_model=PaymentResponse)
 async def create_payment(
     request: CreatePaymentRequest,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """To'lov yaratish"""
     
-    import json
-    from urllib.parse import unquote
-    
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
+    telegram_id = identity.telegram_id
     
     # Kursni topish
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(request.course_id)
     
     if not course:
         raise HTTPException(status_code=404, detail="Kurs topilmadi")
     
     # To'lovni yaratish
-    payment_repo = PaymentRepository()
+    payment_repo = PaymentRepository(session)
     payment = await payment_repo.create_payment(
         user_telegram_id=telegram_id,
         course_id=request.course_id,
@@ -103,26 +99,19 @@ async def create_payment(
 @router.post("/ton/verify")
 async def verify_ton_payment(
     request: TonVerifyRequest,
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """TON to'lovni tekshirish"""
-    import json
-    from urllib.parse import unquote
     from datetime import datetime, timedelta
     
-    # Telegram user ma'lumotlarini olish
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
+    telegram_id = identity.telegram_id
     
     if not TON_WALLET:
         raise HTTPException(status_code=500, detail="TON wallet manzili sozlanmagan")
     
     # Kursni topish
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(request.course_id)
     
     if not course:
@@ -191,31 +180,29 @@ async def verify_ton_payment(
                     
                     if any(exp.lower() in comment.lower() for exp in expected_comments):
                         # To'lov topildi! Kursni ochish
-                        user_repo = UserRepository()
-                        user = await user_repo.get_user_by_telegram_id(telegram_id)
-                        
-                        if not user:
-                            # Foydalanuvchi yaratish
-                            user = await user_repo.create_or_update_user(
-                                telegram_id=telegram_id,
-                                username=user_data.get("username"),
-                                full_name=f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip()
-                            )
+                        user_repo = UserRepository(session)
                         
                         # Kurs allaqachon sotib olinganmi tekshirish
-                        purchased_course_ids = [uc.course_id for uc in (user.purchased_courses or [])]
-                        if request.course_id in purchased_course_ids:
+                        if await user_repo.has_course_access(telegram_id, request.course_id):
                             return {
                                 "success": True,
                                 "message": "Kurs allaqachon sotib olingan",
                                 "already_purchased": True
                             }
                         
+                        # Foydalanuvchi yaratish (sessiya tokenida user_id bor - u allaqachon mavjud)
+                        if identity.user_id is None:
+                            await user_repo.create_or_update_user(
+                                telegram_id=telegram_id,
+                                username=identity.username,
+                                full_name=identity.full_name
+                            )
+                        
                         # Kursni qo'shish
                         await user_repo.add_purchased_course(telegram_id, request.course_id)
                         
                         # To'lovni saqlash
-                        payment_repo = PaymentRepository()
+                        payment_repo = PaymentRepository(session)
                         await payment_repo.create_payment(
                             user_telegram_id=telegram_id,
                             course_id=request.course_id,
@@ -259,10 +246,10 @@ async def get_ton_info():
 
 
 @router.get("/{payment_id}/status")
-async def check_payment_status(payment_id: int):
+async def check_payment_status(payment_id: int, session: AsyncSession = Depends(get_session)):
     """To'lov statusini tekshirish"""
     
-    payment_repo = PaymentRepository()
+    payment_repo = PaymentRepository(session)
     payment = await payment_repo.get_payment_by_id(payment_id)
     
     if not payment:
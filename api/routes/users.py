@@ -1,11 +1,11 @@
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-import hashlib
-import hmac
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.repositories import UserRepository
-from config import config
+from database.base import get_session
+from services.telegram_auth import TelegramIdentity, get_identity
 
 router = APIRouter()
 
@@ -32,74 +32,22 @@ class PurchasedCourseResponse(BaseModel):
         from_attributes = True
 
 
-def validate_telegram_data(init_data: str) -> Optional[dict]:
-    """Telegram WebApp ma'lumotlarini tekshirish"""
-    try:
-        # Init data ni parse qilish
-        data_parts = dict(x.split('=') for x in init_data.split('&'))
-        
-        # Hash ni olish
-        received_hash = data_parts.pop('hash', None)
-        if not received_hash:
-            return None
-        
-        # Ma'lumotlarni saralash
-        data_check_string = '\n'.join(f'{k}={v}' for k, v in sorted(data_parts.items()))
-        
-        # Secret key yaratish
-        secret_key = hmac.new(
-            b'WebAppData',
-            config.bot_token.encode(),
-            hashlib.sha256
-        ).digest()
-        
-        # Hash ni hisoblash
-        calculated_hash = hmac.new(
-            secret_key,
-            data_check_string.encode(),
-            hashlib.sha256
-        ).hexdigest()
-        
-        if calculated_hash == received_hash:
-            return data_parts
-        
-        return None
-    except Exception:
-        return None
-
-
 @router.get("/me", response_model=UserResponse)
 async def get_current_user(
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Joriy foydalanuvchi ma'lumotlari"""
     
-    import json
-    from urllib.parse import unquote
-    
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-        first_name = user_data.get('first_name', 'Foydalanuvchi')
-        last_name = user_data.get('last_name', '')
-        username = user_data.get('username')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
-    
-    if not telegram_id:
-        raise HTTPException(status_code=400, detail="User ID not found")
-    
-    user_repo = UserRepository()
-    user = await user_repo.get_user_by_telegram_id(telegram_id)
+    user_repo = UserRepository(session)
+    user = await user_repo.get_user_by_telegram_id(identity.telegram_id)
     
     # Agar foydalanuvchi topilmasa, avtomatik yaratish
     if not user:
-        full_name = f"{first_name} {last_name}".strip()
         user = await user_repo.create_or_update_user(
-            telegram_id=telegram_id,
-            username=username,
-            full_name=full_name
+            telegram_id=identity.telegram_id,
+            username=identity.username,
+            full_name=identity.full_name
         )
     
     return UserResponse(
@@ -114,21 +62,14 @@ async def get_current_user(
 
 @router.get("/me/courses", response_model=List[PurchasedCourseResponse])
 async def get_my_courses(
-    x_telegram_init_data: str = Header(..., alias="X-Telegram-Init-Data")
+    identity: TelegramIdentity = Depends(get_identity),
+    session: AsyncSession = Depends(get_session)
 ):
     """Foydalanuvchi sotib olgan kurslar"""
     
-    import json
-    from urllib.parse import unquote
-    
-    try:
-        data_parts = dict(x.split('=') for x in x_telegram_init_data.split('&'))
-        user_data = json.loads(unquote(data_parts.get('user', '{}')))
-        telegram_id = user_data.get('id')
-    except:
-        raise HTTPException(status_code=400, detail="Invalid init data format")
+    telegram_id = identity.telegram_id
     
-    user_repo = UserRepository()
+    user_repo = UserRepository(session)
     user = await user_repo.get_user_by_telegram_id(telegram_id)
     
     if not user:
@@ -148,10 +89,10 @@ async def get_my_courses(
 
 
 @router.get("/{telegram_id}", response_model=UserResponse)
-async def get_user(telegram_id: int):
+async def get_user(telegram_id: int, session: AsyncSession = Depends(get_session)):
     """Foydalanuvchi ma'lumotlari"""
     
-    user_repo = UserRepository()
+    user_repo = UserRepository(session)
     user = await user_repo.get_user_by_telegram_id(telegram_id)
     
     if not user:
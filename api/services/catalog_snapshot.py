@@ -0,0 +1,173 @@
+"""
+Katalogning tayyor, oldindan siqilgan nusxasi
+
+GET /api/courses (qidiruvsiz) javobi har bir kategoriya uchun bir marta JSON
+baytlarga aylantiriladi va gzip (hamda brotli o'rnatilgan bo'lsa br)
+variantlari bilan xotirada saqlanadi - so'rov ORM'ga tegmasdan tayyor
+baytlarni qaytaradi. Nusxa katalog versiyasiga (services/http_cache.py)
+bog'langan: shu jarayondagi kurs/dars o'zgarishi commit bo'lishi bilan fonda
+qayta quriladi, boshqa jarayonlardagi o'zgarishlar esa versiya TTL'i o'tgach
+birinchi so'rovda. Yangi nusxa to'liq tayyor bo'lgandan keyin bitta
+almashtirish bilan o'rnatiladi, so'rovlar yarim qurilgan nusxani ko'rmaydi.
+"""
+import asyncio
+import gzip
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from database.models import Course
+from database.repositories import CourseRepository
+from services.http_cache import catalog_version, make_etag
+
+try:
+    import brotli
+except ImportError:  # ixtiyoriy: o'rnatilmagan bo'lsa faqat gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Bir xil q qiymatida ustunlik tartibi
+ENCODING_PREFERENCE = ("br", "gzip", "identity")
+
+
+@dataclass
+class SnapshotEntry:
+    """Bitta kategoriya javobi: kodlash -> (tana, ETag)"""
+    variants: Dict[str, Tuple[bytes, str]]
+
+
+@dataclass
+class Snapshot:
+    version: str
+    last_modified: Optional[datetime]
+    # None kaliti - kategoriyasiz (barcha faol kurslar)
+    entries: Dict[Optional[str], SnapshotEntry] = field(default_factory=dict)
+    empty: Optional[SnapshotEntry] = None
+
+
+def compress_variants(body: bytes, key: str) -> Dict[str, Tuple[bytes, str]]:
+    """Xom, gzip va br variantlar; har bir kodlashning o'z ETag'i bor"""
+    bodies = {"identity": body, "gzip": gzip.compress(body, GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return {encoding: (data, make_etag(key, encoding)) for encoding, data in bodies.items()}
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available) -> str:
+    """Accept-Encoding bo'yicha eng mos kodlash (q=0 - rad etilgan)"""
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.partition(";")
+        params = params.strip()
+        try:
+            weights[name.strip().lower()] = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            continue
+    
+    candidates = [
+        (weights.get(encoding, weights.get("*", 0.0)), -rank, encoding)
+        for rank, encoding in enumerate(ENCODING_PREFERENCE)
+        if encoding != "identity" and encoding in available
+    ]
+    q, _, encoding = max(candidates, default=(0.0, 0, "identity"))
+    return encoding if q > 0 else "identity"
+
+
+class CatalogSnapshot:
+    """Kategoriyalar bo'yicha katalog nusxasi (versiya o'zgarganda qayta quriladi)"""
+    
+    def __init__(self, adapter: TypeAdapter):
+        self.adapter = adapter
+        self._snapshot: Optional[Snapshot] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.rebuilds = 0
+        self.last_build_ms = 0.0
+        catalog_version.on_bump(self._schedule_rebuild)
+    
+    async def get(self, category: Optional[str] = None) -> Tuple[SnapshotEntry, Optional[datetime]]:
+        """Kategoriya javobi va oxirgi o'zgarish vaqti"""
+        version, _ = await catalog_version.get()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version:
+            snapshot = await self._rebuild()
+        return snapshot.entries.get(category, snapshot.empty), snapshot.last_modified
+    
+    async def _rebuild(self) -> Snapshot:
+        async with self._lock:
+            # Navbatda turgan so'rovlar uchun nusxa allaqachon qurilgan bo'lishi mumkin
+            version, last_modified = await catalog_version.get()
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            
+            started = time.perf_counter()
+            courses = await CourseRepository().get_all_active_courses()
+            
+            groups: Dict[Optional[str], List[Course]] = {None: courses}
+            for course in courses:
+                groups.setdefault(course.category, []).append(course)
+            bodies = {
+                category: self.adapter.dump_json(self.adapter.validate_python(items, from_attributes=True))
+                for category, items in groups.items()
+            }
+            
+            snapshot = await asyncio.to_thread(self._compress, version, last_modified, bodies)
+            self._snapshot = snapshot
+            self.rebuilds += 1
+            self.last_build_ms = (time.perf_counter() - started) * 1000
+            return snapshot
+    
+    @staticmethod
+    def _compress(
+        version: str,
+        last_modified: Optional[datetime],
+        bodies: Dict[Optional[str], bytes]
+    ) -> Snapshot:
+        """Siqish event loop'dan tashqarida"""
+        snapshot = Snapshot(version=version, last_modified=last_modified)
+        for category, body in bodies.items():
+            snapshot.entries[category] = SnapshotEntry(compress_variants(body, f"courses|{version}|{category}"))
+        snapshot.empty = SnapshotEntry(compress_variants(b"[]", f"courses|{version}|-"))
+        return snapshot
+    
+    def _schedule_rebuild(self):
+        """Commit'dan keyin: nusxani fonda qayta qurish"""
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # event loop'siz (skriptlar) - birinchi so'rovda quriladi
+        self._task = loop.create_task(self._refresh())
+    
+    async def _refresh(self):
+        try:
+            await self._rebuild()
+        except Exception:
+            logger.exception("Katalog nusxasini qayta qurib bo'lmadi")
+    
+    def get_stats(self) -> dict:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"built": False, "rebuilds": self.rebuilds}
+        sizes = {}
+        for entry in snapshot.entries.values():
+            for encoding, (body, _) in entry.variants.items():
+                sizes[encoding] = sizes.get(encoding, 0) + len(body)
+        return {
+            "built": True,
+            "version": snapshot.version,
+            "categories": len(snapshot.entries) - 1,
+            "bytes": sizes,
+            "rebuilds": self.rebuilds,
+            "last_build_ms": round(self.last_build_ms, 2),
+        }
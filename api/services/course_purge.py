@@ -0,0 +1,112 @@
+"""
+O'chirilgan kurslarni fonda tozalash
+
+DELETE /api/admin/courses/{id} kursni faqat soft-delete qiladi. Bu task
+deleted_at qo'yilgan kurslarni (API yoki botda o'chirilgan) navbat bilan
+kichik partiyalarda butunlay o'chiradi. Ishga tushganda tugallanmagan
+tozalashlarni ham davom ettiradi. Holat bazadan aniqlanadi (tozalashni
+boshqa worker bajarayotgan bo'lishi mumkin); shu jarayondagi task
+ma'lumotlari faqat qo'shimcha tafsilot.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from database.repositories import CourseRepository
+
+logger = logging.getLogger(__name__)
+
+# Bir partiyadagi qatorlar va yangi o'chirishlarni tekshirish oralig'i (sekund)
+PURGE_BATCH_SIZE = 500
+PURGE_INTERVAL = 60
+
+
+class CoursePurger:
+    """Bitta fon task: soft-delete qilingan kurslarni ketma-ket tozalaydi"""
+    
+    def __init__(self, batch_size: int = PURGE_BATCH_SIZE, interval: float = PURGE_INTERVAL):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.jobs: Dict[int, dict] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def wake(self):
+        """Yangi o'chirish - keyingi tekshiruvni kutmasdan boshlash"""
+        self._wakeup.set()
+    
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                for course_id in await CourseRepository().get_deleted_course_ids():
+                    await self._purge(course_id)
+            except Exception:
+                logger.exception("Kurslarni tozalashda xatolik")
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _purge(self, course_id: int):
+        job = {"status": "running", "deleted": {}, "started_at": datetime.utcnow(), "error": None}
+        self.jobs[course_id] = job
+        
+        def on_progress(table: str, count: int):
+            job["deleted"][table] = count
+        
+        try:
+            await CourseRepository().purge_course(course_id, self.batch_size, on_progress)
+            job["status"] = "done"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            logger.exception("Kurs %s ni tozalashda xatolik", course_id)
+        job["finished_at"] = datetime.utcnow()
+    
+    async def get_status(self, course_id: int) -> dict:
+        """Tozalash holati: active / pending / running / failed / done
+        
+        Bazadan: kurs qatori yo'q - done (qator tozalashning oxirgi qadamida
+        o'chiriladi), deleted_at bor - pending va qolgan qatorlar soni.
+        running / failed faqat tozalash shu worker'da bo'layotgan bo'lsa.
+        """
+        repo = CourseRepository()
+        exists, deleted_at = await repo.get_deletion_state(course_id)
+        job = self.jobs.get(course_id)
+        
+        if not exists:
+            status, remaining = "done", {}
+        elif deleted_at is None:
+            status, remaining = "active", {}
+        else:
+            remaining = await repo.get_purge_remaining(course_id)
+            status = job["status"] if job is not None and job["status"] in ("running", "failed") else "pending"
+        
+        result = {"course_id": course_id, "status": status, "deleted_at": deleted_at, "remaining": remaining}
+        if job is not None:
+            result.update(
+                deleted=dict(job["deleted"]),
+                started_at=job["started_at"],
+                finished_at=job.get("finished_at"),
+                error=job["error"],
+            )
+        return result
+
+
+course_purger = CoursePurger()
@@ -0,0 +1,135 @@
+"""
+Katalog uchun HTTP shartli keshlash (ETag / Last-Modified / Cache-Control)
+
+ETag katalog versiyasidan olinadi: courses jadvalidagi eng katta updated_at va
+qatorlar soni (dars o'zgarishlari ham kursning updated_at'ini yangilaydi).
+Versiya jarayon ichida CATALOG_VERSION_TTL soniya saqlanadi, shuning uchun
+If-None-Match mos kelsa 304 bazaga murojaatsiz qaytadi. Shu jarayondagi har
+bir kurs/dars o'zgarishi versiyani darhol eskirtiradi; boshqa jarayonlar
+(bot, boshqa workerlar) dagi o'zgarishlar TTL ichida ko'rinadi.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database.base import PrimarySession
+from database.models import Course, Lesson
+from database.repositories import CourseRepository
+
+CATALOG_VERSION_TTL = 5.0
+
+# Ommaviy katalog: WebView va nginx qisqa muddat saqlaydi, keyin ETag bilan tekshiradi
+CATALOG_CACHE_CONTROL = "public, max-age=30, stale-while-revalidate=60"
+# Foydalanuvchiga bog'liq javob (is_purchased): faqat brauzer, har safar tekshirib
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+STATIC_CACHE_CONTROL = "public, max-age=86400"
+
+CATALOG_TABLES = {Course.__tablename__, Lesson.__tablename__}
+
+
+class CatalogVersion:
+    """Katalog versiyasi: (etag uchun kalit, oxirgi o'zgarish vaqti)"""
+    
+    def __init__(self, ttl: float = CATALOG_VERSION_TTL):
+        self.ttl = ttl
+        self._value: Optional[Tuple[str, Optional[datetime]]] = None
+        self._expires_at = 0.0
+        self._listeners: List[Callable[[], None]] = []
+    
+    async def get(self) -> Tuple[str, Optional[datetime]]:
+        if self._value is None or time.monotonic() >= self._expires_at:
+            updated_at, count = await CourseRepository().get_catalog_version()
+            self._value = (f"{updated_at.isoformat() if updated_at else '-'}:{count}", updated_at)
+            self._expires_at = time.monotonic() + self.ttl
+        return self._value
+    
+    def bump(self):
+        """Keyingi so'rov versiyani bazadan qayta o'qisin"""
+        self._expires_at = 0.0
+        for listener in self._listeners:
+            listener()
+    
+    def on_bump(self, listener: Callable[[], None]):
+        """Versiya eskirganda chaqiriladigan funksiya (masalan, katalog nusxasini qayta qurish)"""
+        self._listeners.append(listener)
+
+
+catalog_version = CatalogVersion()
+
+
+def make_etag(*parts) -> str:
+    """Kuchli ETag: qismlar xeshi"""
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """If-None-Match (ustuvor) yoki If-Modified-Since bo'yicha tekshirish"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag in candidates
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def cache_headers(
+    etag: str,
+    cache_control: str,
+    last_modified: Optional[datetime] = None,
+    vary: Optional[str] = None
+) -> dict:
+    """ETag, Cache-Control, Last-Modified va (javob so'rov headeriga bog'liq bo'lsa) Vary"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified:
+        # updated_at UTC'da (naive) saqlanadi
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    if vary:
+        headers["Vary"] = vary
+    return headers
+
+
+def not_modified(headers: dict) -> Response:
+    """304: tanasiz, keshlash headerlari bilan"""
+    return Response(status_code=304, headers=headers)
+
+
+def _mark_catalog_flush(session: Session, flush_context, instances):
+    """ORM orqali kurs/dars o'zgarishi"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Course, Lesson)):
+            session.info["catalog_changed"] = True
+            return
+
+
+def _mark_catalog_statement(orm_execute_state):
+    """Core UPDATE/DELETE/INSERT (hisoblagichlar, soft-delete, bulk import)"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if getattr(table, "name", None) in CATALOG_TABLES:
+            orm_execute_state.session.info["catalog_changed"] = True
+
+
+def _bump_after_commit(session: Session):
+    if session.info.pop("catalog_changed", False):
+        catalog_version.bump()
+
+
+event.listen(PrimarySession, "before_flush", _mark_catalog_flush)
+event.listen(PrimarySession, "do_orm_execute", _mark_catalog_statement)
+event.listen(PrimarySession, "after_commit", _bump_after_commit)
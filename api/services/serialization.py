@@ -0,0 +1,29 @@
+"""
+Tez JSON javoblar
+
+Ro'yxat endpointlari ORM obyektlarni pydantic TypeAdapter orqali bir marta
+(from_attributes bilan) tekshiradi va pydantic-core'ning dump_json'i bilan
+to'g'ridan-to'g'ri baytlarga aylantiradi. Tayyor Response qaytgani uchun
+FastAPI response_model bo'yicha qayta tekshirish va jsonable_encoder'ni
+o'tkazib yuboradi; response_model esa OpenAPI sxemasi uchun qoladi.
+Qolgan endpointlar uchun standart javob klassi - ORJSONResponse (main.py).
+"""
+from typing import Any, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+def json_response(
+    adapter: TypeAdapter,
+    payload: Any,
+    headers: Optional[dict] = None,
+    status_code: int = 200
+) -> Response:
+    """Tekshirilgan payload'ni JSON javobga aylantirish"""
+    return Response(
+        adapter.dump_json(payload),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers
+    )
@@ -0,0 +1,252 @@
+"""
+Telegram WebApp foydalanuvchisini aniqlash (X-Telegram-Init-Data)
+
+Init-data Telegram qoidasi bo'yicha tekshiriladi: HMAC-SHA256, kalit
+HMAC("WebAppData", BOT_TOKEN) - u modul yuklanganda bir marta hisoblanadi.
+Tasdiqlangan qatorlar LRU keshda saqlanadi: mini app bir sessiyada bir xil
+init-data yuboradi, shuning uchun parse va HMAC har sessiyaga bir marta
+bajariladi.
+
+POST /api/auth/session init-data'ni bir marta tekshirib, qisqa imzolangan
+sessiya tokenini beradi: "telegram_id.user_id.admin.expires.ism.imzo" (ism -
+init-data'dagi first_name, last_name va username, base64url JSON). Keyingi
+so'rovlar uni "Authorization: Bearer" bilan yuboradi va tekshiruv bazasiz,
+bitta HMAC bilan bajariladi (admin belgisi token muddati tugaguncha amal
+qiladi). Route'lar get_identity / get_optional_identity / get_admin_identity
+dependency'laridan foydalanadi - ular token va init-data'ni qabul qiladi.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from fastapi import Depends, Header, HTTPException
+
+from config import config
+
+
+class InitDataError(ValueError):
+    """Init-data noto'g'ri, imzosiz yoki eskirgan"""
+
+
+@dataclass(frozen=True)
+class TelegramIdentity:
+    """Tasdiqlangan Telegram foydalanuvchisi"""
+    telegram_id: int
+    first_name: str = "Foydalanuvchi"
+    last_name: str = ""
+    username: Optional[str] = None
+    auth_date: int = 0
+    is_admin: bool = False
+    user_id: Optional[int] = None  # faqat sessiya tokenida
+    
+    @property
+    def full_name(self) -> str:
+        return f"{self.first_name} {self.last_name}".strip()
+
+
+def _derive_secret_key(bot_token: str) -> bytes:
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+SECRET_KEY = _derive_secret_key(config.bot_token) if config.bot_token else None
+
+
+def parse_init_data(init_data: str, secret_key: Optional[bytes] = SECRET_KEY) -> TelegramIdentity:
+    """Init-data'ni tekshirish va foydalanuvchini olish (kesh ishlatilmaydi)"""
+    try:
+        fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=True))
+    except ValueError:
+        raise InitDataError("Invalid init data format")
+    
+    received_hash = fields.pop("hash", "")
+    if not config.allow_unsigned_init_data:
+        if secret_key is None:
+            raise InitDataError("BOT_TOKEN sozlanmagan")
+        data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+        calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(calculated_hash, received_hash):
+            raise InitDataError("Init data imzosi noto'g'ri")
+    
+    try:
+        auth_date = int(fields.get("auth_date", 0))
+        user = json.loads(fields.get("user", "{}"))
+        telegram_id = int(user["id"])
+    except (KeyError, TypeError, ValueError):
+        raise InitDataError("User ID not found")
+    
+    if config.init_data_max_age and not config.allow_unsigned_init_data:
+        if time.time() - auth_date > config.init_data_max_age:
+            raise InitDataError("Init data muddati o'tgan")
+    
+    return TelegramIdentity(
+        telegram_id=telegram_id,
+        first_name=user.get("first_name") or "Foydalanuvchi",
+        last_name=user.get("last_name") or "",
+        username=user.get("username"),
+        auth_date=auth_date,
+        is_admin=telegram_id in config.admin_ids,
+    )
+
+
+class InitDataCache:
+    """Tasdiqlangan init-data xeshi -> (foydalanuvchi, amal qilish muddati); LRU
+    
+    Kalit - qatorning SHA-256 digest'i: imzolangan init-data xotirada saqlanmaydi
+    va har bir yozuv o'lchami bir xil (32 bayt).
+    """
+    
+    def __init__(self, max_size: int, max_age: int):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._entries: "OrderedDict[bytes, Tuple[TelegramIdentity, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def verify(self, init_data: str) -> TelegramIdentity:
+        """Keshdan yoki to'liq tekshiruv bilan; xato bo'lsa InitDataError"""
+        key = hashlib.sha256(init_data.encode()).digest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            identity, expires_at = entry
+            if expires_at >= time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return identity
+            del self._entries[key]
+        
+        self.misses += 1
+        identity = parse_init_data(init_data)
+        if self.max_size > 0:
+            expires_at = identity.auth_date + self.max_age if self.max_age else float("inf")
+            self._entries[key] = (identity, expires_at)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return identity
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+init_data_cache = InitDataCache(config.init_data_cache_size, config.init_data_max_age)
+
+SESSION_KEY = hmac.new(
+    b"DaromatxSession", f"{config.api_secret_key}:{config.bot_token}".encode(), hashlib.sha256
+).digest()
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SESSION_KEY, payload.encode(), hashlib.sha256).digest()[:18]
+    return base64.urlsafe_b64encode(digest).decode()
+
+
+def _encode_names(identity: TelegramIdentity) -> str:
+    """Ism va username token ichida: watermark va foydalanuvchi yozuvi init-data'dagidek qoladi"""
+    raw = json.dumps([identity.first_name, identity.last_name, identity.username], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_names(encoded: str) -> Tuple[str, str, Optional[str]]:
+    first_name, last_name, username = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+    return first_name, last_name, username
+
+
+def issue_session_token(identity: TelegramIdentity, user_id: int, ttl: int = config.session_token_ttl) -> str:
+    """Tasdiqlangan foydalanuvchi uchun sessiya tokeni"""
+    payload = (
+        f"{identity.telegram_id}.{user_id}.{int(identity.is_admin)}.{int(time.time()) + ttl}"
+        f".{_encode_names(identity)}"
+    )
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_session_token(token: str) -> TelegramIdentity:
+    """Token imzosi va muddatini tekshirish (bazaga murojaatsiz)"""
+    payload, _, signature = token.rpartition(".")
+    if not payload or not hmac.compare_digest(_sign(payload), signature):
+        raise InitDataError("Sessiya tokeni yaroqsiz")
+    try:
+        *numbers, names = payload.split(".")
+        telegram_id, user_id, admin, expires = map(int, numbers)
+        first_name, last_name, username = _decode_names(names)
+    except (ValueError, TypeError):
+        raise InitDataError("Sessiya tokeni yaroqsiz")
+    if expires < time.time():
+        raise InitDataError("Sessiya tokeni muddati o'tgan")
+    return TelegramIdentity(
+        telegram_id=telegram_id,
+        first_name=first_name,
+        last_name=last_name,
+        username=username,
+        is_admin=bool(admin),
+        user_id=user_id,
+    )
+
+
+def _resolve(authorization: Optional[str], init_data: Optional[str]) -> TelegramIdentity:
+    """Bearer token (ustuvor) yoki init-data; hech biri bo'lmasa InitDataError"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() == "bearer" and token.strip():
+        return verify_session_token(token.strip())
+    if init_data:
+        return init_data_cache.verify(init_data)
+    raise InitDataError("Authorization yoki X-Telegram-Init-Data talab qilinadi")
+
+
+async def get_optional_identity(
+    authorization: Optional[str] = Header(None),
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data")
+) -> Optional[TelegramIdentity]:
+    """Header bo'lmasa yoki tasdiqlanmasa - None (ommaviy endpointlar uchun)"""
+    try:
+        return _resolve(authorization, x_telegram_init_data)
+    except InitDataError:
+        return None
+
+
+async def get_identity(
+    authorization: Optional[str] = Header(None),
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data")
+) -> TelegramIdentity:
+    """Tasdiqlangan foydalanuvchi (sessiya tokeni yoki init-data); aks holda 401"""
+    try:
+        return _resolve(authorization, x_telegram_init_data)
+    except InitDataError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+
+async def get_init_data_identity(
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data")
+) -> TelegramIdentity:
+    """Faqat init-data (sessiya tokeni berish uchun); aks holda 401"""
+    if not x_telegram_init_data:
+        raise HTTPException(status_code=401, detail="X-Telegram-Init-Data talab qilinadi")
+    try:
+        return init_data_cache.verify(x_telegram_init_data)
+    except InitDataError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+
+async def get_admin_identity(identity: TelegramIdentity = Depends(get_identity)) -> TelegramIdentity:
+    """Faqat adminlar; aks holda 403"""
+    if not identity.is_admin:
+        raise HTTPException(status_code=403, detail="Ruxsat yo'q")
+    return identity
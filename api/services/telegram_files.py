@@ -0,0 +1,164 @@
+"""
+Telegram fayllari: getFile natijalari keshi
+
+Dars videosi ochilganda file_id -> file_path kerak bo'ladi. Natija
+TELEGRAM_FILE_PATH_TTL davomida LRU keshda saqlanadi (Telegram havolasi
+taxminan bir soat amal qiladi), xatolar esa qisqa TELEGRAM_FILE_ERROR_TTL
+davomida - ishlamayotgan file_id uchun API'ga qayta-qayta murojaat qilinmaydi.
+Bir vaqtda kelgan bir xil file_id so'rovlari bitta getFile chaqiruvini
+kutadi. Hammasi bitta pool'li httpx klient orqali; manzil TELEGRAM_API_URL
+dan olinadi, shuning uchun lokal Bot API stand bilan sinash mumkin.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from config import config
+
+
+class TelegramFileError(Exception):
+    """getFile muvaffaqiyatsiz: fayl topilmadi (not_found) yoki API bilan aloqa yo'q"""
+    
+    def __init__(self, message: str, not_found: bool = False):
+        super().__init__(message)
+        self.not_found = not_found
+
+
+class TelegramFiles:
+    """file_id -> file_path: LRU + TTL, xatolar keshi va so'rovlarni birlashtirish"""
+    
+    def __init__(
+        self,
+        bot_token: str,
+        base_url: str,
+        max_size: int,
+        ttl: float,
+        error_ttl: float,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.bot_token = bot_token
+        self.base_url = base_url
+        self.max_size = max_size
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.transport = transport
+        # file_id -> (amal qilish muddati, file_path yoki None, xato yoki None)
+        self._entries: "OrderedDict[str, Tuple[float, Optional[str], Optional[TelegramFileError]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_errors = 0
+        self.evictions = 0
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Umumiy klient (keep-alive ulanishlar qayta ishlatiladi)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                transport=self.transport
+            )
+        return self._client
+    
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def download_path(self, file_path: str) -> str:
+        """Faylni yuklab olish yo'li (client base_url'iga nisbatan; ichida bot tokeni bor)"""
+        return f"/file/bot{self.bot_token}/{file_path}"
+    
+    async def get_file_path(self, file_id: str) -> str:
+        """file_path; xato bo'lsa TelegramFileError"""
+        entry = self._entries.get(file_id)
+        if entry is not None:
+            expires_at, file_path, error = entry
+            if expires_at >= time.monotonic():
+                self._entries.move_to_end(file_id)
+                if error is not None:
+                    self.negative_hits += 1
+                    raise TelegramFileError(str(error), error.not_found)
+                self.hits += 1
+                return file_path
+            del self._entries[file_id]
+        
+        task = self._inflight.get(file_id)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._fetch(file_id))
+            self._inflight[file_id] = task
+            task.add_done_callback(lambda done: self._on_fetch_done(file_id, done))
+        # Chaqiruvchi uzilsa ham so'rov boshqalar uchun davom etadi
+        return await asyncio.shield(task)
+    
+    def _on_fetch_done(self, file_id: str, task: asyncio.Task):
+        self._inflight.pop(file_id, None)
+        if not task.cancelled():
+            task.exception()  # hech kim kutmagan bo'lsa ham xato "olingan" bo'lsin
+    
+    async def _fetch(self, file_id: str) -> str:
+        try:
+            response = await self.client.get(f"/bot{self.bot_token}/getFile", params={"file_id": file_id})
+            data = response.json()
+        except (httpx.HTTPError, ValueError):
+            self.upstream_errors += 1
+            error = TelegramFileError("Telegram API bilan bog'lanib bo'lmadi")
+        else:
+            file_path = (data.get("result") or {}).get("file_path") if data.get("ok") else None
+            if file_path:
+                self._store(file_id, time.monotonic() + self.ttl, file_path, None)
+                return file_path
+            error = TelegramFileError(data.get("description") or "Fayl topilmadi", not_found=True)
+        
+        self._store(file_id, time.monotonic() + self.error_ttl, None, error)
+        raise error
+    
+    def _store(self, file_id: str, expires_at: float, file_path: Optional[str], error: Optional[TelegramFileError]):
+        if self.max_size <= 0:
+            return
+        self._entries[file_id] = (expires_at, file_path, error)
+        self._entries.move_to_end(file_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, file_id: str):
+        """file_path eskirgan (yuklab olish 404 qaytardi)"""
+        self._entries.pop(file_id, None)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.negative_hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 3) if lookups else 0.0,
+            "upstream_errors": self.upstream_errors,
+            "evictions": self.evictions,
+        }
+
+
+telegram_files = TelegramFiles(
+    config.bot_token,
+    config.telegram_api_url,
+    config.telegram_file_cache_size,
+    config.telegram_file_path_ttl,
+    config.telegram_file_error_ttl
+)
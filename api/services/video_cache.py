@@ -0,0 +1,288 @@
+"""
+Dars videolari uchun diskdagi segment keshi
+
+Video VIDEO_CACHE_SEGMENT_KB o'lchamidagi bo'laklarga (segmentlarga) bo'linib
+VIDEO_CACHE_DIR ga yoziladi: kalit - (video_file_id, segment raqami).
+Umumiy hajm VIDEO_CACHE_SIZE_MB bilan cheklangan, to'lganda eng uzoq
+ishlatilmagan segmentlar o'chiriladi (LRU). Indeks xotirada saqlanadi va
+papkadan tiklanadi: ishga tushishda va yozishda har RESYNC_INTERVAL da.
+Papka bir nechta uvicorn worker'ga umumiy - hajm va LRU tartibi diskdagi
+fayllar (o'qilganda yangilanadigan mtime) bo'yicha hisoblanadi, shuning
+uchun cheklov oshib ketishi bitta interval ichidagi yozuvlar bilan
+chegaralangan. Boshqa worker o'chirgan segment o'qilmasa qayta yuklanadi,
+yozgani esa indeksda bo'lmasa ham diskdan topiladi. Segment vaqtinchalik faylga
+yozilib os.replace bilan joyiga qo'yiladi - yarim yozilgan segment o'qilmaydi.
+Disk bilan ishlash event loop'dan tashqarida (asyncio.to_thread).
+
+Upstream'dan olinayotgan segmentlar "jarayonda" deb belgilanadi: shu
+segment kerak bo'lgan boshqa tomoshabinlar yangi so'rov yubormay, birinchi
+yuklab olishni kutadi (kurs chiqqanda bir xil darslarni ko'pchilik ochadi).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+SEGMENT_SUFFIX = ".seg"
+# Indeksni papka bilan solishtirish oralig'i (boshqa worker'lar yozgan/o'chirgan fayllar)
+RESYNC_INTERVAL = 30.0
+# Shundan eski .tmp fayllar va meta'siz papkalar - uzilgan yozuv qoldiqlari
+STALE_AGE = 600.0
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+class VideoSegmentCache:
+    """(file_id, segment raqami) -> diskdagi fayl; umumiy hajm bo'yicha LRU"""
+    
+    def __init__(self, directory: str, max_bytes: int, segment_size: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_size = segment_size
+        # (file_id, segment) -> segment hajmi; tartib - oxirgi ishlatilgan oxirida
+        self._segments: "OrderedDict[Tuple[str, int], int]" = OrderedDict()
+        # file_id -> (fayl hajmi, Content-Type)
+        self._files: Dict[str, Tuple[int, str]] = {}
+        # Upstream'dan olinayotgan segmentlar: natija baytlar yoki None (yuklab olish uzildi)
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.size = 0
+        self._synced_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bytes_saved = 0
+        self.bytes_fetched = 0
+        self.evictions = 0
+        self.write_errors = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.max_bytes > 0 and self.segment_size > 0
+    
+    def _file_dir(self, file_id: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(file_id.encode()).hexdigest()[:32])
+    
+    def _segment_path(self, file_id: str, index: int) -> str:
+        return os.path.join(self._file_dir(file_id), f"{index:06d}{SEGMENT_SUFFIX}")
+    
+    async def load(self):
+        """Oldingi ishga tushishdan (va boshqa worker'lardan) qolgan segmentlarni indeksga olish"""
+        if not self.enabled:
+            return
+        await self._resync()
+        await self._evict()
+    
+    async def _resync(self):
+        """Indeks va umumiy hajmni diskdagi holatdan qayta qurish"""
+        self._synced_at = time.monotonic()
+        files, segments = await asyncio.to_thread(self._scan)
+        self._files.update(files)
+        self._segments = OrderedDict(((file_id, index), size) for file_id, index, size in segments)
+        self.size = sum(self._segments.values())
+    
+    def _scan(self) -> Tuple[Dict[str, Tuple[int, str]], List[Tuple[str, int, int]]]:
+        files, found = {}, []
+        if not os.path.isdir(self.directory):
+            return files, []
+        stale_before = time.time() - STALE_AGE
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            try:
+                with open(os.path.join(entry.path, META_FILE)) as f:
+                    meta = json.load(f)
+                file_id, total = meta["file_id"], int(meta["total"])
+                valid = meta["segment_size"] == self.segment_size
+            except (OSError, ValueError, KeyError, TypeError):
+                # Meta hali yozilmagan bo'lishi mumkin (boshqa worker) - faqat eskisini o'chirish
+                valid = None if _mtime(entry.path) > stale_before else False
+            if not valid:
+                if valid is False:
+                    # Boshqa segment o'lchami yoki buzilgan meta - qayta yuklab olinadi
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            files[file_id] = (total, meta.get("media_type") or "application/octet-stream")
+            for segment in os.scandir(entry.path):
+                try:
+                    stat = segment.stat()
+                except FileNotFoundError:
+                    continue  # boshqa worker o'chirdi
+                if segment.name.endswith(".tmp"):
+                    if stat.st_mtime < stale_before:
+                        VideoSegmentCache._unlink([segment.path])
+                elif segment.name.endswith(SEGMENT_SUFFIX):
+                    found.append((stat.st_mtime, file_id, int(segment.name[:-len(SEGMENT_SUFFIX)]), stat.st_size))
+        found.sort()
+        return files, [(file_id, index, size) for _, file_id, index, size in found]
+    
+    def get_file(self, file_id: str) -> Optional[Tuple[int, str]]:
+        """Fayl hajmi va Content-Type (birinchi yuklab olishda saqlanadi)"""
+        return self._files.get(file_id)
+    
+    async def put_file(self, file_id: str, total: int, media_type: str):
+        if self._files.get(file_id) == (total, media_type):
+            return
+        self._files[file_id] = (total, media_type)
+        meta = {"file_id": file_id, "total": total, "media_type": media_type, "segment_size": self.segment_size}
+        try:
+            await asyncio.to_thread(
+                self._write_atomic, os.path.join(self._file_dir(file_id), META_FILE), json.dumps(meta).encode()
+            )
+        except OSError:
+            self.write_errors += 1
+            logger.warning("Video keshi: meta yozilmadi (%s)", file_id, exc_info=True)
+    
+    def contains(self, file_id: str, index: int) -> bool:
+        return (file_id, index) in self._segments
+    
+    def is_pending(self, file_id: str, index: int) -> bool:
+        return (file_id, index) in self._inflight
+    
+    def claim(self, file_id: str, index: int) -> bool:
+        """Segmentni yuklab olishni o'z zimmasiga olish (boshqasi olayotgan bo'lsa False)"""
+        key = (file_id, index)
+        if key in self._inflight:
+            return False
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        return True
+    
+    def release(self, file_id: str, index: int, data: Optional[bytes] = None):
+        """Kutayotganlarga segmentni (yoki None - o'zlari yuklab olsin) berish"""
+        future = self._inflight.pop((file_id, index), None)
+        if future is not None and not future.done():
+            future.set_result(data)
+    
+    async def wait(self, file_id: str, index: int) -> Optional[bytes]:
+        """Boshqa so'rov olayotgan segmentni kutish; jarayonda bo'lmasa yoki uzilsa None"""
+        future = self._inflight.get((file_id, index))
+        if future is None:
+            return None
+        # Kutuvchi uzilsa ham future boshqalar uchun bekor qilinmasin
+        data = await asyncio.shield(future)
+        if data is not None:
+            self.coalesced += 1
+            self.bytes_saved += len(data)
+        return data
+    
+    async def read(self, file_id: str, index: int, offset: int, length: int) -> Optional[bytes]:
+        """Segment bo'lagi (os.pread); diskda bo'lmasa None"""
+        key = (file_id, index)
+        # Indeksda bo'lmasa ham o'qib ko'riladi: segmentni boshqa worker yozgan bo'lishi mumkin
+        result = await asyncio.to_thread(self._pread, self._segment_path(file_id, index), offset, length)
+        if result is None or len(result[0]) != length:
+            # Fayl o'chirilgan (boshqa worker) yoki qisqa - indeksdan chiqarish
+            self.size -= self._segments.pop(key, 0)
+            return None
+        data, size = result
+        self.size += size - self._segments.pop(key, 0)
+        self._segments[key] = size
+        self.hits += 1
+        self.bytes_saved += length
+        return data
+    
+    async def store(self, file_id: str, index: int, data: bytes):
+        """Upstream'dan kelgan segmentni saqlash (xato bo'lsa faqat log)"""
+        self.misses += 1
+        self.bytes_fetched += len(data)
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+        try:
+            await asyncio.to_thread(self._write_atomic, self._segment_path(file_id, index), data)
+        except OSError:
+            self.write_errors += 1
+            logger.warning("Video keshi: segment yozilmadi (%s #%s)", file_id, index, exc_info=True)
+            return
+        key = (file_id, index)
+        self.size += len(data) - self._segments.pop(key, 0)
+        self._segments[key] = len(data)
+        if time.monotonic() - self._synced_at > RESYNC_INTERVAL:
+            await self._resync()
+        await self._evict()
+    
+    async def _evict(self):
+        paths = []
+        while self.size > self.max_bytes and self._segments:
+            (file_id, index), size = self._segments.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            paths.append(self._segment_path(file_id, index))
+        if paths:
+            await asyncio.to_thread(self._unlink, paths)
+    
+    @staticmethod
+    def _pread(path: str, offset: int, length: int) -> Optional[Tuple[bytes, int]]:
+        """(bo'lak, segment hajmi); mtime yangilanadi - worker'lar uchun umumiy LRU tartibi"""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            data = os.pread(fd, length, offset)
+            os.utime(fd)
+            return data, os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    
+    @staticmethod
+    def _unlink(paths: List[str]):
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "enabled": self.enabled,
+            "files": len(self._files),
+            "segments": len(self._segments),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "segment_size": self.segment_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "bytes_fetched": self.bytes_fetched,
+            "evictions": self.evictions,
+            "write_errors": self.write_errors,
+        }
+
+
+video_cache = VideoSegmentCache(
+    config.video_cache_dir,
+    config.video_cache_size_mb * 1024 * 1024,
+    config.video_cache_segment_kb * 1024
+)
@@ -0,0 +1,329 @@
+"""
+Telegram'dagi dars videolarini proksi qilish (HTTP Range / 206)
+
+Mijoz bot tokeni bor Telegram havolasini ko'rmaydi: /api/lessons/{id}/stream
+faylni services/telegram_files.py dagi umumiy klient orqali oqim bilan
+uzatadi. Range header Telegram'ga uzatiladi, javob STREAM_CHUNK_SIZE
+bo'laklarda yuboriladi - videoning hajmidan qat'i nazar xotira bir xil.
+Telegram Range'ni e'tiborsiz qoldirsa (200), kerakli bo'lak shu yerda
+kesib olinadi. Eskirgan file_path (404) bir marta yangilanib qayta so'raladi.
+
+Diskdagi segment keshi (services/video_cache.py) yoqilgan bo'lsa, so'ralgan
+oraliq segmentlarga bo'linadi: keshdagilari diskdan o'qiladi, yo'qlari esa
+ketma-ket guruhlab bitta Range so'rovi bilan Telegram'dan olinadi va
+keshga yoziladi; boshqa so'rov olayotgan segment kutiladi, qayta
+so'ralmaydi. Birinchi segment javob sarlavhalaridan oldin tayyorlanadi -
+Telegram xatolari 404/502 bo'lib qaytadi, oqim o'rtasida uzilmaydi.
+"""
+import logging
+import mimetypes
+import re
+from typing import AsyncIterator, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from services.telegram_files import TelegramFileError, telegram_files
+from services.video_cache import video_cache
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 256 * 1024
+STREAM_CACHE_CONTROL = "private, max-age=3600"
+
+# (start, end): "bytes=0-" -> (0, None), "bytes=-500" -> (None, 500) - oxirgi 500 bayt
+ByteRange = Tuple[Optional[int], Optional[int]]
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_CONTENT_RANGE_TOTAL_RE = re.compile(r"/(\d+)$")
+
+
+def parse_range(header: Optional[str]) -> Optional[ByteRange]:
+    """Bitta bayt oralig'i; noto'g'ri yoki bir nechta oraliq - None (butun fayl)"""
+    match = _RANGE_RE.match((header or "").replace(" ", ""))
+    if not match or match.group(0) == "bytes=-":
+        return None
+    start = int(match.group(1)) if match.group(1) else None
+    end = int(match.group(2)) if match.group(2) else None
+    if start is not None and end is not None and end < start:
+        return None
+    return start, end
+
+
+def resolve_range(byte_range: ByteRange, total: int) -> Optional[Tuple[int, int]]:
+    """Fayl hajmi ma'lum bo'lganda aniq [start, end]; qoniqtirib bo'lmasa None (416)"""
+    start, end = byte_range
+    if start is None:
+        start, end = max(total - end, 0), total - 1
+    elif end is None or end >= total:
+        end = total - 1
+    if start >= total or total == 0:
+        return None
+    return start, end
+
+
+async def _iter_body(
+    upstream: httpx.Response,
+    skip: int = 0,
+    length: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """Upstream tanasini bo'laklab uzatish; kerak bo'lsa boshini tashlab, oxirini kesib"""
+    try:
+        async for chunk in upstream.aiter_bytes(STREAM_CHUNK_SIZE):
+            if skip:
+                if len(chunk) <= skip:
+                    skip -= len(chunk)
+                    continue
+                chunk, skip = chunk[skip:], 0
+            if length is not None:
+                if len(chunk) >= length:
+                    yield chunk[:length]
+                    return
+                length -= len(chunk)
+            yield chunk
+    finally:
+        await upstream.aclose()
+
+
+async def _open_upstream(file_id: str, byte_range: Optional[ByteRange]) -> Tuple[httpx.Response, str]:
+    """Telegram'dagi faylga so'rov (javob tanasi hali o'qilmagan)"""
+    # Video baytlari o'zgarmasdan uzatiladi (Content-Length/Range siqilmagan tanaga tegishli)
+    headers = {"Accept-Encoding": "identity"}
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Range"] = f"bytes={'' if start is None else start}-{'' if end is None else end}"
+    
+    for attempt in range(2):
+        file_path = await telegram_files.get_file_path(file_id)
+        client = telegram_files.client
+        request = client.build_request("GET", telegram_files.download_path(file_path), headers=headers)
+        try:
+            upstream = await client.send(request, stream=True)
+        except httpx.HTTPError:
+            raise HTTPException(status_code=502, detail="Video yuklanmadi")
+        if upstream.status_code == 404 and attempt == 0:
+            # file_path muddati o'tgan - getFile'ni qayta chaqirish
+            await upstream.aclose()
+            telegram_files.invalidate(file_id)
+            continue
+        return upstream, file_path
+
+
+def _media_type(upstream: httpx.Response, file_path: str) -> str:
+    media_type = upstream.headers.get("content-type", "application/octet-stream")
+    if media_type == "application/octet-stream":
+        media_type = mimetypes.guess_type(file_path)[0] or media_type
+    return media_type
+
+
+async def stream_file(file_id: str, byte_range: Optional[ByteRange]) -> StreamingResponse:
+    """Faylni (yoki so'ralgan bo'lagini) oqim bilan qaytarish"""
+    if video_cache.enabled:
+        return await _stream_cached(file_id, byte_range)
+    
+    upstream, file_path = await _open_upstream(file_id, byte_range)
+    
+    if upstream.status_code == 416:
+        await upstream.aclose()
+        raise HTTPException(
+            status_code=416,
+            detail="Noto'g'ri bayt oralig'i",
+            headers={"Content-Range": upstream.headers.get("content-range", "bytes */*")}
+        )
+    if upstream.status_code not in (200, 206):
+        await upstream.aclose()
+        raise HTTPException(status_code=502, detail="Video yuklanmadi")
+    
+    media_type = _media_type(upstream, file_path)
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": STREAM_CACHE_CONTROL}
+    status_code = upstream.status_code
+    skip, length = 0, None
+    
+    if status_code == 206:
+        headers["Content-Range"] = upstream.headers.get("content-range", "")
+    elif byte_range is not None and "content-length" in upstream.headers:
+        # Telegram Range'ni qo'llamadi: bo'lakni o'zimiz kesamiz
+        total = int(upstream.headers["content-length"])
+        resolved = resolve_range(byte_range, total)
+        if resolved is None:
+            await upstream.aclose()
+            raise HTTPException(
+                status_code=416, detail="Noto'g'ri bayt oralig'i", headers={"Content-Range": f"bytes */{total}"}
+            )
+        start, end = resolved
+        skip, length = start, end - start + 1
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+    
+    if length is not None:
+        headers["Content-Length"] = str(length)
+    elif "content-length" in upstream.headers:
+        headers["Content-Length"] = upstream.headers["content-length"]
+    
+    return StreamingResponse(
+        _iter_body(upstream, skip, length),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
+
+
+async def _fetch_run(file_id: str, first: int, last: int) -> AsyncIterator[Tuple[int, bytes]]:
+    """Segmentlar [first, last] bitta Range so'rovi bilan: (raqam, baytlar); har biri keshga yoziladi"""
+    size = video_cache.segment_size
+    # Await'dan oldin: shu segmentlarni so'ragan boshqalar bu yuklab olishni kutadi
+    claimed = [index for index in range(first, last + 1) if video_cache.claim(file_id, index)]
+    upstream = None
+    try:
+        upstream, file_path = await _open_upstream(file_id, (first * size, (last + 1) * size - 1))
+        match = _CONTENT_RANGE_TOTAL_RE.search(upstream.headers.get("content-range", ""))
+        skip = 0
+        if upstream.status_code == 206 and match:
+            total = int(match.group(1))
+        elif upstream.status_code == 200 and "content-length" in upstream.headers:
+            # Range qo'llanmadi: fayl boshidan o'tkazib yuboriladi
+            total, skip = int(upstream.headers["content-length"]), first * size
+        elif upstream.status_code == 416 and match:
+            # Segment fayl oxiridan keyin - faqat hajmni eslab qolamiz
+            await video_cache.put_file(file_id, int(match.group(1)), _media_type(upstream, file_path))
+            return
+        else:
+            raise HTTPException(status_code=502, detail="Video yuklanmadi")
+        
+        await video_cache.put_file(file_id, total, _media_type(upstream, file_path))
+        last = min(last, (total - 1) // size)
+        index, buffer = first, bytearray()
+        async for chunk in _iter_body(upstream, skip, max(min((last + 1) * size, total) - first * size, 0)):
+            buffer += chunk
+            while index <= last and len(buffer) >= min(size, total - index * size):
+                length = min(size, total - index * size)
+                data = bytes(buffer[:length])
+                del buffer[:length]
+                # Avval diskka, keyin kutayotganlarga: oraliqda segment "yo'q" bo'lib ko'rinmasin
+                await video_cache.store(file_id, index, data)
+                video_cache.release(file_id, index, data)
+                yield index, data
+                index += 1
+        if index <= last:
+            # Upstream javobi to'liq kelmadi - qisqa segment keshga tushmasin
+            raise HTTPException(status_code=502, detail="Video yuklanmadi")
+    finally:
+        # Olinmay qolgan segmentlarni kutayotganlar o'zlari yuklab oladi
+        for index in claimed:
+            video_cache.release(file_id, index)
+        if upstream is not None:
+            await upstream.aclose()
+
+
+async def _fetch_segment(file_id: str, index: int) -> Optional[Tuple[int, bytes]]:
+    data = await video_cache.wait(file_id, index)
+    if data is not None:
+        return index, data
+    run = _fetch_run(file_id, index, index)
+    try:
+        async for _, data in run:
+            return index, data
+    finally:
+        await run.aclose()
+    return None
+
+
+async def _cached_body(
+    file_id: str,
+    start: int,
+    end: int,
+    head: Optional[Tuple[int, bytes]] = None
+) -> AsyncIterator[bytes]:
+    """[start, end] oraliq: keshdagi segmentlar diskdan, qolganlari upstream'dan"""
+    size = video_cache.segment_size
+    index, last = start // size, end // size
+    run = None
+    
+    def bounds(segment: int) -> Tuple[int, int]:
+        offset = max(start - segment * size, 0)
+        return offset, min(end + 1 - segment * size, size) - offset
+    
+    try:
+        while index <= last:
+            offset, length = bounds(index)
+            if head is not None and head[0] == index:
+                data, head = head[1][offset:offset + length], None
+            else:
+                data = None
+                if not video_cache.is_pending(file_id, index):
+                    data = await video_cache.read(file_id, index, offset, length)
+                if data is None and video_cache.is_pending(file_id, index):
+                    # Boshqa so'rov olayotgan bo'lsa (o'qish paytida boshlangan bo'lishi ham mumkin)
+                    segment = await video_cache.wait(file_id, index)
+                    data = segment[offset:offset + length] if segment is not None else None
+                if data is None and video_cache.contains(file_id, index):
+                    # Kutish paytida boshqa so'rov yozib qo'ygan
+                    data = await video_cache.read(file_id, index, offset, length)
+            if data is not None:
+                yield data
+                index += 1
+                continue
+            
+            # Keshda ham, jarayonda ham yo'q segmentlar ketma-ketligi - bitta so'rov bilan
+            run_last = index
+            while (
+                run_last < last
+                and not video_cache.contains(file_id, run_last + 1)
+                and not video_cache.is_pending(file_id, run_last + 1)
+            ):
+                run_last += 1
+            run = _fetch_run(file_id, index, run_last)
+            async for index, data in run:
+                offset, length = bounds(index)
+                yield data[offset:offset + length]
+            run = None
+            index += 1
+    except (httpx.HTTPError, HTTPException, TelegramFileError) as e:
+        # Sarlavhalar yuborilgan: ulanish uziladi, pleyer Range bilan qayta so'raydi
+        logger.warning("Video oqimi uzildi (%s): %s", file_id, e)
+    finally:
+        if run is not None:
+            await run.aclose()
+
+
+async def _stream_cached(file_id: str, byte_range: Optional[ByteRange]) -> StreamingResponse:
+    """stream_file segment keshi orqali"""
+    size = video_cache.segment_size
+    head = None
+    if video_cache.get_file(file_id) is None:
+        # Fayl hajmi hali noma'lum: kerakli (yoki birinchi) segment bilan birga olinadi
+        probe = byte_range[0] // size if byte_range is not None and byte_range[0] is not None else 0
+        head = await _fetch_segment(file_id, probe)
+    info = video_cache.get_file(file_id)
+    if info is None:
+        raise HTTPException(status_code=502, detail="Video yuklanmadi")
+    total, media_type = info
+    
+    status_code = 200
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": STREAM_CACHE_CONTROL}
+    if byte_range is None:
+        start, end = 0, total - 1
+    else:
+        resolved = resolve_range(byte_range, total)
+        if resolved is None:
+            raise HTTPException(
+                status_code=416, detail="Noto'g'ri bayt oralig'i", headers={"Content-Range": f"bytes */{total}"}
+            )
+        start, end = resolved
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    first = start // size
+    if head is not None and head[0] != first:
+        head = None
+    if head is None and start <= end and not video_cache.contains(file_id, first):
+        head = await _fetch_segment(file_id, first)
+    
+    return StreamingResponse(
+        _cached_body(file_id, start, end, head),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
@@ -5,9 +5,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-def get_database_url() -> str:
+def get_database_url(
+    env_name: str = "DATABASE_URL",
+    default: str = "sqlite+aiosqlite:///./database.db"
+) -> str:
     """Database URL olish va formatlash"""
-    url = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./database.db")
+    url = os.getenv(env_name, default)
     
     # Railway PostgreSQL URL'ni asyncpg formatiga o'zgartirish
     if url.startswith("postgres://"):
@@ -24,15 +27,56 @@ class Config:
     bot_token: str = os.getenv("BOT_TOKEN", "")
     admin_ids: list[int] = None
     database_url: str = None
+    database_replica_url: str = None  # ixtiyoriy, faqat o'qish uchun
     api_host: str = os.getenv("API_HOST", "0.0.0.0")
     api_port: int = int(os.getenv("API_PORT", "8000"))
     api_secret_key: str = os.getenv("API_SECRET_KEY", "secret")
     mini_app_url: str = os.getenv("MINI_APP_URL", "https://your-domain.com")
     
+    # Database connection pool (PostgreSQL)
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # sekundlarda
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    db_statement_cache_size: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))  # asyncpg, pgbouncer uchun 0
+    
+    # SQLite (bitta serverli o'rnatish) - har bir ulanishda PRAGMA'lar
+    sqlite_journal_mode: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    sqlite_synchronous: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    sqlite_busy_timeout: int = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # millisekundlarda
+    sqlite_mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # baytlarda
+    sqlite_cache_size_kb: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    sqlite_writer_queue: bool = os.getenv("SQLITE_WRITER_QUEUE", "true").lower() in ("1", "true", "yes")
+    
+    # Kirish huquqlari keshi (telegram_id -> sotib olingan kurslar); 0 - o'chirilgan
+    entitlement_cache_size: int = int(os.getenv("ENTITLEMENT_CACHE_SIZE", "10000"))
+    entitlement_cache_ttl: float = float(os.getenv("ENTITLEMENT_CACHE_TTL", "300"))  # sekundlarda
+    
+    # Telegram WebApp init-data: tasdiqlangan qatorlar keshi va amal qilish muddati
+    init_data_cache_size: int = int(os.getenv("INIT_DATA_CACHE_SIZE", "10000"))
+    init_data_max_age: int = int(os.getenv("INIT_DATA_MAX_AGE", "86400"))  # sekundlarda, 0 - cheklanmagan
+    # Faqat lokal ishlab chiqish uchun: imzosiz init-data qabul qilinadi
+    allow_unsigned_init_data: bool = os.getenv("ALLOW_UNSIGNED_INIT_DATA", "false").lower() in ("1", "true", "yes")
+    # Init-data evaziga beriladigan sessiya tokeni (Authorization: Bearer) muddati
+    session_token_ttl: int = int(os.getenv("SESSION_TOKEN_TTL", "3600"))  # sekundlarda
+    
+    # Telegram Bot API (lokal telegram-bot-api server yoki test stand uchun o'zgartiriladi)
+    telegram_api_url: str = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+    # getFile natijalari keshi: file_id -> file_path (Telegram havolasi ~1 soat amal qiladi)
+    telegram_file_cache_size: int = int(os.getenv("TELEGRAM_FILE_CACHE_SIZE", "5000"))
+    telegram_file_path_ttl: float = float(os.getenv("TELEGRAM_FILE_PATH_TTL", "3000"))  # sekundlarda
+    telegram_file_error_ttl: float = float(os.getenv("TELEGRAM_FILE_ERROR_TTL", "30"))  # xatolar keshi
+    # Dars videolari segment keshi (diskda, LRU); VIDEO_CACHE_SIZE_MB=0 - o'chirilgan
+    video_cache_dir: str = os.getenv("VIDEO_CACHE_DIR", "data/video_cache")
+    video_cache_size_mb: int = int(os.getenv("VIDEO_CACHE_SIZE_MB", "2048"))
+    video_cache_segment_kb: int = int(os.getenv("VIDEO_CACHE_SEGMENT_KB", "1024"))
+    
     def __post_init__(self):
         admin_ids_str = os.getenv("ADMIN_IDS", "")
         self.admin_ids = [int(x.strip()) for x in admin_ids_str.split(",") if x.strip()]
         self.database_url = get_database_url()
+        self.database_replica_url = get_database_url("DATABASE_REPLICA_URL", "")
 
 
 config = Config()
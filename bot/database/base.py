@@ -1,5 +1,15 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from sqlalchemy.util import await_only
 
 from config import config
 
@@ -9,19 +19,290 @@ class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(config.database_url, echo=False)
-async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+class PoolStats:
+    """Connection pool statistikasi (pool o'lchamini tanlash uchun)"""
+    
+    def __init__(self):
+        self.checked_out = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def record_wait(self, seconds: float):
+        """Ulanish olishga ketgan vaqtni qayd qilish"""
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+    
+    def as_dict(self) -> dict:
+        avg_wait = self.total_wait / self.checkouts if self.checkouts else 0.0
+        return {
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(avg_wait * 1000, 3),
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+pool_stats = PoolStats()
+# Replika alohida: faqat o'qiydigan so'rovlar asosiy bazadan ulanish olmayotganini ko'rish uchun
+replica_pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Ulanish kutish vaqtini o'lchaydigan pool"""
+    
+    stats = pool_stats
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.record_wait(time.perf_counter() - started)
+
+
+class ReplicaQueuePool(InstrumentedQueuePool):
+    """Replika pool'i (statistikasi alohida)"""
+    
+    stats = replica_pool_stats
+
+
+class SqliteWriter:
+    """SQLite yozuvlari navbati: jarayon ichida bir vaqtda bitta yozuvchi tranzaksiya (FIFO)"""
+    
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._owner = None
+        self._depth = 0
+        self.acquired = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    async def acquire(self):
+        # Bitta task ichidagi ikkinchi session o'zini o'zi kutib qolmasligi uchun reentrant
+        task = asyncio.current_task()
+        if self._owner is task:
+            self._depth += 1
+            return
+        
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._lock.acquire()
+        finally:
+            self.waiting -= 1
+        
+        waited = time.perf_counter() - started
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.acquired += 1
+        self._owner = task
+        self._depth = 1
+    
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            self._lock.release()
+    
+    def as_dict(self) -> dict:
+        avg_wait = self.total_wait / self.acquired if self.acquired else 0.0
+        return {
+            "write_transactions": self.acquired,
+            "waiting": self.waiting,
+            "avg_wait_ms": round(avg_wait * 1000, 3),
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+sqlite_writer = SqliteWriter()
+
+
+def _is_sqlite_file(database_url: str) -> bool:
+    url = make_url(database_url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Har bir yangi SQLite ulanishi uchun PRAGMA'lar"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={config.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={config.sqlite_busy_timeout}")
+    cursor.execute(f"PRAGMA mmap_size={config.sqlite_mmap_size}")
+    cursor.execute(f"PRAGMA cache_size=-{config.sqlite_cache_size_kb}")  # manfiy - KiB
+    cursor.execute("PRAGMA foreign_keys=ON")  # ON DELETE CASCADE ishlashi uchun
+    cursor.close()
+
+
+def _engine_options(database_url: str, poolclass=InstrumentedQueuePool) -> dict:
+    """Dialektga mos pool sozlamalari"""
+    url = make_url(database_url)
+    
+    if url.get_backend_name() == "sqlite":
+        # In-memory baza bitta ulanishda yashaydi
+        if not _is_sqlite_file(database_url):
+            return {"poolclass": StaticPool}
+        # Fayl: ulanishlar (va ularning PRAGMA/mmap holati) qayta ishlatiladi
+        return {
+            "poolclass": poolclass,
+            "pool_size": config.db_pool_size,
+            "max_overflow": config.db_max_overflow,
+            "pool_timeout": config.db_pool_timeout,
+        }
+    
+    options = {
+        "poolclass": poolclass,
+        "pool_size": config.db_pool_size,
+        "max_overflow": config.db_max_overflow,
+        "pool_timeout": config.db_pool_timeout,
+        "pool_recycle": config.db_pool_recycle,
+        "pool_pre_ping": config.db_pool_pre_ping,
+    }
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"statement_cache_size": config.db_statement_cache_size}
+    return options
+
+
+class PrimarySession(Session):
+    """Asosiy (yozish) bazaga session - commit'dan keyin so'rov primary'ga yopishadi"""
+
+
+# So'rov (yoki bot update) davomida yozuv bo'lganmi: read-your-writes uchun
+_primary_pinned: ContextVar[bool] = ContextVar("primary_pinned", default=False)
+
+engine = create_async_engine(config.database_url, echo=False, **_engine_options(config.database_url))
+async_session = async_sessionmaker(
+    engine, class_=AsyncSession, sync_session_class=PrimarySession, expire_on_commit=False
+)
+
+# Replika berilmasa o'qishlar ham asosiy bazaga boradi
+if config.database_replica_url:
+    read_engine = create_async_engine(
+        config.database_replica_url, echo=False,
+        **_engine_options(config.database_replica_url, ReplicaQueuePool)
+    )
+else:
+    read_engine = engine
+read_session = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _on_primary_commit(session):
+    _primary_pinned.set(True)
+
+
+def _acquire_writer(session):
+    """Birinchi yozuvdan oldin navbatni olish (tranzaksiya oxirigacha ushlanadi)"""
+    if not session.info.get("sqlite_writer"):
+        await_only(sqlite_writer.acquire())
+        session.info["sqlite_writer"] = True
+
+
+def _before_flush(session, flush_context, instances):
+    _acquire_writer(session)
+
+
+def _on_orm_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _acquire_writer(orm_execute_state.session)
+
+
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None and session.info.pop("sqlite_writer", False):
+        sqlite_writer.release()
+
+
+def use_sqlite_writer_queue() -> bool:
+    """Asosiy baza SQLite fayl va yozuvlar navbati yoqilgan"""
+    return _is_sqlite_file(config.database_url) and config.sqlite_writer_queue
+
+
+for _engine in {engine, read_engine}:
+    if _is_sqlite_file(str(_engine.url)):
+        event.listen(_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+if use_sqlite_writer_queue():
+    event.listen(PrimarySession, "before_flush", _before_flush)
+    event.listen(PrimarySession, "do_orm_execute", _on_orm_execute)
+    event.listen(PrimarySession, "after_transaction_end", _after_transaction_end)
+
+
+def has_replica() -> bool:
+    """DATABASE_REPLICA_URL sozlanganmi"""
+    return read_engine is not engine
+
+
+def is_primary_pinned() -> bool:
+    """Joriy so'rovda yozuv bo'lgan - o'qishlar ham primary'dan"""
+    return _primary_pinned.get()
+
+
+def _track_checkouts(target, stats: PoolStats):
+    @event.listens_for(target.sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.checkouts += 1
+        stats.checked_out += 1
+    
+    @event.listens_for(target.sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        stats.checked_out = max(0, stats.checked_out - 1)
+
+
+_track_checkouts(engine, pool_stats)
+if read_engine is not engine:
+    _track_checkouts(read_engine, replica_pool_stats)
+
+
+def _pool_info(pool) -> dict:
+    info = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        info.update({
+            "pool_size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": config.db_max_overflow,
+        })
+    return info
+
+
+def get_pool_stats() -> dict:
+    """Pool holati: band ulanishlar, overflow va kutish vaqti"""
+    stats = {**_pool_info(engine.pool), **pool_stats.as_dict()}
+    if read_engine is not engine:
+        stats["replica"] = {**_pool_info(read_engine.pool), **replica_pool_stats.as_dict()}
+    if use_sqlite_writer_queue():
+        stats["sqlite_writer"] = sqlite_writer.as_dict()
+    return stats
 
 
 async def init_db():
-    """Database yaratish"""
-    from database.models import User, Course, Lesson, Payment, UserCourse
+    """Sxema versiyasini tekshirish va kerak bo'lsa migratsiyalarni bajarish"""
+    from database.migrations import migrate
     
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await migrate()
 
 
-async def get_session() -> AsyncSession:
-    """Session olish"""
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession]:
+    """Bitta so'rov yoki update uchun session
+    
+    Ulanish pool'dan birinchi so'rovda olinadi: bazaga murojaat qilmagan
+    (masalan, 304 qaytargan) yoki faqat replikadan o'qigan so'rov asosiy
+    bazaning ulanishini band qilmaydi.
+    """
+    _primary_pinned.set(False)
     async with async_session() as session:
         yield session
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency: so'rov davomida bitta session"""
+    async with session_scope() as session:
+        yield session
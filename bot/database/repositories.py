@@ -1,13 +1,99 @@
-from datetime import datetime, date
-from typing import List, Optional
-from sqlalchemy import select, func
+from contextlib import asynccontextmanager
+from datetime import datetime, date, time, timedelta
+from typing import AsyncIterator, List, Optional, Tuple
+from sqlalchemy import select, func, or_, update, tuple_, DateTime, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from database.base import async_session
-from database.models import User, Course, Lesson, Payment, UserCourse, LessonProgress
+from database.base import async_session, read_session, has_replica, is_primary_pinned
+from database.models import User, Course, Lesson, Payment, UserCourse, LessonProgress, DailyStats
 
 
-class UserRepository:
+def _day_start(day: date) -> datetime:
+    """Kun boshlanishi (00:00) - sana bo'yicha filtrlar uchun"""
+    return datetime.combine(day, time.min)
+
+
+# daily_stats'dagi valyuta ustunlari
+REVENUE_COLUMNS = {"UZS": "revenue_uzs", "XTR": "revenue_xtr", "TON": "revenue_ton"}
+
+
+def _insert_for(session: AsyncSession):
+    """Dialektga mos INSERT (ON CONFLICT bilan)"""
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+async def _bump_daily_stats(session: AsyncSession, day: date, **deltas):
+    """daily_stats qatoriga atomik qo'shish (joriy tranzaksiyada)"""
+    stmt = _insert_for(session)(DailyStats).values(day=day, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyStats.day],
+        set_={name: getattr(DailyStats, name) + stmt.excluded[name] for name in deltas}
+    )
+    await session.execute(stmt)
+
+
+async def _record_payment_stats(session: AsyncSession, payment: Payment, sign: int = 1):
+    """Tugallangan to'lovni kunlik statistikaga qo'shish (sign=-1 - ayirish)"""
+    deltas = {"payments_count": sign}
+    column = REVENUE_COLUMNS.get(payment.currency)
+    if column:
+        deltas[column] = sign * payment.amount
+    await _bump_daily_stats(session, payment.created_at.date(), **deltas)
+
+
+def _users_page_query(limit: int, after: Optional[Tuple[datetime, int]] = None):
+    """Foydalanuvchilar sahifasi: (created_at, id) bo'yicha keyset, yangilari birinchi"""
+    stmt = select(User).order_by(User.created_at.desc(), User.id.desc()).limit(limit)
+    if after:
+        stmt = stmt.where(tuple_(User.created_at, User.id) < tuple_(*after, types=[DateTime, Integer]))
+    return stmt
+
+
+async def _bump_course_counters(session: AsyncSession, course_id: int, **deltas):
+    """Kurs hisoblagichlarini joriy tranzaksiyada o'zgartirish"""
+    values = {name: getattr(Course, name) + delta for name, delta in deltas.items()}
+    if "total_duration_seconds" in values:
+        values["duration"] = values["total_duration_seconds"] // 3600  # Soatlarga aylantirish
+    if set(deltas) == {"sales_count"}:
+        # Sotuv katalog mazmunini o'zgartirmaydi - updated_at (va ETag) o'zgarmasin
+        values["updated_at"] = Course.updated_at
+    await session.execute(update(Course).where(Course.id == course_id).values(values))
+
+
+class BaseRepository:
+    """Repository asosi: tashqaridan berilgan session (unit of work) yoki yangisi"""
+    
+    def __init__(self, session: Optional[AsyncSession] = None):
+        self.session = session
+    
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[AsyncSession]:
+        """So'rov sessionini qayta ishlatish, bo'lmasa qisqa muddatli session ochish"""
+        if self.session is not None:
+            yield self.session
+            return
+        
+        async with async_session() as session:
+            yield session
+    
+    @asynccontextmanager
+    async def _read_session(self) -> AsyncIterator[AsyncSession]:
+        """Faqat o'qish uchun: replika (yozuvdan keyin yoki replika bo'lmasa - asosiy baza)"""
+        if not has_replica() or is_primary_pinned():
+            async with self._session() as session:
+                yield session
+            return
+        
+        async with read_session() as session:
+            yield session
+
+
+class UserRepository(BaseRepository):
     """Foydalanuvchi uchun repository"""
     
     async def create_or_update_user(
@@ -16,32 +102,52 @@ class UserRepository:
         username: Optional[str] = None,
         full_name: str = ""
     ) -> User:
-        """Foydalanuvchi yaratish yoki yangilash"""
-        async with async_session() as session:
-            result = await session.execute(
-                select(User).where(User.telegram_id == telegram_id)
+        """Foydalanuvchi yaratish yoki yangilash (bitta upsert, o'zgarmagan bo'lsa yozmaydi)"""
+        now = datetime.utcnow()
+        
+        async with self._session() as session:
+            stmt = _insert_for(session)(User).values(
+                telegram_id=telegram_id,
+                username=username,
+                full_name=full_name,
+                created_at=now,
+                updated_at=now
             )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[User.telegram_id],
+                set_={
+                    "username": stmt.excluded.username,
+                    "full_name": stmt.excluded.full_name,
+                    "updated_at": now
+                },
+                where=or_(
+                    User.username.is_distinct_from(stmt.excluded.username),
+                    User.full_name.is_distinct_from(stmt.excluded.full_name)
+                )
+            ).returning(User)
+            
+            result = await session.execute(stmt, execution_options={"populate_existing": True})
             user = result.scalar_one_or_none()
             
-            if user:
-                user.username = username
-                user.full_name = full_name
-                user.updated_at = datetime.utcnow()
-            else:
-                user = User(
-                    telegram_id=telegram_id,
-                    username=username,
-                    full_name=full_name
+            if user is None:
+                # Hech narsa o'zgarmadi: upsert ochgan yozuv tranzaksiyasini yopib, mavjud qatorni o'qish
+                await session.commit()
+                result = await session.execute(
+                    select(User).where(User.telegram_id == telegram_id)
                 )
-                session.add(user)
+                return result.scalar_one()
+            
+            if user.created_at == now:
+                # Yangi foydalanuvchi: hali sotib olgan kurslari yo'q
+                set_committed_value(user, "purchased_courses", [])
+                await _bump_daily_stats(session, now.date(), new_users=1)
             
             await session.commit()
-            await session.refresh(user)
             return user
     
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         """Telegram ID bo'yicha foydalanuvchi olish"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(User)
                 .options(selectinload(User.purchased_courses).selectinload(UserCourse.course))
@@ -51,23 +157,24 @@ class UserRepository:
     
     async def get_users_count(self) -> int:
         """Foydalanuvchilar soni"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(select(func.count(User.id)))
             return result.scalar() or 0
     
     async def get_today_users_count(self) -> int:
         """Bugungi foydalanuvchilar soni"""
-        async with async_session() as session:
-            today = date.today()
+        async with self._read_session() as session:
+            # created_at UTC da, daily_stats kabi UTC kuni bo'yicha
+            today = _day_start(datetime.utcnow().date())
             result = await session.execute(
                 select(func.count(User.id))
-                .where(func.date(User.created_at) == today)
+                .where(User.created_at >= today, User.created_at < today + timedelta(days=1))
             )
             return result.scalar() or 0
     
     async def get_all_users(self, limit: int = 100, offset: int = 0) -> List[User]:
         """Barcha foydalanuvchilar"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(
                 select(User)
                 .order_by(User.created_at.desc())
@@ -76,9 +183,25 @@ class UserRepository:
             )
             return list(result.scalars().all())
     
+    async def iter_all_users(self, batch_size: int = 1000) -> AsyncIterator[List[User]]:
+        """Barcha foydalanuvchilar - batch_size'lik bo'laklarda (ichki vazifalar uchun)"""
+        after = None
+        while True:
+            async with self._read_session() as session:
+                result = await session.execute(_users_page_query(batch_size, after))
+                users = list(result.scalars().all())
+            
+            if not users:
+                return
+            yield users
+            
+            if len(users) < batch_size:
+                return
+            after = (users[-1].created_at, users[-1].id)
+    
     async def add_purchased_course(self, telegram_id: int, course_id: int) -> UserCourse:
         """Kursni sotib olish"""
-        async with async_session() as session:
+        async with self._session() as session:
             # Foydalanuvchini topish
             result = await session.execute(
                 select(User).where(User.telegram_id == telegram_id)
@@ -98,14 +221,30 @@ class UserRepository:
             if existing:
                 return existing
             
-            user_course = UserCourse(user_id=user.id, course_id=course_id)
-            session.add(user_course)
+            # Parallel so'rov allaqachon qo'shgan bo'lsa - unique indeks bo'yicha hech narsa qilinmaydi.
+            # Savepoint emas: aiosqlite'da u tashqi tranzaksiya bo'lib, qator hisoblagichdan alohida commit bo'lardi
+            stmt = _insert_for(session)(UserCourse).values(user_id=user.id, course_id=course_id)
+            stmt = stmt.on_conflict_do_nothing(
+                index_elements=[UserCourse.user_id, UserCourse.course_id]
+            ).returning(UserCourse)
+            result = await session.execute(stmt)
+            user_course = result.scalar_one_or_none()
+            
+            if user_course is None:
+                # Yozuv tranzaksiyasini yopib, parallel so'rov qo'shgan qatorni o'qish
+                await session.commit()
+                result = await session.execute(
+                    select(UserCourse)
+                    .where(UserCourse.user_id == user.id, UserCourse.course_id == course_id)
+                )
+                return result.scalar_one()
+            
+            await _bump_course_counters(session, course_id, sales_count=1)
             await session.commit()
-            await session.refresh(user_course)
             return user_course
 
 
-class CourseRepository:
+class CourseRepository(BaseRepository):
     """Kurs uchun repository"""
     
     async def create_course(
@@ -119,7 +258,7 @@ class CourseRepository:
         author_id: Optional[int] = None
     ) -> Course:
         """Yangi kurs yaratish"""
-        async with async_session() as session:
+        async with self._session() as session:
             course = Course(
                 title=title,
                 description=description,
@@ -136,30 +275,29 @@ class CourseRepository:
     
     async def get_course_by_id(self, course_id: int) -> Optional[Course]:
         """ID bo'yicha kurs olish"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(
                 select(Course)
                 .options(selectinload(Course.lessons))
-                .where(Course.id == course_id)
+                .where(Course.id == course_id, Course.deleted_at.is_(None))
             )
             return result.scalar_one_or_none()
     
     async def get_all_courses(self) -> List[Course]:
-        """Barcha kurslar"""
-        async with async_session() as session:
+        """Barcha kurslar (o'chirilganlaridan tashqari)"""
+        async with self._read_session() as session:
             result = await session.execute(
                 select(Course)
-                .options(selectinload(Course.lessons))
+                .where(Course.deleted_at.is_(None))
                 .order_by(Course.order, Course.created_at.desc())
             )
             return list(result.scalars().all())
     
     async def get_all_active_courses(self) -> List[Course]:
         """Barcha faol kurslar"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(
                 select(Course)
-                .options(selectinload(Course.lessons))
                 .where(Course.is_active == True)
                 .order_by(Course.order, Course.created_at.desc())
             )
@@ -167,10 +305,9 @@ class CourseRepository:
     
     async def get_courses_by_category(self, category: str) -> List[Course]:
         """Kategoriya bo'yicha kurslar"""
-        async with async_session() as session:
+        async with self._read_session() as session:
             result = await session.execute(
                 select(Course)
-                .options(selectinload(Course.lessons))
                 .where(Course.category == category, Course.is_active == True)
                 .order_by(Course.order)
             )
@@ -178,13 +315,15 @@ class CourseRepository:
     
     async def get_courses_count(self) -> int:
         """Kurslar soni"""
-        async with async_session() as session:
-            result = await session.execute(select(func.count(Course.id)))
+        async with self._read_session() as session:
+            result = await session.execute(
+                select(func.count(Course.id)).where(Course.deleted_at.is_(None))
+            )
             return result.scalar() or 0
     
     async def update_course(self, course_id: int, **kwargs) -> Optional[Course]:
         """Kursni yangilash"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Course).where(Course.id == course_id)
             )
@@ -201,22 +340,19 @@ class CourseRepository:
             return course
     
     async def delete_course(self, course_id: int) -> bool:
-        """Kursni o'chirish"""
-        async with async_session() as session:
+        """Kursni o'chirish (soft-delete): ma'lumotlarini API fonda tozalaydi"""
+        async with self._session() as session:
             result = await session.execute(
-                select(Course).where(Course.id == course_id)
+                update(Course)
+                .where(Course.id == course_id, Course.deleted_at.is_(None))
+                .values(deleted_at=datetime.utcnow(), is_active=False)
+                .execution_options(synchronize_session=False)
             )
-            course = result.scalar_one_or_none()
-            
-            if course:
-                await session.delete(course)
-                await session.commit()
-                return True
-            
-            return False
+            await session.commit()
+            return result.rowcount > 0
 
 
-class LessonRepository:
+class LessonRepository(BaseRepository):
     """Dars uchun repository"""
     
     async def create_lesson(
@@ -229,7 +365,7 @@ class LessonRepository:
         duration: int = 0
     ) -> Lesson:
         """Yangi dars yaratish"""
-        async with async_session() as session:
+        async with self._session() as session:
             # Tartib raqamini aniqlash
             result = await session.execute(
                 select(func.max(Lesson.order)).where(Lesson.course_id == course_id)
@@ -246,49 +382,37 @@ class LessonRepository:
                 order=max_order + 1
             )
             session.add(lesson)
+            await _bump_course_counters(
+                session, course_id, lessons_count=1, total_duration_seconds=duration
+            )
             await session.commit()
             await session.refresh(lesson)
             
-            # Kurs davomiyligini yangilash
-            await self._update_course_duration(session, course_id)
-            
             return lesson
     
-    async def _update_course_duration(self, session, course_id: int):
-        """Kurs davomiyligini yangilash"""
-        result = await session.execute(
-            select(func.sum(Lesson.duration)).where(Lesson.course_id == course_id)
-        )
-        total_seconds = result.scalar() or 0
-        
-        result = await session.execute(
-            select(Course).where(Course.id == course_id)
-        )
-        course = result.scalar_one_or_none()
-        if course:
-            course.duration = total_seconds // 3600  # Soatlarga aylantirish
-            await session.commit()
-    
     async def get_lesson_by_id(self, lesson_id: int) -> Optional[Lesson]:
-        """ID bo'yicha dars olish"""
-        async with async_session() as session:
+        """ID bo'yicha dars olish (o'chirilgan kursniki - None)"""
+        async with self._read_session() as session:
             result = await session.execute(
-                select(Lesson).where(Lesson.id == lesson_id)
+                select(Lesson)
+                .join(Course, Course.id == Lesson.course_id)
+                .where(Lesson.id == lesson_id, Course.deleted_at.is_(None))
             )
             return result.scalar_one_or_none()
     
     async def get_lessons_by_course(self, course_id: int) -> List[Lesson]:
-        """Kurs darslari"""
-        async with async_session() as session:
+        """Kurs darslari (kurs o'chirilgan bo'lsa - bo'sh; qatorlar fonda tozalanguncha)"""
+        async with self._read_session() as session:
             result = await session.execute(
                 select(Lesson)
-                .where(Lesson.course_id == course_id)
+                .join(Course, Course.id == Lesson.course_id)
+                .where(Lesson.course_id == course_id, Course.deleted_at.is_(None))
                 .order_by(Lesson.order)
             )
             return list(result.scalars().all())
 
 
-class PaymentRepository:
+class PaymentRepository(BaseRepository):
     """To'lov uchun repository"""
     
     async def create_payment(
@@ -302,7 +426,7 @@ class PaymentRepository:
         transaction_id: Optional[str] = None
     ) -> Payment:
         """Yangi to'lov yaratish"""
-        async with async_session() as session:
+        async with self._session() as session:
             # Foydalanuvchini topish
             result = await session.execute(
                 select(User).where(User.telegram_id == user_telegram_id)
@@ -322,13 +446,18 @@ class PaymentRepository:
                 transaction_id=transaction_id
             )
             session.add(payment)
+            await session.flush()
+            
+            if status == "completed":
+                await _record_payment_stats(session, payment)
+            
             await session.commit()
             await session.refresh(payment)
             return payment
     
     async def get_payment_by_id(self, payment_id: int) -> Optional[Payment]:
         """ID bo'yicha to'lov olish"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Payment).where(Payment.id == payment_id)
             )
@@ -336,7 +465,7 @@ class PaymentRepository:
     
     async def get_user_payments(self, user_telegram_id: int) -> List[Payment]:
         """Foydalanuvchi to'lovlari"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(User).where(User.telegram_id == user_telegram_id)
             )
@@ -359,17 +488,22 @@ class PaymentRepository:
         transaction_id: Optional[str] = None
     ) -> Optional[Payment]:
         """To'lov statusini yangilash"""
-        async with async_session() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Payment).where(Payment.id == payment_id)
             )
             payment = result.scalar_one_or_none()
             
             if payment:
+                was_completed = payment.status == "completed"
                 payment.status = status
                 if transaction_id:
                     payment.transaction_id = transaction_id
                 payment.updated_at = datetime.utcnow()
+                
+                if was_completed != (status == "completed"):
+                    await _record_payment_stats(session, payment, 1 if status == "completed" else -1)
+                
                 await session.commit()
                 await session.refresh(payment)
             
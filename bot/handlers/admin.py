@@ -4,6 +4,7 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import config
 from database.repositories import CourseRepository, UserRepository, LessonRepository
@@ -37,15 +38,15 @@ def is_admin(user_id: int) -> bool:
 
 
 @router.message(Command("admin"))
-async def cmd_admin(message: Message):
+async def cmd_admin(message: Message, session: AsyncSession):
     """Admin panel"""
     
     if not is_admin(message.from_user.id):
         await message.answer("❌ Sizda admin huquqlari yo'q!")
         return
     
-    user_repo = UserRepository()
-    course_repo = CourseRepository()
+    user_repo = UserRepository(session)
+    course_repo = CourseRepository(session)
     
     users_count = await user_repo.get_users_count()
     courses_count = await course_repo.get_courses_count()
@@ -155,13 +156,13 @@ async def process_course_thumbnail(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("cat_"), AddCourseStates.category)
-async def process_course_category(callback: CallbackQuery, state: FSMContext):
+async def process_course_category(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Kategoriya tanlash va kursni saqlash"""
     
     category = callback.data.replace("cat_", "")
     data = await state.get_data()
     
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.create_course(
         title=data["title"],
         description=data["description"],
@@ -186,14 +187,14 @@ async def process_course_category(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "admin_add_lesson")
-async def admin_add_lesson(callback: CallbackQuery, state: FSMContext):
+async def admin_add_lesson(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Dars qo'shish"""
     
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Ruxsat yo'q!", show_alert=True)
         return
     
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     courses = await course_repo.get_all_courses()
     
     if not courses:
@@ -242,13 +243,13 @@ async def process_lesson_description(message: Message, state: FSMContext):
 
 
 @router.message(AddLessonStates.video_file_id, F.video)
-async def process_lesson_video(message: Message, state: FSMContext):
+async def process_lesson_video(message: Message, state: FSMContext, session: AsyncSession):
     """Video fayl"""
     
     video_file_id = message.video.file_id
     data = await state.get_data()
     
-    lesson_repo = LessonRepository()
+    lesson_repo = LessonRepository(session)
     lesson = await lesson_repo.create_lesson(
         course_id=data["course_id"],
         title=data["title"],
@@ -267,15 +268,15 @@ async def process_lesson_video(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "admin_stats")
-async def admin_stats(callback: CallbackQuery):
+async def admin_stats(callback: CallbackQuery, session: AsyncSession):
     """Statistika"""
     
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Ruxsat yo'q!", show_alert=True)
         return
     
-    user_repo = UserRepository()
-    course_repo = CourseRepository()
+    user_repo = UserRepository(session)
+    course_repo = CourseRepository(session)
     
     users_count = await user_repo.get_users_count()
     courses_count = await course_repo.get_courses_count()
@@ -300,14 +301,14 @@ async def admin_stats(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "admin_courses")
-async def admin_courses(callback: CallbackQuery):
+async def admin_courses(callback: CallbackQuery, session: AsyncSession):
     """Kurslar ro'yxati"""
     
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Ruxsat yo'q!", show_alert=True)
         return
     
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     courses = await course_repo.get_all_courses()
     
     if not courses:
@@ -333,7 +334,7 @@ async def admin_courses(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_course_"))
-async def admin_course_detail(callback: CallbackQuery):
+async def admin_course_detail(callback: CallbackQuery, session: AsyncSession):
     """Kurs tafsilotlari"""
     
     if not is_admin(callback.from_user.id):
@@ -341,8 +342,8 @@ async def admin_course_detail(callback: CallbackQuery):
         return
     
     course_id = int(callback.data.replace("admin_course_", ""))
-    course_repo = CourseRepository()
-    lesson_repo = LessonRepository()
+    course_repo = CourseRepository(session)
+    lesson_repo = LessonRepository(session)
     
     course = await course_repo.get_course_by_id(course_id)
     if not course:
@@ -383,7 +384,7 @@ async def admin_course_detail(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("course_activate_"))
-async def course_activate(callback: CallbackQuery):
+async def course_activate(callback: CallbackQuery, session: AsyncSession):
     """Kursni faollashtirish"""
     
     if not is_admin(callback.from_user.id):
@@ -391,18 +392,18 @@ async def course_activate(callback: CallbackQuery):
         return
     
     course_id = int(callback.data.replace("course_activate_", ""))
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     
     await course_repo.update_course(course_id, is_active=True)
     await callback.answer("✅ Kurs faollashtirildi!")
     
     # Refresh page
     callback.data = f"admin_course_{course_id}"
-    await admin_course_detail(callback)
+    await admin_course_detail(callback, session)
 
 
 @router.callback_query(F.data.startswith("course_deactivate_"))
-async def course_deactivate(callback: CallbackQuery):
+async def course_deactivate(callback: CallbackQuery, session: AsyncSession):
     """Kursni nofaol qilish"""
     
     if not is_admin(callback.from_user.id):
@@ -410,14 +411,14 @@ async def course_deactivate(callback: CallbackQuery):
         return
     
     course_id = int(callback.data.replace("course_deactivate_", ""))
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     
     await course_repo.update_course(course_id, is_active=False)
     await callback.answer("❌ Kurs nofaol qilindi!")
     
     # Refresh page
     callback.data = f"admin_course_{course_id}"
-    await admin_course_detail(callback)
+    await admin_course_detail(callback, session)
 
 
 @router.callback_query(F.data.startswith("course_delete_"))
@@ -445,7 +446,7 @@ async def course_delete_confirm(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("course_delete_confirm_"))
-async def course_delete(callback: CallbackQuery):
+async def course_delete(callback: CallbackQuery, session: AsyncSession):
     """Kursni o'chirish"""
     
     if not is_admin(callback.from_user.id):
@@ -453,18 +454,18 @@ async def course_delete(callback: CallbackQuery):
         return
     
     course_id = int(callback.data.replace("course_delete_confirm_", ""))
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     
     await course_repo.delete_course(course_id)
     await callback.answer("🗑 Kurs o'chirildi!")
     
     # Go back to courses list
     callback.data = "admin_courses"
-    await admin_courses(callback)
+    await admin_courses(callback, session)
 
 
 @router.callback_query(F.data.startswith("course_lessons_"))
-async def course_lessons(callback: CallbackQuery):
+async def course_lessons(callback: CallbackQuery, session: AsyncSession):
     """Kurs darslari"""
     
     if not is_admin(callback.from_user.id):
@@ -472,8 +473,8 @@ async def course_lessons(callback: CallbackQuery):
         return
     
     course_id = int(callback.data.replace("course_lessons_", ""))
-    lesson_repo = LessonRepository()
-    course_repo = CourseRepository()
+    lesson_repo = LessonRepository(session)
+    course_repo = CourseRepository(session)
     
     course = await course_repo.get_course_by_id(course_id)
     lessons = await lesson_repo.get_lessons_by_course(course_id)
@@ -508,14 +509,14 @@ async def course_lessons(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "admin_users")
-async def admin_users(callback: CallbackQuery):
+async def admin_users(callback: CallbackQuery, session: AsyncSession):
     """Foydalanuvchilar ro'yxati"""
     
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Ruxsat yo'q!", show_alert=True)
         return
     
-    user_repo = UserRepository()
+    user_repo = UserRepository(session)
     users = await user_repo.get_all_users(limit=20)
     
     if not users:
@@ -563,7 +564,7 @@ async def admin_broadcast(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(BroadcastStates.message)
-async def process_broadcast_message(message: Message, state: FSMContext):
+async def process_broadcast_message(message: Message, state: FSMContext, session: AsyncSession):
     """Xabarni saqlash"""
     
     if not is_admin(message.from_user.id):
@@ -578,7 +579,7 @@ async def process_broadcast_message(message: Message, state: FSMContext):
     
     await state.update_data(message_data=message_data)
     
-    user_repo = UserRepository()
+    user_repo = UserRepository(session)
     users_count = await user_repo.get_users_count()
     
     builder = InlineKeyboardBuilder()
@@ -606,15 +607,17 @@ async def broadcast_confirm(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     message_data = data.get("message_data", {})
     
+    # Update sessioni emas: har bir bo'lak o'z qisqa sessionida o'qiladi, xabarlar
+    # ochiq tranzaksiyasiz yuboriladi (yuborish tezligi cheklangan - daqiqalab davom etadi)
     user_repo = UserRepository()
-    users = await user_repo.get_all_users(limit=10000)
     
     await callback.message.edit_text("📤 Xabar yuborilmoqda...")
     
     success = 0
     failed = 0
     
-    for user in users:
+    users = (user async for batch in user_repo.iter_all_users() for user in batch)
+    async for user in users:
         try:
             if message_data.get("photo"):
                 await callback.bot.send_photo(
@@ -652,7 +655,7 @@ async def broadcast_confirm(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "admin_back")
-async def admin_back(callback: CallbackQuery, state: FSMContext):
+async def admin_back(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Admin panelga qaytish"""
     
     await state.clear()
@@ -661,8 +664,8 @@ async def admin_back(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Ruxsat yo'q!", show_alert=True)
         return
     
-    user_repo = UserRepository()
-    course_repo = CourseRepository()
+    user_repo = UserRepository(session)
+    course_repo = CourseRepository(session)
     
     users_count = await user_repo.get_users_count()
     courses_count = await course_repo.get_courses_count()
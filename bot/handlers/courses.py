@@ -2,6 +2,7 @@ from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.repositories import CourseRepository
 from keyboards.main_kb import get_mini_app_keyboard
@@ -10,10 +11,10 @@ router = Router()
 
 
 @router.message(Command("courses"))
-async def cmd_courses(message: Message):
+async def cmd_courses(message: Message, session: AsyncSession):
     """Kurslar ro'yxati"""
     
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     courses = await course_repo.get_all_active_courses()
     
     if not courses:
@@ -37,12 +38,12 @@ async def cmd_courses(message: Message):
 
 
 @router.callback_query(F.data.startswith("course_"))
-async def course_detail_callback(callback: CallbackQuery):
+async def course_detail_callback(callback: CallbackQuery, session: AsyncSession):
     """Kurs tafsilotlari"""
     
     course_id = int(callback.data.split("_")[1])
     
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(course_id)
     
     if not course:
@@ -54,7 +55,7 @@ async def course_detail_callback(callback: CallbackQuery):
 
 📝 {course.description}
 
-📚 Darslar soni: {len(course.lessons)}
+📚 Darslar soni: {course.lessons_count}
 ⏱ Davomiyligi: {course.duration} soat
 💰 Narxi: {course.price:,} so'm
 
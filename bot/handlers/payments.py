@@ -1,6 +1,7 @@
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, LabeledPrice, PreCheckoutQuery, WebAppInfo
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import config
 from database.repositories import CourseRepository, PaymentRepository, UserRepository
@@ -11,12 +12,12 @@ router = Router()
 # ============ TELEGRAM STARS TO'LOVI ============
 
 @router.callback_query(F.data.startswith("buy_stars_"))
-async def buy_with_stars(callback: CallbackQuery, bot: Bot):
+async def buy_with_stars(callback: CallbackQuery, bot: Bot, session: AsyncSession):
     """Telegram Stars bilan sotib olish"""
     
     course_id = int(callback.data.replace("buy_stars_", ""))
     
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(course_id)
     
     if not course:
@@ -45,7 +46,7 @@ async def pre_checkout_handler(pre_checkout_query: PreCheckoutQuery):
 
 
 @router.message(F.successful_payment)
-async def successful_payment_handler(message: Message):
+async def successful_payment_handler(message: Message, session: AsyncSession):
     """Muvaffaqiyatli to'lov"""
     
     payment_info = message.successful_payment
@@ -55,7 +56,7 @@ async def successful_payment_handler(message: Message):
         course_id = int(payload.replace("course_", ""))
         
         # To'lovni saqlash
-        payment_repo = PaymentRepository()
+        payment_repo = PaymentRepository(session)
         await payment_repo.create_payment(
             user_telegram_id=message.from_user.id,
             course_id=course_id,
@@ -67,13 +68,13 @@ async def successful_payment_handler(message: Message):
         )
         
         # Kursni foydalanuvchiga biriktirish
-        user_repo = UserRepository()
+        user_repo = UserRepository(session)
         await user_repo.add_purchased_course(
             telegram_id=message.from_user.id,
             course_id=course_id
         )
         
-        course_repo = CourseRepository()
+        course_repo = CourseRepository(session)
         course = await course_repo.get_course_by_id(course_id)
         
         # Mini App tugmasi bilan javob
@@ -99,7 +100,7 @@ async def successful_payment_handler(message: Message):
 # ============ CLICK/PAYME TO'LOVI ============
 
 @router.callback_query(F.data.startswith("buy_"))
-async def buy_course(callback: CallbackQuery):
+async def buy_course(callback: CallbackQuery, session: AsyncSession):
     """Kursni sotib olish - to'lov usulini tanlash"""
     
     # Stars bilan to'lovni o'tkazib yuborish
@@ -108,7 +109,7 @@ async def buy_course(callback: CallbackQuery):
     
     course_id = int(callback.data.replace("buy_", ""))
     
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(course_id)
     
     if not course:
@@ -137,18 +138,18 @@ Quyidagi usullardan birini tanlang:
 
 
 @router.callback_query(F.data.startswith("pay_click_"))
-async def pay_with_click(callback: CallbackQuery):
+async def pay_with_click(callback: CallbackQuery, session: AsyncSession):
     """Click orqali to'lov"""
     
     course_id = int(callback.data.replace("pay_click_", ""))
     
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(course_id)
     
     # Click to'lov havolasini yaratish
     # Bu yerda Click API integratsiyasi bo'ladi
     
-    payment_repo = PaymentRepository()
+    payment_repo = PaymentRepository(session)
     payment = await payment_repo.create_payment(
         user_telegram_id=callback.from_user.id,
         course_id=course_id,
@@ -178,15 +179,15 @@ async def pay_with_click(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("pay_payme_"))
-async def pay_with_payme(callback: CallbackQuery):
+async def pay_with_payme(callback: CallbackQuery, session: AsyncSession):
     """Payme orqali to'lov"""
     
     course_id = int(callback.data.replace("pay_payme_", ""))
     
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(course_id)
     
-    payment_repo = PaymentRepository()
+    payment_repo = PaymentRepository(session)
     payment = await payment_repo.create_payment(
         user_telegram_id=callback.from_user.id,
         course_id=course_id,
@@ -218,18 +219,18 @@ async def pay_with_payme(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("pay_ton_"))
-async def pay_with_ton(callback: CallbackQuery):
+async def pay_with_ton(callback: CallbackQuery, session: AsyncSession):
     """TON Crypto orqali to'lov"""
     
     course_id = int(callback.data.replace("pay_ton_", ""))
     
-    course_repo = CourseRepository()
+    course_repo = CourseRepository(session)
     course = await course_repo.get_course_by_id(course_id)
     
     # TON narxini hisoblash (taxminiy)
     ton_price = course.price / 50000  # 1 TON ≈ 50,000 so'm
     
-    payment_repo = PaymentRepository()
+    payment_repo = PaymentRepository(session)
     payment = await payment_repo.create_payment(
         user_telegram_id=callback.from_user.id,
         course_id=course_id,
@@ -260,12 +261,12 @@ async def pay_with_ton(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("check_payment_"))
-async def check_payment(callback: CallbackQuery):
+async def check_payment(callback: CallbackQuery, session: AsyncSession):
     """To'lovni tekshirish"""
     
     payment_id = int(callback.data.replace("check_payment_", ""))
     
-    payment_repo = PaymentRepository()
+    payment_repo = PaymentRepository(session)
     payment = await payment_repo.get_payment_by_id(payment_id)
     
     if not payment:
@@ -2,6 +2,7 @@ from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.repositories import UserRepository, PaymentRepository
 
@@ -9,10 +10,10 @@ router = Router()
 
 
 @router.message(Command("profile"))
-async def cmd_profile(message: Message):
+async def cmd_profile(message: Message, session: AsyncSession):
     """Profil ko'rish"""
     
-    user_repo = UserRepository()
+    user_repo = UserRepository(session)
     user = await user_repo.get_user_by_telegram_id(message.from_user.id)
     
     if not user:
@@ -45,10 +46,10 @@ async def cmd_profile(message: Message):
 
 
 @router.message(Command("my_courses"))
-async def cmd_my_courses(message: Message):
+async def cmd_my_courses(message: Message, session: AsyncSession):
     """Mening kurslarim"""
     
-    user_repo = UserRepository()
+    user_repo = UserRepository(session)
     user = await user_repo.get_user_by_telegram_id(message.from_user.id)
     
     if not user or not user.purchased_courses:
@@ -71,17 +72,17 @@ async def cmd_my_courses(message: Message):
 
 
 @router.callback_query(F.data == "my_courses")
-async def my_courses_callback(callback: CallbackQuery):
+async def my_courses_callback(callback: CallbackQuery, session: AsyncSession):
     """Mening kurslarim callback"""
-    await cmd_my_courses(callback.message)
+    await cmd_my_courses(callback.message, session)
     await callback.answer()
 
 
 @router.callback_query(F.data == "payment_history")
-async def payment_history_callback(callback: CallbackQuery):
+async def payment_history_callback(callback: CallbackQuery, session: AsyncSession):
     """To'lovlar tarixi"""
     
-    payment_repo = PaymentRepository()
+    payment_repo = PaymentRepository(session)
     payments = await payment_repo.get_user_payments(callback.from_user.id)
     
     if not payments:
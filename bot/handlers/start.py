@@ -2,6 +2,7 @@ from aiogram import Router, F, Bot
 from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.types import Message, CallbackQuery, LabeledPrice
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.repositories import UserRepository, CourseRepository
 from keyboards.main_kb import get_main_keyboard
@@ -10,11 +11,11 @@ router = Router()
 
 
 @router.message(CommandStart(deep_link=True))
-async def cmd_start_deep_link(message: Message, command: CommandObject, bot: Bot):
+async def cmd_start_deep_link(message: Message, command: CommandObject, bot: Bot, session: AsyncSession):
     """Start komandasi deep link bilan"""
     
     # Foydalanuvchini bazaga saqlash
-    user_repo = UserRepository()
+    user_repo = UserRepository(session)
     await user_repo.create_or_update_user(
         telegram_id=message.from_user.id,
         username=message.from_user.username,
@@ -27,7 +28,7 @@ async def cmd_start_deep_link(message: Message, command: CommandObject, bot: Bot
     if args and args.startswith("buy_"):
         course_id = int(args.replace("buy_", ""))
         
-        course_repo = CourseRepository()
+        course_repo = CourseRepository(session)
         course = await course_repo.get_course_by_id(course_id)
         
         if not course:
@@ -48,15 +49,15 @@ async def cmd_start_deep_link(message: Message, command: CommandObject, bot: Bot
         return
     
     # Oddiy start
-    await cmd_start_normal(message)
+    await cmd_start_normal(message, session)
 
 
 @router.message(CommandStart())
-async def cmd_start_normal(message: Message):
+async def cmd_start_normal(message: Message, session: AsyncSession):
     """Start komandasi"""
     
     # Foydalanuvchini bazaga saqlash
-    user_repo = UserRepository()
+    user_repo = UserRepository(session)
     await user_repo.create_or_update_user(
         telegram_id=message.from_user.id,
         username=message.from_user.username,
@@ -9,6 +9,7 @@ from aiogram.enums import ParseMode
 from config import config
 from handlers import start, courses, profile, admin, payments
 from database.base import init_db
+from middlewares.db import DbSessionMiddleware
 
 # Logging sozlamalari
 logging.basicConfig(
@@ -34,6 +35,9 @@ async def main():
     # Dispatcher yaratish
     dp = Dispatcher()
     
+    # Har bir update uchun bitta DB session
+    dp.update.middleware(DbSessionMiddleware())
+    
     # Handlerlarni ro'yxatdan o'tkazish
     dp.include_router(start.router)
     dp.include_router(courses.router)
@@ -0,0 +1,20 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from database.base import session_scope
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Har bir update uchun bitta session (unit of work)"""
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        async with session_scope() as session:
+            data["session"] = session
+            return await handler(event, data)
@@ -1,4 +1,4 @@
-import axios from 'axios'
+import axios, { type InternalAxiosRequestConfig } from 'axios'
 
 // Production API URL
 const API_URL = import.meta.env.VITE_API_URL || 'https://secure-nurturing-production.up.railway.app'
@@ -11,14 +11,48 @@ const api = axios.create({
   timeout: 15000, // 15 sekund timeout
 })
 
-// Telegram init data ni har bir so'rovga qo'shish
-api.interceptors.request.use((config) => {
+const getInitData = (): string => {
   const tg = window.Telegram?.WebApp
-  if (tg?.initData) {
-    config.headers['X-Telegram-Init-Data'] = tg.initData
+  // Development mode (API'da ALLOW_UNSIGNED_INIT_DATA=true bo'lishi kerak)
+  return tg?.initData || 'user=%7B%22id%22%3A123456789%7D'
+}
+
+// Sessiya tokeni: init data bir marta yuboriladi, keyin qisqa Bearer token
+let sessionToken: string | null = null
+let sessionExpiresAt = 0
+let sessionRequest: Promise<string | null> | null = null
+
+const getSessionToken = (): Promise<string | null> => {
+  if (sessionToken && Date.now() < sessionExpiresAt) {
+    return Promise.resolve(sessionToken)
+  }
+  if (!sessionRequest) {
+    sessionRequest = axios
+      .post<{ access_token: string; expires_in: number }>(`${API_URL}/api/auth/session`, null, {
+        headers: { 'X-Telegram-Init-Data': getInitData() },
+        timeout: 15000,
+      })
+      .then(({ data }) => {
+        sessionToken = data.access_token
+        // Muddatidan biroz oldin yangilash
+        sessionExpiresAt = Date.now() + Math.max(data.expires_in - 60, 0) * 1000
+        return sessionToken
+      })
+      .catch(() => null)
+      .finally(() => {
+        sessionRequest = null
+      })
+  }
+  return sessionRequest
+}
+
+// Har bir so'rovga token (olinmasa - init data) qo'shish
+api.interceptors.request.use(async (config) => {
+  const token = await getSessionToken()
+  if (token) {
+    config.headers['Authorization'] = `Bearer ${token}`
   } else {
-    // Development mode
-    config.headers['X-Telegram-Init-Data'] = 'user=%7B%22id%22%3A123456789%7D'
+    config.headers['X-Telegram-Init-Data'] = getInitData()
   }
   return config
 })
@@ -27,6 +61,13 @@ api.interceptors.request.use((config) => {
 api.interceptors.response.use(
   (response) => response,
   (error) => {
+    const config = error.config as (InternalAxiosRequestConfig & { _retried?: boolean }) | undefined
+    // Token eskirgan/yaroqsiz: yangisini olib bir marta qayta urinish
+    if (error.response?.status === 401 && config && !config._retried && sessionToken) {
+      sessionToken = null
+      config._retried = true
+      return api(config)
+    }
     console.error('API Error:', error.message, error.config?.url)
     return Promise.reject(error)
   }
@@ -129,7 +170,15 @@ export const lessonsApi = {
     api.get<Lesson>(`/lessons/${id}`),
   
   getVideoUrl: (id: number) =>
-    api.get<{ video_url: string; type: string; expires?: number; token?: string; watermark?: string }>(`/lessons/${id}/video-url`),
+    api
+      .get<{ video_url: string; type: string; expires?: number; token?: string; watermark?: string }>(`/lessons/${id}/video-url`)
+      .then((res) => {
+        // Telegram videolari API orqali proksi qilinadi: nisbiy yo'l qaytadi
+        if (res.data.video_url.startsWith('/')) {
+          res.data.video_url = `${API_URL}${res.data.video_url}`
+        }
+        return res
+      }),
   
   updateProgress: (id: number, watchedSeconds: number, isCompleted: boolean) =>
     api.post(`/lessons/${id}/progress`, { watched_seconds: watchedSeconds, is_completed: isCompleted }),
@@ -185,8 +234,8 @@ export const adminApi = {
     })
   },
   
-  getUsers: (limit?: number, offset?: number) =>
-    api.get('/admin/users', { params: { limit, offset } }),
+  getUsers: (limit?: number, cursor?: string) =>
+    api.get('/admin/users', { params: { limit, cursor } }),
 }
 
 // Admin types